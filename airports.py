@@ -0,0 +1,294 @@
+"""Airport reference data shared by the dashboard and the analytics modules
+
+Airports are loaded from the bundled ``data/airports.csv`` into an
+array-backed table: one NumPy column per field, a hashed code-to-row index
+and a ball tree over unit-sphere coordinates for nearest-airport and radius
+queries. The table is also a read-only mapping, so ``airports["YSSY"]["city"]``
+keeps working.
+
+    python airports.py import airports.csv        # rebuild from an OurAirports dump
+    python airports.py nearest -33.95 151.18 --k 3
+"""
+import argparse
+import os
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+AIRPORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+AIRPORT_COLUMNS = ["icao", "iata", "name", "city", "country", "lat", "lon"]
+EARTH_RADIUS_KM = 6371.009   # same mean radius geopy's great_circle uses
+LEAF_SIZE = 16               # points per ball tree leaf
+
+# Departure airports offered in the dashboard, analysed in network mode and kept warm by the prefetcher
+DASHBOARD_AIRPORTS = ["YSSY", "YMML", "YBBN", "YPPH", "YPAD", "YBCG", "YSCB", "YMHB", "YPDN", "YBCS"]
+
+
+def unit_vectors(lat, lon):
+    """(n, 3) unit-sphere coordinates for latitudes and longitudes in degrees"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    """Great-circle distance in km for a chord length on the unit sphere"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def km_to_chord(km):
+    """Chord length on the unit sphere for a great-circle distance in km"""
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+# --- Spatial Index ---
+class BallTree:
+    """Array-backed ball tree over 3-D points with Euclidean (chord) distance
+
+    Nodes are stored in flat arrays; each covers the contiguous slice
+    ``order[start:end]`` of the points, so leaves are scanned with one
+    vectorized distance computation.
+    """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.points))
+        self._nodes = []   # [start, end, left, right]
+        self._centers = []
+        self._radii = []
+        if len(self.points):
+            self._build(0, len(self.points))
+        self.nodes = np.array(self._nodes, dtype=np.intp).reshape(-1, 4)
+        self.centers = np.array(self._centers, dtype=np.float64).reshape(-1, 3)
+        self.radii = np.array(self._radii, dtype=np.float64)
+        del self._nodes, self._centers, self._radii
+
+    def _build(self, start, end):
+        node = len(self._nodes)
+        idx = self.order[start:end]
+        points = self.points[idx]
+        center = points.mean(axis=0)
+        self._nodes.append([start, end, -1, -1])
+        self._centers.append(center)
+        self._radii.append(np.sqrt(((points - center) ** 2).sum(axis=1).max()))
+        if end - start > self.leaf_size:
+            # Split at the median of the widest dimension
+            dim = np.argmax(points.max(axis=0) - points.min(axis=0))
+            mid = (start + end) // 2
+            self.order[start:end] = idx[np.argpartition(points[:, dim], mid - start)]
+            self._nodes[node][2] = self._build(start, mid)
+            self._nodes[node][3] = self._build(mid, end)
+        return node
+
+    def query(self, point, k=1):
+        """(distances, indices) of the k nearest points, closest first"""
+        point = np.asarray(point, dtype=np.float64)
+        best_dist = np.full(k, np.inf)
+        best_idx = np.full(k, -1, dtype=np.intp)
+        stack = [0] if len(self.nodes) else []
+        while stack:
+            node = stack.pop()
+            start, end, left, right = self.nodes[node]
+            if np.linalg.norm(point - self.centers[node]) - self.radii[node] >= best_dist[-1]:
+                continue
+            if left < 0:
+                idx = self.order[start:end]
+                dist = np.linalg.norm(self.points[idx] - point, axis=1)
+                dist, idx = np.concatenate([best_dist, dist]), np.concatenate([best_idx, idx])
+                keep = np.argsort(dist, kind='stable')[:k]
+                best_dist, best_idx = dist[keep], idx[keep]
+                continue
+            # Visit the nearer child first (pushed last) so the bound tightens sooner
+            near_left = np.linalg.norm(point - self.centers[left]) <= np.linalg.norm(point - self.centers[right])
+            stack.extend([right, left] if near_left else [left, right])
+        found = best_idx >= 0
+        return best_dist[found], best_idx[found]
+
+    def query_radius(self, point, radius):
+        """(distances, indices) of every point within ``radius``, closest first"""
+        point = np.asarray(point, dtype=np.float64)
+        found = []
+        stack = [0] if len(self.nodes) else []
+        while stack:
+            node = stack.pop()
+            start, end, left, right = self.nodes[node]
+            center_dist = np.linalg.norm(point - self.centers[node])
+            if center_dist - self.radii[node] > radius:
+                continue
+            if left < 0 or center_dist + self.radii[node] <= radius:
+                found.append(self.order[start:end])
+            else:
+                stack.extend([left, right])
+        idx = np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+        dist = np.linalg.norm(self.points[idx] - point, axis=1)
+        inside = dist <= radius
+        order = np.argsort(dist[inside], kind='stable')
+        return dist[inside][order], idx[inside][order]
+
+
+# --- Airport Table ---
+class AirportTable(Mapping):
+    """Array-backed airport table with vectorized code lookup and spatial queries"""
+
+    def __init__(self, codes, names, cities, lat, lon, iata=None, countries=None):
+        self.codes = np.asarray(codes, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.cities = np.asarray(cities, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.iata = np.asarray(iata if iata is not None else [""] * len(self.codes), dtype=object)
+        self.countries = np.asarray(countries if countries is not None else [""] * len(self.codes), dtype=object)
+        self.index = pd.Index(self.codes)
+        if not self.index.is_unique:
+            raise ValueError("Duplicate airport codes: " + ", ".join(self.index[self.index.duplicated()][:5]))
+        self._tree = None
+
+    @classmethod
+    def from_csv(cls, path=AIRPORTS_FILE):
+        """Load the bundled (or another) airports file"""
+        df = pd.read_csv(path, dtype={col: str for col in AIRPORT_COLUMNS[:5]}, keep_default_na=False)
+        return cls(df["icao"], df["name"], df["city"], df["lat"], df["lon"], df["iata"], df["country"])
+
+    @classmethod
+    def from_records(cls, airports):
+        """Table from a ``{code: {"name", "city", "coords"}}`` mapping"""
+        codes = list(airports)
+        coords = np.array([airports[code]["coords"] for code in codes], dtype=np.float64).reshape(-1, 2)
+        return cls(codes, [airports[code]["name"] for code in codes], [airports[code]["city"] for code in codes],
+                   coords[:, 0], coords[:, 1])
+
+    # --- Mapping Interface ---
+    def __getitem__(self, code):
+        i = self.index.get_loc(code)
+        return {
+            "name": self.names[i], "city": self.cities[i], "coords": (float(self.lat[i]), float(self.lon[i])),
+            "iata": self.iata[i], "country": self.countries[i],
+        }
+
+    def __iter__(self):
+        return iter(self.codes.tolist())
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.index
+
+    # --- Vectorized Lookup ---
+    def locate(self, codes):
+        """Row of each code (-1 for unknown airports)"""
+        return self.index.get_indexer(np.asarray(codes, dtype=object)).astype(np.intp)
+
+    def coords(self, codes):
+        """(lat, lon) arrays for each code, NaN for unknown airports"""
+        rows = self.locate(codes)
+        lat = np.where(rows >= 0, self.lat[rows], np.nan)
+        lon = np.where(rows >= 0, self.lon[rows], np.nan)
+        return lat, lon
+
+    def subset(self, codes):
+        """Table of the given airports, in the given order"""
+        rows = self.locate(codes)
+        if (rows < 0).any():
+            raise KeyError(", ".join(np.asarray(codes, dtype=object)[rows < 0]))
+        return AirportTable(self.codes[rows], self.names[rows], self.cities[rows], self.lat[rows], self.lon[rows],
+                            self.iata[rows], self.countries[rows])
+
+    def frame(self):
+        """The table as a DataFrame in the bundled file's column layout"""
+        return pd.DataFrame({
+            "icao": self.codes, "iata": self.iata, "name": self.names, "city": self.cities,
+            "country": self.countries, "lat": self.lat, "lon": self.lon,
+        })
+
+    # --- Spatial Queries ---
+    @property
+    def tree(self):
+        """Ball tree over unit-sphere coordinates, built on first use"""
+        if self._tree is None:
+            self._tree = BallTree(unit_vectors(self.lat, self.lon))
+        return self._tree
+
+    def nearest(self, lat, lon, k=1):
+        """Codes and great-circle distances in km of the k airports nearest to a point"""
+        dist, idx = self.tree.query(unit_vectors([lat], [lon])[0], k)
+        return self.codes[idx].tolist(), chord_to_km(dist)
+
+    def within(self, lat, lon, radius_km):
+        """Codes and distances in km of every airport within ``radius_km`` of a point, closest first"""
+        dist, idx = self.tree.query_radius(unit_vectors([lat], [lon])[0], km_to_chord(radius_km))
+        return self.codes[idx].tolist(), chord_to_km(dist)
+
+
+def as_table(airports):
+    """AirportTable for a table or a ``{code: {...}}`` mapping"""
+    return airports if isinstance(airports, AirportTable) else AirportTable.from_records(airports)
+
+
+def import_ourairports(path, scheduled_only=True, keep=None):
+    """Airports with an ICAO code and coordinates from an OurAirports ``airports.csv`` dump, in the bundled file's layout
+
+    Large airports are kept even when the dump does not flag scheduled
+    service (it lists Darwin as without). Airports in ``keep``, a frame in
+    the bundled layout, keep its name and city: OurAirports' municipality is
+    often a suburb (Darwin's is Eaton).
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df = df[df["type"].isin(["large_airport", "medium_airport", "small_airport"])]
+    if scheduled_only:
+        df = df[(df["scheduled_service"] == "yes") | (df["type"] == "large_airport")]
+    df = df[(df["latitude_deg"] != "") & (df["longitude_deg"] != "")]
+    code = df["icao_code"] if "icao_code" in df else df["gps_code"]
+    code = code.where(code.str.fullmatch("[A-Z]{4}"), df["ident"])
+    out = pd.DataFrame({
+        "icao": code, "iata": df["iata_code"], "name": df["name"], "city": df["municipality"],
+        "country": df["iso_country"], "lat": df["latitude_deg"].astype(float).round(4),
+        "lon": df["longitude_deg"].astype(float).round(4),
+    })
+    out = out[out["icao"].str.fullmatch("[A-Z]{4}")].drop_duplicates("icao").set_index("icao")
+    if keep is not None:
+        kept = keep.set_index("icao")[["name", "city"]].reindex(out.index)
+        out[["name", "city"]] = kept.where(kept.notna(), out[["name", "city"]])
+    return out.reset_index()[AIRPORT_COLUMNS].sort_values("icao")
+
+
+# --- Airport Database ---
+airport_table = AirportTable.from_csv()
+airport_db = airport_table.subset(DASHBOARD_AIRPORTS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    source = commands.add_parser("import", help="Rebuild the bundled file from an OurAirports airports.csv")
+    source.add_argument("path")
+    source.add_argument("--all", action="store_true", help="Keep airports without scheduled service")
+    source.add_argument("--output", default=AIRPORTS_FILE)
+    source.add_argument("--fresh-names", action="store_true",
+                        help="Use the dump's names and cities instead of those already in the output file")
+    nearest = commands.add_parser("nearest", help="Airports nearest to a point")
+    nearest.add_argument("lat", type=float)
+    nearest.add_argument("lon", type=float)
+    nearest.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        keep = None
+        if not args.fresh_names and os.path.exists(args.output):
+            keep = pd.read_csv(args.output, dtype=str, keep_default_na=False)
+        table = import_ourairports(args.path, scheduled_only=not args.all, keep=keep)
+        table.to_csv(args.output, index=False, lineterminator="\r\n")
+        print(f"Wrote {len(table)} airports to {args.output}")
+    else:
+        codes, distances = airport_table.nearest(args.lat, args.lon, args.k)
+        for code, distance in zip(codes, distances):
+            print(f"{code}  {distance:8.1f} km  {airport_table[code]['name']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,49 @@
 import streamlit as st
 import requests
 import pandas as pd
-import numpy as np
 import time
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, time as dt_time
-from geopy.distance import great_circle
-import pytz
+import os
+
+from airports import airport_db, airport_table
+from charts import POINT_BUDGET, add_trendlines, price_box_figure, price_distance_figure, trendlines
+from cube import build_cube
+from export import EXPORT_FORMATS, cube_frame, export_buffer
+from flight_frame import expand_flights
+from od_matrix import build_od_matrix
+from opensky import SETTLE_SECONDS, fetch_network, make_session
+from pipeline import (MissingColumnsError, fetch_flights, filter_price, frame_fingerprint, generate_insights,
+                      inbound_flights, prepare_flights, summarize)
+from prefetch import Prefetcher
+from pricing import RouteEngine
+from profiling import profiler
+from rolling import RollingDemand
+from route_map import build_route_map
+from shared_cache import open_shared_cache
+from warehouse import FlightWarehouse
+
+FETCH_MAX_WORKERS = 4       # concurrent OpenSky chunk requests for one airport
+NETWORK_MAX_WORKERS = 4     # concurrent OpenSky requests in network mode
+NETWORK_RATE_LIMIT = 4.0    # OpenSky requests per second in network mode
+VIEW_CACHE_ENTRIES = 32     # memoized tab figures kept per server process
+WINDOW_ALIGN_SECONDS = 60   # relative windows end on the minute, so clicks within it share one fetch
+OD_HEATMAP_AIRPORTS = 30    # busiest airports shown in the network origin-destination heatmap
+PREFETCH_INTERVAL_SECONDS = int(os.environ.get("PREFETCH_INTERVAL_SECONDS", 900))  # 0 disables the warm-up thread
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# --- Static Assets ---
+# Built on the first run of each server process and reused by every rerun;
+# plotly is imported by the views that draw figures, not at startup.
+@st.cache_resource
+def get_stylesheet():
+    """Dashboard CSS as a <style> block"""
+    with open(os.path.join(ASSETS_DIR, "dashboard.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+@st.cache_resource
+def get_airport_options():
+    """Sidebar labels of the dashboard airports"""
+    return [f"{airport_db[code]['city']} ({code})" for code in airport_db]
 
 # --- UI Configuration ---
 st.set_page_config(
@@ -15,53 +51,10 @@ st.set_page_config(
     layout="wide",
     page_icon="✈️"
 )
+profiler.start_run()
 
 # Custom CSS for professional styling
-st.markdown("""
-    <style>
-        /* Global styles */
-        .main { background-color: #f5f7fa; }
-        .header { color: #2c3e50; }
-        .subheader { color: #1e3d73; border-bottom: 2px solid #1e3d73; padding-bottom: 8px; }
-        .metric { text-align: center; padding: 15px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); background: white; }
-        .positive { color: #27ae60; }
-        .negative { color: #e74c3c; }
-        .footer { text-align: center; margin-top: 30px; color: #7f8c8d; font-size: 0.9em; }
-        .tabs { margin-top: 20px; }
-        .stAlert { border-left: 4px solid #1e3d73; }
-        .stSpinner > div { text-align: center; }
-        .stRadio > div { flex-direction: row; gap: 20px; }
-
-        /* Button styling */
-        .stButton>button {
-            background-color: #1e3d73;
-            color: white;
-            border-radius: 5px;
-            padding: 10px 24px;
-        }
-
-        /* In-app controls */
-        .stSelectbox, .stTextInput, .stSlider {
-            background-color: white !important;
-            color: #000000 !important;
-        }
-
-        /* Sidebar-specific overrides */
-        [data-testid="stSidebar"] .stSlider>div,
-        [data-testid="stSidebar"] .stSelectbox>div,
-        [data-testid="stSidebar"] .stTextInput>div {
-            background-color: #ffffff !important;
-            color: #000000 !important;
-        }
-        [data-testid="stSidebar"] .widget-label,
-        [data-testid="stSidebar"] label {
-            color: #000000 !important;
-        }
-        [data-testid="stSidebar"] .stSlider input[type=range] {
-            accent-color: #1e3d73;  /* dark-blue thumb & track */
-        }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(get_stylesheet(), unsafe_allow_html=True)
 
 
 
@@ -70,20 +63,6 @@ st.title("✈️ AirTravel Analytics")
 st.markdown("### Market Demand Intelligence Dashboard for Australian Airline Industry")
 st.markdown("Analyze real-time flight demand trends, pricing patterns, and route popularity across Australian airports")
 
-# --- Airport Database ---
-airport_db = {
-    "YSSY": {"name": "Sydney Kingsford Smith", "coords": (-33.9461, 151.1772), "city": "Sydney"},
-    "YMML": {"name": "Melbourne Airport", "coords": (-37.6733, 144.8433), "city": "Melbourne"},
-    "YBBN": {"name": "Brisbane Airport", "coords": (-27.3842, 153.1175), "city": "Brisbane"},
-    "YPPH": {"name": "Perth Airport", "coords": (-31.9403, 115.9669), "city": "Perth"},
-    "YPAD": {"name": "Adelaide Airport", "coords": (-34.9450, 138.5306), "city": "Adelaide"},
-    "YBCG": {"name": "Gold Coast Airport", "coords": (-28.1644, 153.5047), "city": "Gold Coast"},
-    "YSCB": {"name": "Canberra Airport", "coords": (-35.3069, 149.1950), "city": "Canberra"},
-    "YMHB": {"name": "Hobart Airport", "coords": (-42.8361, 147.5103), "city": "Hobart"},
-    "YPDN": {"name": "Darwin Airport", "coords": (-12.4083, 130.8728), "city": "Darwin"},
-    "YBCS": {"name": "Cairns Airport", "coords": (-16.8858, 145.7553), "city": "Cairns"},
-}
-
 # --- Sidebar Configuration ---
 with st.sidebar:
     st.header("🔍 Data Parameters")
@@ -93,13 +72,18 @@ with st.sidebar:
 
     
     # Airport Selection
-    airport_options = [f"{airport_db[code]['city']} ({code})" for code in airport_db]
     selected_airport = st.selectbox(
         "Select Airport", 
-        airport_options,
+        get_airport_options(),
         index=0
     )
     airport_code = selected_airport.split('(')[-1].replace(')', '')
+    analysis_scope = st.radio(
+        "Analysis Scope",
+        ["Single Airport", "Entire Network"],
+        index=0,
+        help="Entire Network fetches departures for every airport concurrently"
+    )
     
     # Time Range Selection - Fixed layout
     st.write("Time Range")
@@ -116,460 +100,661 @@ with st.sidebar:
         end_date = st.date_input("End Date", value=today)
         
         # Convert dates to datetime objects
-        start_datetime = datetime.combine(start_date, time.min)
-        end_datetime = datetime.combine(end_date, time.max)
+        start_datetime = datetime.combine(start_date, dt_time.min)
+        end_datetime = datetime.combine(end_date, dt_time.max)
         
-        # Convert to timestamps
+        # Convert to timestamps (no point asking OpenSky about the future)
         start_time = int(start_datetime.timestamp())
-        end_time = int(end_datetime.timestamp())
+        end_time = min(int(end_datetime.timestamp()), int(time.time()))
+        window_span = None
     else:
         hours = int(time_option.split()[1])
-        end_time = int(time.time())
+        end_time = int(time.time()) // WINDOW_ALIGN_SECONDS * WINDOW_ALIGN_SECONDS
         start_time = end_time - (hours * 3600)
+        window_span = hours * 3600  # relative windows roll forward incrementally on refresh
     
     # Additional Filters
     st.subheader("Advanced Filters")
     min_flights = st.slider("Minimum Flights for Routes", 1, 50, 3)
     price_range = st.slider("Price Range (AUD)", 50, 1000, (100, 500))
+    show_arcs = st.checkbox("Curved great-circle routes on map", value=False)
+    point_budget = st.select_slider(
+        "Max points per chart",
+        options=[500, 1000, 2000, 5000, 10000],
+        value=POINT_BUDGET,
+        help="Larger datasets are sampled per destination; quartiles and trendlines still use every flight"
+    )
     
     # Data Refresh
     st.markdown("---")
-    st.button("🔄 Refresh Data", use_container_width=True)
+    refresh = st.button("🔄 Refresh Data", use_container_width=True)
 
 # --- Helper Functions ---
-def calculate_distance(dep_code, arr_code):
-    """Calculate distance between two airports in km"""
+@st.cache_resource
+def get_route_engine():
+    """Build the route engine over the airport table once per server process"""
+    return RouteEngine(airport_table)
+
+@st.cache_resource(max_entries=8)
+def enrich_flight_frame(fingerprint, _frame):
+    """Enriched flights and their demand cube, memoized by content since pricing is deterministic"""
+    flights = prepare_flights(_frame, get_route_engine(), price_range=None)
+    return flights, build_cube(flights)
+
+def prepare_flight_frame(data):
+    """Fingerprint raw departures, then clean them, add features and build the demand cube"""
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
     try:
-        dep_coords = airport_db[dep_code]["coords"]
-        arr_coords = airport_db[arr_code]["coords"]
-        return round(great_circle(dep_coords, arr_coords).km, 2)
-    except:
+        fingerprint = frame_fingerprint(frame)
+        return (fingerprint, *enrich_flight_frame(fingerprint, frame))
+    except MissingColumnsError:
+        st.error("Required columns missing from API response")
+        st.stop()
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def slice_dataset(fingerprint, price_range, _flights, _cube):
+    """Price-filtered flights and cube, kept per dataset so the cube's memoized rollups survive reruns"""
+    return filter_price(_flights, price_range), _cube.slice(price_range)
+
+# --- Data Loading ---
+@st.cache_resource
+def get_flight_cache():
+    """Local flight warehouse shared by every session on this server, backed by SHARED_CACHE_URL when set"""
+    return FlightWarehouse(shared_cache=open_shared_cache())
+
+@st.cache_resource
+def get_http_session():
+    """Pooled HTTP session reused by every OpenSky request on this server"""
+    return make_session(FETCH_MAX_WORKERS * NETWORK_MAX_WORKERS)
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def get_rolling_demand(airport_code, span, direction="departure"):
+    """Rolling window of one airport, preset and direction, shared by every session on this server"""
+    return RollingDemand(span, get_route_engine().codes, SETTLE_SECONDS, direction)
+
+@st.cache_resource
+def get_prefetcher():
+    """Background thread keeping the last 24 hours of every airport's departures and arrivals warm (None when disabled)"""
+    if PREFETCH_INTERVAL_SECONDS <= 0:
         return None
+    return Prefetcher(get_flight_cache(), list(airport_db), interval=PREFETCH_INTERVAL_SECONDS).start()
 
-def generate_price(distance, base_fare=50, km_rate=0.15):
-    """Generate realistic ticket price based on distance"""
-    if distance is None:
-        return np.random.randint(100, 500)
-    return round(base_fare + (distance * km_rate) + np.random.randint(-30, 100), 2)
-
-def calculate_demand_factor(hour):
-    """Calculate demand factor based on time of day"""
-    if 6 <= hour < 10:   # Morning peak
-        return 1.4
-    elif 16 <= hour < 20: # Evening peak
-        return 1.6
-    elif 10 <= hour < 16: # Midday
-        return 1.2
-    else:                 # Night
-        return 0.8
-
-def generate_insights(df, airport_code):
-    """Generate data-driven insights without AI"""
-    if df.empty:
-        return "No data available to generate insights"
-    
-    insights = []
-    
-    # Top routes insight
-    top_routes = df['estArrivalAirport'].value_counts().head(3)
-    route_descs = []
-    for code in top_routes.index:
-        if code in airport_db:
-            city_name = airport_db[code]["city"]
-            route_descs.append(f"{city_name} ({code})")
-        else:
-            route_descs.append(f"Unknown ({code})")
-    insights.append(f"**Top Routes:** {', '.join(route_descs)}")
-    
-    # Pricing insights
-    avg_price = df['Price'].mean()
-    price_comparison = "above" if avg_price > 350 else "below"
-    insights.append(f"**Pricing:** Average ticket price ${avg_price:.2f} AUD ({price_comparison} industry average)")
+def freshness_table(prefetcher, warehouse):
+    """Per-airport age of the newest stored data and the last background refresh"""
+    now = time.time()
+    departures, arrivals = warehouse.covered_until(), warehouse.covered_until("arrival")
+    status = prefetcher.status() if prefetcher else {}
     
-    # Demand patterns
-    peak_hour = df['Hour'].value_counts().idxmax()
-    insights.append(f"**Peak Demand:** Highest at {peak_hour}:00 ({df['Hour'].value_counts().max()} flights)")
+    def age(timestamp):
+        if not timestamp:
+            return "never"
+        minutes = int((now - timestamp) // 60)
+        return f"{minutes} min ago" if minutes < 120 else f"{minutes // 60} h ago"
     
-    # Route efficiency
-    if not df.empty:
-        longest_route = df.loc[df['Distance (km)'].idxmax()]
-        shortest_route = df.loc[df['Distance (km)'].idxmin()]
-        
-        # Get city names safely
-        longest_city = airport_db.get(longest_route['estArrivalAirport'], {}).get('city', 'Unknown')
-        shortest_city = airport_db.get(shortest_route['estArrivalAirport'], {}).get('city', 'Unknown')
-        
-        insights.append(f"**Longest Route:** {longest_city} ({longest_route['Distance (km)']} km)")
-        insights.append(f"**Shortest Route:** {shortest_city} ({shortest_route['Distance (km)']} km)")
-        
-        # Price-performance analysis
-        df['Price per km'] = df['Price'] / df['Distance (km)']
-        if not df['Price per km'].empty:
-            best_value = df.loc[df['Price per km'].idxmin()]
-            best_value_city = airport_db.get(best_value['estArrivalAirport'], {}).get('city', 'Unknown')
-            insights.append(f"**Best Value:** {best_value_city} at ${best_value['Price']:.2f} ({best_value['Distance (km)']} km)")
-    
-    return "\n\n".join(insights)
+    return pd.DataFrame([
+        {
+            "Airport": code,
+            "Departures until": age(departures.get(code)),
+            "Arrivals until": age(arrivals.get(code)),
+            "Last refresh": age(status.get(code, {}).get("last_success")),
+            "Error": status.get(code, {}).get("last_error") or "",
+        }
+        for code in airport_db
+    ])
 
-# --- Data Loading ---
-@st.cache_data(ttl=3600, show_spinner="Fetching flight data from OpenSky API...")
-def load_flight_data(airport_code, start_time, end_time):
-    """Fetch flight data from OpenSky API"""
+def show_chunk_report(report):
+    """Warn about chunks that could not be fetched and list every chunk"""
+    failed = [row for row in report if row["status"] == "failed"]
+    if failed:
+        st.warning(f"Partial data: {len(failed)} of {len(report)} time chunks could not be fetched ({failed[0]['error']})")
+    with st.expander("Fetch details", expanded=bool(failed)):
+        chunks = pd.DataFrame(report)
+        chunks['begin'] = pd.to_datetime(chunks['begin'], unit='s')
+        chunks['end'] = pd.to_datetime(chunks['end'], unit='s')
+        st.dataframe(chunks, use_container_width=True, hide_index=True)
+
+def stage_table(records):
+    """Stages timed during this rerun, slowest first"""
+    table = pd.DataFrame([record.as_dict() for record in records], columns=["stage", "seconds", "rows", "memory_delta_bytes"])
+    return pd.DataFrame({
+        "Stage": table["stage"],
+        "Time (ms)": (table["seconds"] * 1000).round(1),
+        "Rows": table["rows"].astype("Int64"),
+        "Memory Δ (MB)": (table["memory_delta_bytes"].astype("float64") / 1e6).round(1),
+    }).sort_values("Time (ms)", ascending=False)
+
+def load_flight_data(airport_code, start_time, end_time, direction="departure"):
+    """Fetch departures (or arrivals) and the chunk report, serving ranges already in the warehouse locally"""
     try:
-        url = f"https://opensky-network.org/api/flights/departure?airport={airport_code}&begin={start_time}&end={end_time}"
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        with st.spinner("Fetching flight data from OpenSky API..." if direction == "departure"
+                        else "Fetching arrivals from OpenSky API..."):
+            data, report = fetch_flights(
+                airport_code, start_time, end_time,
+                cache=get_flight_cache(),
+                session=get_http_session(),
+                max_workers=FETCH_MAX_WORKERS,
+                direction=direction
+            )
     except requests.exceptions.RequestException as e:
         st.error(f"API Error: {str(e)}")
         return None
     except Exception as e:
         st.error(f"Unexpected Error: {str(e)}")
         return None
+    
+    if report and all(row["status"] == "failed" for row in report):
+        st.error(f"API Error: {report[0]['error']}")
+        return None
+    return data, report
+
+def load_network_data(start_time, end_time, direction="departure"):
+    """Fetch departures (or arrivals) for every airport in airport_db concurrently"""
+    with st.spinner(f"Fetching {direction}s for {len(airport_db)} airports from OpenSky API..."):
+        return fetch_network(
+            list(airport_db), start_time, end_time,
+            max_workers=NETWORK_MAX_WORKERS,
+            rate_limit=NETWORK_RATE_LIMIT,
+            session=get_http_session(),
+            cache=get_flight_cache(),
+            direction=direction
+        )
+
+def add_inbound(dataset, arrivals, departure_airports):
+    """Enrich the arrivals not already among the fetched departures, for the origin-destination matrix"""
+    inbound = inbound_flights(arrivals, departure_airports, dataset["start_time"], dataset["end_time"])
+    if len(inbound):
+        with st.spinner("Adding inbound flights..."):
+            dataset["inbound_fingerprint"], _, dataset["inbound_cube"] = prepare_flight_frame(inbound)
+    return dataset
+
+def warn_partial_arrivals(report):
+    """Warn when some arrival chunks could not be fetched"""
+    failed = [row for row in report if row["status"] == "failed"]
+    if failed:
+        st.warning(f"Partial arrivals: {len(failed)} of {len(report)} time chunks could not be fetched ({failed[0]['error']})")
+
+def load_arrivals(dataset):
+    """Add the airport's inbound flights over the dataset's window, warning when they could not be fetched"""
+    loaded = load_flight_data(dataset["airport_code"], dataset["start_time"], dataset["end_time"], direction="arrival")
+    if loaded is None:
+        return dataset
+    arrivals, report = loaded
+    warn_partial_arrivals(report)
+    return add_inbound(dataset, arrivals, [dataset["airport_code"]])
+
+def advance_rolling(airport_code, span, end_time, direction="departure"):
+    """Advance one of the airport's shared rolling windows, fetching and enriching only flights since its last refresh
+
+    Returns ``(rolling, snapshot, report)``; the snapshot is None when loading failed.
+    """
+    rolling = get_rolling_demand(airport_code, span, direction)
+    reports = []
+    
+    def load(begin, end):
+        loaded = load_flight_data(airport_code, begin, end, direction)
+        if loaded is None:
+            return None
+        data, report = loaded
+        reports.extend(report)
+        if direction == "arrival":
+            # Departures of the airport inside the window are already in its departures window
+            data = inbound_flights(data, [airport_code], end_time - span, end_time)
+        if not len(data):
+            return pd.DataFrame()
+        try:
+            return prepare_flights(data, get_route_engine(), price_range=None)
+        except MissingColumnsError:
+            st.error("Required columns missing from API response")
+            return None
+    
+    with st.spinner("Updating rolling demand window..." if direction == "departure"
+                    else "Updating rolling inbound window..."):
+        snapshot = rolling.advance(end_time, load)
+    if snapshot is not None and any(row["status"] == "failed" for row in reports):
+        rolling.invalidate()  # refetch the gap on the next refresh
+    return rolling, snapshot, reports
+
+def load_rolling_dataset(dataset, span):
+    """Advance the airport's shared rolling departures window"""
+    airport_code = dataset["airport_code"]
+    rolling, snapshot, report = advance_rolling(airport_code, span, dataset["end_time"])
+    if snapshot is None:
+        return dataset
+    dataset.update(start_time=snapshot.start, end_time=snapshot.end, report=report)
+    if len(snapshot.flights):
+        dataset.update(fingerprint=f"rolling-{airport_code}-{span}-{rolling.instance}-{snapshot.version}",
+                       flights=snapshot.flights, cube=snapshot.cube)
+    return dataset
+
+def load_rolling_arrivals(dataset, span):
+    """Advance the airport's shared rolling inbound window, keyed on lastSeen, instead of reloading the window's arrivals"""
+    airport_code = dataset["airport_code"]
+    rolling, snapshot, report = advance_rolling(airport_code, span, dataset["end_time"], direction="arrival")
+    warn_partial_arrivals(report)
+    if snapshot is not None and len(snapshot.flights):
+        dataset.update(inbound_fingerprint=f"rolling-{airport_code}-{span}-arrival-{rolling.instance}-{snapshot.version}",
+                       inbound_cube=snapshot.cube)
+    return dataset
+
+def load_dataset(scope, airport_code, start_time, end_time, span=None):
+    """Fetch and enrich flights once per analysis and build their demand cube
+
+    The result lives in session state, so moving the filter sliders re-slices
+    the cube on rerun instead of fetching and rescanning the flights. With a
+    relative window (``span`` seconds), a single airport is served from a
+    rolling window that only applies the flights that arrived or expired,
+    and its inbound flights from a second one keyed on lastSeen.
+    Arrivals not already among the departures are kept in a separate cube
+    for the origin-destination matrix.
+    """
+    dataset = {"scope": scope, "airport_code": airport_code, "start_time": start_time, "end_time": end_time,
+               "fingerprint": None, "flights": None, "cube": None, "report": [], "errors": {},
+               "inbound_fingerprint": None, "inbound_cube": None}
+    if scope != "Entire Network" and span is not None:
+        dataset = load_rolling_dataset(dataset, span)
+        return load_rolling_arrivals(dataset, span) if dataset["cube"] is not None else dataset
+    if scope == "Entire Network":
+        flights, dataset["errors"] = load_network_data(start_time, end_time)
+    else:
+        loaded = load_flight_data(airport_code, start_time, end_time)
+        if loaded is None:
+            return dataset
+        flights, dataset["report"] = loaded
+    if not len(flights):
+        return dataset
+    with st.spinner("Building demand cube..."):
+        dataset["fingerprint"], dataset["flights"], dataset["cube"] = prepare_flight_frame(flights)
+    if scope != "Entire Network":
+        return load_arrivals(dataset)
+    arrivals, errors = load_network_data(start_time, end_time, direction="arrival")
+    dataset["errors"].update({f"{code} arrivals": message for code, message in errors.items()})
+    return add_inbound(dataset, arrivals, list(airport_db))
+
+# --- Dashboard Views ---
+# Each tab's figures are built only while that tab is open and memoized per
+# dataset fingerprint and filter values, so revisiting a tab is instant.
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def od_view(fingerprint, inbound_fingerprint, price_range, _cube, _inbound_cube):
+    """Origin-destination matrix of the price-sliced departures and inbound arrivals"""
+    return build_od_matrix(_cube, None if _inbound_cube is None else _inbound_cube.slice(price_range))
+
+def airport_label(code):
+    return f"{airport_table.get(code, {}).get('city', 'Unknown')} ({code})"
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def route_analysis_view(fingerprint, inbound_fingerprint, price_range, min_flights, airport_code, direction, _agg, _od):
+    """Top outbound or inbound routes bar chart and the five most price-efficient routes"""
+    import plotly.express as px
+    if direction == "Departures":
+        routes, partner = _od.outbound(airport_code, min_flights), 'Destination'
+        title = f"Top Flight Routes from {airport_db[airport_code]['city']}"
+    else:
+        routes, partner = _od.inbound(airport_code, min_flights), 'Origin'
+        title = f"Top Inbound Routes to {airport_db[airport_code]['city']}"
+    if routes.empty:
+        return None, None
+    
+    fig1 = px.bar(
+        routes.head(10),
+        x=partner,
+        y='Flights',
+        text='Flights',
+        title=title,
+        color='Flights',
+        color_continuous_scale='Teal',
+        hover_data={partner: False},
+        custom_data=[partner]
+    )
+    fig1.update_traces(
+        textposition='outside',
+        hovertemplate="<b>%{customdata[0]}</b><br>%{y} flights"
+    )
+    fig1.update_layout(height=500, plot_bgcolor='rgba(0,0,0,0)')
+    
+    # Sort by efficiency
+    efficient_routes = _agg.route_efficiency.sort_values('Price per km').head(5)
+    efficient_routes['Route'] = efficient_routes['estArrivalAirport'].apply(airport_label)
+    return fig1, efficient_routes[['Route', 'Price per km']].set_index('Route')
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def balance_view(fingerprint, inbound_fingerprint, price_range, airport_code, _od):
+    """Outbound, inbound and net flights per partner airport"""
+    balance = _od.balance(airport_code)
+    balance.insert(0, 'Route', balance.pop('Airport').map(airport_label))
+    return balance.set_index('Route')
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def pricing_view(fingerprint, price_range, point_budget, _df, _agg):
+    """Price vs distance, price distribution and hourly price figures"""
+    import plotly.express as px
+    # Sampled points, exact trendlines and quartiles
+    fig2 = price_distance_figure(_df, point_budget)
+    fig3 = price_box_figure(_df, point_budget)
+    
+    # Price by time of day
+    fig4 = px.line(
+        _agg.hourly_prices,
+        x='Hour',
+        y='Price',
+        title="Average Ticket Price by Hour of Day",
+        markers=True
+    )
+    fig4.update_layout(
+        xaxis=dict(tickmode='linear', dtick=1),
+        yaxis_title="Price (AUD)",
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    fig4.add_vrect(x0=6, x1=10, fillcolor="green", opacity=0.1, annotation_text="Morning Peak")
+    fig4.add_vrect(x0=16, x1=20, fillcolor="red", opacity=0.1, annotation_text="Evening Peak")
+    return fig2, fig3, fig4
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def demand_view(fingerprint, price_range, _agg):
+    """Hourly demand, weekly demand and demand-price figures"""
+    import plotly.express as px
+    fig5 = px.bar(
+        _agg.hourly,
+        x='Hour',
+        y='Flights',
+        title="Flight Departures by Hour",
+        color='Flights',
+        color_continuous_scale='Blues'
+    )
+    fig5.update_layout(
+        xaxis=dict(tickmode='linear', dtick=1),
+        yaxis_title="Number of Flights"
+    )
+    
+    fig6 = px.line(
+        _agg.daily,
+        x='Day of Week',
+        y='Flights',
+        title="Weekly Demand Pattern",
+        markers=True
+    )
+    fig6.update_layout(yaxis_title="Number of Flights")
+    
+    fig7 = px.scatter(
+        _agg.demand_price,
+        x='Flights',
+        y='Avg Price',
+        size='Flights',
+        color='Hour',
+        title="Demand-Price Relationship",
+        labels={'Flights': 'Number of Flights', 'Avg Price': 'Average Price (AUD)'}
+    )
+    add_trendlines(fig7, trendlines(_agg.demand_price, 'Flights', 'Avg Price'), 'Flights', 'Avg Price')
+    return fig5, fig6, fig7
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def route_map_view(fingerprint, inbound_fingerprint, price_range, airport_code, show_arcs, direction, _od):
+    """Route map of the airport's departures, arrivals or both, sliced from the origin-destination matrix"""
+    name = airport_table[airport_code]['name']
+    routes, title = {
+        "Departures": (_od.routes(origin=airport_code), f"Flight Routes from {name}"),
+        "Arrivals": (_od.routes(destination=airport_code), f"Flight Routes to {name}"),
+        "Both": (_od.routes(airport=airport_code), f"Flight Routes from and to {name}"),
+    }[direction]
+    return build_route_map(routes, airport_code, airport_table, arcs=show_arcs, title=title)
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def explorer_view(fingerprint, price_range, airport_code, _df, _cube):
+    """Latest 100 flights for the explorer and the market insights text"""
+    return expand_flights(_df.nlargest(100, 'firstSeen')), generate_insights(_cube, airport_code)
+
+# --- Data Freshness ---
+prefetcher = get_prefetcher()
+with st.sidebar:
+    with st.expander("🕒 Data Freshness"):
+        if prefetcher is None:
+            st.caption("Background refresh is off (PREFETCH_INTERVAL_SECONDS=0)")
+        st.dataframe(freshness_table(prefetcher, get_flight_cache()), use_container_width=True, hide_index=True)
+        coalesced = get_flight_cache().single_flight.stats()
+        st.caption(f"Request coalescing: {coalesced['absorbed']} duplicate OpenSky requests absorbed, "
+                   f"{coalesced['in_flight']} in flight")
+        shared_cache = get_flight_cache().shared_cache
+        if shared_cache is not None:
+            stats = shared_cache.stats()
+            st.caption(f"Shared cache: {stats.get('hits', 0)} hits, {stats.get('misses', 0)} misses, "
+                       f"{stats.get('entries', 0)} entries ({stats.get('bytes', 0) / 1e6:.1f} MB)")
 
 # --- Main Dashboard ---
-if st.button("🚀 Analyze Flight Demand", use_container_width=True, type="primary"):
-    with st.spinner("Processing flight data and generating insights..."):
-        data = load_flight_data(airport_code, start_time, end_time)
+analyze = st.button("🚀 Analyze Flight Demand", use_container_width=True, type="primary")
+
+if analyze or (refresh and "dataset" in st.session_state):
+    st.session_state.dataset = load_dataset(analysis_scope, airport_code, start_time, end_time, window_span)
+dataset = st.session_state.get("dataset")
+
+if dataset and dataset["scope"] == "Entire Network":
+    with st.spinner("Processing network flight data..."):
+        errors = dataset["errors"]
+        if errors:
+            failed = ', '.join(f"{code} ({message})" for code, message in sorted(errors.items()))
+            st.error(f"API Error for {len(errors)} airport(s): {failed}")
         
-        if data is None or not data:
-            st.warning(f"No flight data available for {airport_db[airport_code]['city']} in the selected time range")
+        if dataset["cube"] is None:
+            st.warning("No flight data available for the network in the selected time range")
         else:
-            df = pd.DataFrame(data)
-            
-            # Data Cleaning
-            required_cols = ['callsign', 'estDepartureAirport', 'estArrivalAirport', 'firstSeen', 'lastSeen']
-            if not all(col in df.columns for col in required_cols):
-                st.error("Required columns missing from API response")
-                st.stop()
-                
-            df = df[required_cols]
-            df.dropna(inplace=True)
-            df = df[df['estArrivalAirport'].isin(airport_db.keys())]
+            _, cube = slice_dataset(dataset["fingerprint"], price_range, dataset["flights"], dataset["cube"])
+            # Network departures plus arrivals from outside the network
+            od = od_view(dataset["fingerprint"], dataset["inbound_fingerprint"], price_range, cube, dataset["inbound_cube"])
             
-            # Feature Engineering
-            df['Departure Time'] = pd.to_datetime(df['firstSeen'], unit='s')
-            df['Arrival Time'] = pd.to_datetime(df['lastSeen'], unit='s')
-            df['Duration (min)'] = (df['Arrival Time'] - df['Departure Time']).dt.total_seconds() / 60
-            df['Hour'] = df['Departure Time'].dt.hour
-            df['Day of Week'] = df['Departure Time'].dt.day_name()
-            df['Date'] = df['Departure Time'].dt.date
-            
-            # Calculate distances and prices
-            df['Distance (km)'] = df.apply(
-                lambda x: calculate_distance(x['estDepartureAirport'], x['estArrivalAirport']), 
-                axis=1
-            )
-            df['Price'] = df.apply(
-                lambda x: generate_price(x['Distance (km)']) * calculate_demand_factor(x['Hour']), 
-                axis=1
-            )
+            st.success(f"✅ Successfully analyzed {od.total_flights} flights across {len(od)} airports")
+            start_dt = datetime.fromtimestamp(dataset["start_time"]).strftime('%Y-%m-%d %H:%M')
+            end_dt = datetime.fromtimestamp(dataset["end_time"]).strftime('%Y-%m-%d %H:%M')
+            st.caption(f"⏱️ Data Time Range: {start_dt} to {end_dt}")
             
-            # Filter by price range
-            df = df[(df['Price'] >= price_range[0]) & (df['Price'] <= price_range[1])]
+            if not od.empty:
+                corridors = od.corridors(min_flights)
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Total Flights", od.total_flights, f"{cube.total_flights} network departures")
+                busiest_origin = od.airports[od.counts.sum(axis=1).argmax()]
+                col2.metric("Busiest Origin", airport_label(busiest_origin))
+                if not corridors.empty:
+                    top = corridors.iloc[0]
+                    col3.metric("Busiest Corridor", f"{top['Origin']} ⇄ {top['Destination']}",
+                                f"{top['Flights'] + top['Return Flights']} flights")
+                
+                st.markdown("---")
+                st.subheader("🌐 Network Origin–Destination Matrix")
+                col1, col2 = st.columns([3, 2])
+                
+                with col1:
+                    import plotly.express as px
+                    fig_od = px.imshow(
+                        od.frame(limit=OD_HEATMAP_AIRPORTS),
+                        text_auto=True,
+                        color_continuous_scale='Teal',
+                        labels=dict(x="Destination", y="Origin", color="Flights"),
+                        title="Flights by Origin and Destination"
+                    )
+                    fig_od.update_layout(height=600)
+                    st.plotly_chart(fig_od, use_container_width=True)
+                
+                with col2:
+                    st.subheader("Top Corridors")
+                    st.caption("Flights each way per airport pair; imbalance is the busier direction's surplus")
+                    st.dataframe(corridors.head(20), use_container_width=True, hide_index=True)
+
+elif dataset:
+    airport_code = dataset["airport_code"]
+    with st.spinner("Processing flight data and generating insights..."):
+        if dataset["report"]:
+            show_chunk_report(dataset["report"])
+        
+        if dataset["cube"] is None:
+            st.warning(f"No flight data available for {airport_db[airport_code]['city']} in the selected time range")
+        else:
+            # Every metric, tab and insight reads the price-sliced cube
+            fingerprint, inbound_fingerprint = dataset["fingerprint"], dataset["inbound_fingerprint"]
+            df, cube = slice_dataset(fingerprint, price_range, dataset["flights"], dataset["cube"])
+            agg = summarize(cube)
+            od = od_view(fingerprint, inbound_fingerprint, price_range, cube, dataset["inbound_cube"])
             
             # --- Dashboard Layout ---
-            st.success(f"✅ Successfully analyzed {len(df)} flights from {airport_db[airport_code]['city']}")
+            st.success(f"✅ Successfully analyzed {agg.total_flights} flights from {airport_db[airport_code]['city']}")
             
             # Display time range
-            start_dt = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M')
-            end_dt = datetime.fromtimestamp(end_time).strftime('%Y-%m-%d %H:%M')
+            start_dt = datetime.fromtimestamp(dataset["start_time"]).strftime('%Y-%m-%d %H:%M')
+            end_dt = datetime.fromtimestamp(dataset["end_time"]).strftime('%Y-%m-%d %H:%M')
             st.caption(f"⏱️ Data Time Range: {start_dt} to {end_dt}")
             
             # Key Metrics
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Total Flights", len(df), "Departures")
-            avg_price = df['Price'].mean() if not df.empty else 0
-            col2.metric("Avg. Ticket Price", f"${avg_price:.2f} AUD", 
-                        f"{'▲ High' if avg_price > 350 else '▼ Low'} season")
+            col1.metric("Total Flights", agg.total_flights, "Departures")
+            col2.metric("Avg. Ticket Price", f"${agg.avg_price:.2f} AUD", 
+                        f"{'▲ High' if agg.avg_price > 350 else '▼ Low'} season")
             
-            peak_hour = df['Hour'].value_counts().idxmax() if not df.empty else "N/A"
-            peak_flights = df['Hour'].value_counts().max() if not df.empty else 0
-            col3.metric("Busiest Hour", f"{peak_hour}:00", f"{peak_flights} flights")
+            peak_hour = agg.peak_hour if agg.peak_hour is not None else "N/A"
+            col3.metric("Busiest Hour", f"{peak_hour}:00", f"{agg.peak_flights} flights")
             
-            top_dest = df['estArrivalAirport'].value_counts().index[0] if not df.empty else "N/A"
-            top_dest_city = airport_db.get(top_dest, {}).get('city', 'Unknown') if not df.empty else "N/A"
+            top_dest = agg.top_destination or "N/A"
+            top_dest_city = airport_table.get(top_dest, {}).get('city', 'Unknown') if agg.top_destination else "N/A"
             col4.metric("Popular Destination", f"{top_dest_city} ({top_dest})")
             
             st.markdown("---")
             
-            # Tab-based Layout
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Route Analysis", "💰 Pricing Trends", "⏱️ Demand Patterns", "🗺️ Route Map", "📋 Data Explorer"])
+            # Tab-based Layout (only the open tab's body runs)
+            tab1, tab2, tab3, tab4, tab5 = st.tabs(
+                ["📊 Route Analysis", "💰 Pricing Trends", "⏱️ Demand Patterns", "🗺️ Route Map", "📋 Data Explorer"],
+                key="dashboard_tab",
+                on_change="rerun"
+            )
             
-            with tab1:  # Route Analysis
-                st.subheader("✈️ Flight Route Analysis")
-                
-                # Top Routes
-                route_counts = df['estArrivalAirport'].value_counts().reset_index()
-                route_counts.columns = ['Arrival Airport', 'Flights']
-                route_counts = route_counts[route_counts['Flights'] >= min_flights]
-                
-                if not route_counts.empty:
-                    col1, col2 = st.columns([3, 2])
+            if tab1.open:
+                with tab1, profiler.stage("render_route_analysis"):  # Route Analysis
+                    st.subheader("✈️ Flight Route Analysis")
+                    route_direction = st.radio("Direction", ["Departures", "Arrivals"], horizontal=True,
+                                               key="route_direction")
+                    fig1, efficient_routes = route_analysis_view(fingerprint, inbound_fingerprint, price_range, min_flights,
+                                                                 airport_code, route_direction, agg, od)
                     
-                    with col1:
-                        fig1 = px.bar(
-                            route_counts.head(10),
-                            x='Arrival Airport',
-                            y='Flights',
-                            text='Flights',
-                            title=f"Top Flight Routes from {airport_db[airport_code]['city']}",
-                            color='Flights',
-                            color_continuous_scale='Teal',
-                            hover_data={'Arrival Airport': False},
-                            custom_data=['Arrival Airport']
-                        )
-                        fig1.update_traces(
-                            textposition='outside',
-                            hovertemplate="<b>%{customdata[0]}</b><br>%{y} flights"
-                        )
-                        fig1.update_layout(height=500, plot_bgcolor='rgba(0,0,0,0)')
-                        st.plotly_chart(fig1, use_container_width=True)
-                    
-                    with col2:
-                        st.subheader("Route Efficiency")
+                    if fig1 is not None:
+                        col1, col2 = st.columns([3, 2])
                         
-                        if not df.empty:
-                            # Calculate efficiency metrics
-                            route_efficiency = df.groupby('estArrivalAirport').agg({
-                                'Distance (km)': 'mean',
-                                'Duration (min)': 'mean',
-                                'Price': 'mean'
-                            }).reset_index()
-                            route_efficiency['Price per km'] = route_efficiency['Price'] / route_efficiency['Distance (km)']
-                            
-                            # Sort by efficiency
-                            efficient_routes = route_efficiency.sort_values('Price per km').head(5)
-                            efficient_routes['Route'] = efficient_routes['estArrivalAirport'].apply(
-                                lambda x: f"{airport_db.get(x, {}).get('city', 'Unknown')} ({x})"
-                            )
-                            
-                            st.dataframe(
-                                efficient_routes[['Route', 'Price per km']].set_index('Route'),
-                                use_container_width=True
-                            )
+                        with col1:
+                            st.plotly_chart(fig1, use_container_width=True)
+                        
+                        with col2:
+                            st.subheader("Route Efficiency")
+                            st.dataframe(efficient_routes, use_container_width=True)
                             
                             st.markdown("**Key Insights:**")
                             st.markdown("- ✈️ Shorter routes have higher price per km")
                             st.markdown("- 🌆 City routes are more efficient than regional")
-                        else:
-                            st.warning("No efficiency data available")
-                else:
-                    st.warning("No routes meet the minimum flight threshold")
-            
-            with tab2:  # Pricing Trends
-                st.subheader("💰 Pricing Analysis")
-                
-                if not df.empty:
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # Price vs Distance
-                        fig2 = px.scatter(
-                            df,
-                            x='Distance (km)',
-                            y='Price',
-                            color='estArrivalAirport',
-                            title="Price vs Distance",
-                            trendline="ols",
-                            labels={'Distance (km)': 'Distance (km)', 'Price': 'Price (AUD)'},
-                            hover_data=['estArrivalAirport', 'Hour']
-                        )
-                        fig2.update_traces(marker=dict(size=8, opacity=0.7))
-                        st.plotly_chart(fig2, use_container_width=True)
-                    
-                    with col2:
-                        # Price distribution
-                        fig3 = px.box(
-                            df,
-                            y='Price',
-                            title="Ticket Price Distribution",
-                            points="all",
-                            color_discrete_sequence=['#1e3d73']
-                        )
-                        fig3.update_layout(showlegend=False)
-                        st.plotly_chart(fig3, use_container_width=True)
+                    else:
+                        st.warning("No routes meet the minimum flight threshold")
                     
-                    # Price by time of day
-                    st.subheader("Hourly Pricing Trends")
-                    hourly_prices = df.groupby('Hour')['Price'].mean().reset_index()
-                    
-                    fig4 = px.line(
-                        hourly_prices,
-                        x='Hour',
-                        y='Price',
-                        title="Average Ticket Price by Hour of Day",
-                        markers=True
-                    )
-                    fig4.update_layout(
-                        xaxis=dict(tickmode='linear', dtick=1),
-                        yaxis_title="Price (AUD)",
-                        plot_bgcolor='rgba(0,0,0,0)'
-                    )
-                    fig4.add_vrect(x0=6, x1=10, fillcolor="green", opacity=0.1, annotation_text="Morning Peak")
-                    fig4.add_vrect(x0=16, x1=20, fillcolor="red", opacity=0.1, annotation_text="Evening Peak")
-                    st.plotly_chart(fig4, use_container_width=True)
-                else:
-                    st.warning("No pricing data available")
+                    st.subheader("↔️ Inbound vs Outbound")
+                    balance = balance_view(fingerprint, inbound_fingerprint, price_range, airport_code, od)
+                    if dataset["inbound_cube"] is None:
+                        st.caption("No inbound flights were loaded, so only departures are counted")
+                    col1, col2 = st.columns([3, 2])
+                    col1.dataframe(balance.head(15), use_container_width=True)
+                    if not balance.empty:
+                        partners = od.balance(airport_code)['Airport']
+                        partner = col2.selectbox("Corridor", partners, format_func=airport_label)
+                        corridor = od.corridor(airport_code, partner)
+                        col2.dataframe(corridor.round(1), use_container_width=True, hide_index=True)
             
-            with tab3:  # Demand Patterns
-                st.subheader("⏱️ Demand Patterns")
-                
-                if not df.empty:
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # Hourly demand
-                        hourly = df.groupby('Hour').size().reset_index(name='Flights')
-                        fig5 = px.bar(
-                            hourly,
-                            x='Hour',
-                            y='Flights',
-                            title="Flight Departures by Hour",
-                            color='Flights',
-                            color_continuous_scale='Blues'
-                        )
-                        fig5.update_layout(
-                            xaxis=dict(tickmode='linear', dtick=1),
-                            yaxis_title="Number of Flights"
-                        )
-                        st.plotly_chart(fig5, use_container_width=True)
+            if tab2.open:
+                with tab2, profiler.stage("render_pricing"):  # Pricing Trends
+                    st.subheader("💰 Pricing Analysis")
                     
-                    with col2:
-                        # Daily demand
-                        daily = df.groupby('Day of Week').size().reset_index(name='Flights')
-                        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                        daily['Day of Week'] = pd.Categorical(daily['Day of Week'], categories=day_order, ordered=True)
-                        daily = daily.sort_values('Day of Week')
+                    if not cube.empty:
+                        fig2, fig3, fig4 = pricing_view(fingerprint, price_range, point_budget, df, agg)
+                        col1, col2 = st.columns(2)
+                        col1.plotly_chart(fig2, use_container_width=True)
+                        col2.plotly_chart(fig3, use_container_width=True)
                         
-                        fig6 = px.line(
-                            daily,
-                            x='Day of Week',
-                            y='Flights',
-                            title="Weekly Demand Pattern",
-                            markers=True
-                        )
-                        fig6.update_layout(yaxis_title="Number of Flights")
-                        st.plotly_chart(fig6, use_container_width=True)
-                    
-                    # Demand vs Price
-                    st.subheader("Demand vs Pricing Relationship")
-                    demand_price = df.groupby('Hour').agg({'Price': 'mean', 'callsign': 'count'}).reset_index()
-                    demand_price.columns = ['Hour', 'Avg Price', 'Flights']
-                    
-                    fig7 = px.scatter(
-                        demand_price,
-                        x='Flights',
-                        y='Avg Price',
-                        size='Flights',
-                        color='Hour',
-                        title="Demand-Price Relationship",
-                        labels={'Flights': 'Number of Flights', 'Avg Price': 'Average Price (AUD)'},
-                        trendline="ols"
-                    )
-                    st.plotly_chart(fig7, use_container_width=True)
-                else:
-                    st.warning("No demand data available")
+                        st.subheader("Hourly Pricing Trends")
+                        st.plotly_chart(fig4, use_container_width=True)
+                    else:
+                        st.warning("No pricing data available")
             
-            with tab4:  # Route Map
-                st.subheader("🗺️ Flight Route Visualization")
-                
-                if not df.empty:
-                    # Create base map
-                    fig8 = go.Figure()
+            if tab3.open:
+                with tab3, profiler.stage("render_demand"):  # Demand Patterns
+                    st.subheader("⏱️ Demand Patterns")
                     
-                    # Add routes
-                    for _, row in df.iterrows():
-                        dep_coords = airport_db[row['estDepartureAirport']]["coords"]
-                        arr_coords = airport_db[row['estArrivalAirport']]["coords"]
+                    if not cube.empty:
+                        fig5, fig6, fig7 = demand_view(fingerprint, price_range, agg)
+                        col1, col2 = st.columns(2)
+                        col1.plotly_chart(fig5, use_container_width=True)
+                        col2.plotly_chart(fig6, use_container_width=True)
                         
-                        fig8.add_trace(go.Scattergeo(
-                            lon=[dep_coords[1], arr_coords[1]],
-                            lat=[dep_coords[0], arr_coords[0]],
-                            mode='lines',
-                            line=dict(width=1, color='#1e3d73'),
-                            opacity=0.5,
-                            showlegend=False
-                        ))
-                    
-                    # Add airport markers
-                    airports_in_data = pd.unique(df[['estDepartureAirport', 'estArrivalAirport']].values.ravel('K'))
-                    airport_points = [airport_db[code]["coords"] for code in airports_in_data if code in airport_db]
-                    
-                    if airport_points:
-                        lats, lons = zip(*airport_points)
-                        fig8.add_trace(go.Scattergeo(
-                            lon=lons,
-                            lat=lats,
-                            mode='markers',
-                            marker=dict(size=10, color='#e74c3c'),
-                            text=[airport_db[code]["name"] for code in airports_in_data],
-                            name='Airports'
-                        ))
-                    
-                    # Update map layout
-                    fig8.update_geos(
-                        projection_type="natural earth",
-                        showland=True,
-                        landcolor="rgb(243, 243, 243)",
-                        countrycolor="rgb(204, 204, 204)",
-                        showocean=True,
-                        oceancolor="rgb(212, 236, 255)",
-                        showcountries=True,
-                        showcoastlines=True
-                    )
-                    
-                    fig8.update_layout(
-                        title=f"Flight Routes from {airport_db[airport_code]['name']}",
-                        height=600,
-                        geo=dict(
-                            scope='world',
-                            projection_scale=3,
-                            center=dict(lat=airport_db[airport_code]["coords"][0], 
-                                       lon=airport_db[airport_code]["coords"][1])
-                        )
-                    )
+                        st.subheader("Demand vs Pricing Relationship")
+                        st.plotly_chart(fig7, use_container_width=True)
+                    else:
+                        st.warning("No demand data available")
+            
+            if tab4.open:
+                with tab4, profiler.stage("render_route_map"):  # Route Map
+                    st.subheader("🗺️ Flight Route Visualization")
                     
-                    st.plotly_chart(fig8, use_container_width=True)
-                else:
-                    st.warning("No data available for map visualization")
+                    if not cube.empty:
+                        map_direction = st.radio("Show", ["Departures", "Arrivals", "Both"], horizontal=True,
+                                                 key="map_direction")
+                        fig8 = route_map_view(fingerprint, inbound_fingerprint, price_range, airport_code,
+                                              show_arcs, map_direction, od)
+                        st.plotly_chart(fig8, use_container_width=True)
+                    else:
+                        st.warning("No data available for map visualization")
             
-            with tab5:  # Data Explorer and Insights
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    st.subheader("📋 Flight Data Explorer")
-                    st.dataframe(
-                        df.sort_values('Departure Time', ascending=False).head(100),
-                        use_container_width=True,
-                        height=600
-                    )
-                
-                with col2:
-                    st.subheader("📈 Market Insights")
-                    insights = generate_insights(df, airport_code)
-                    st.info(insights)
+            if tab5.open:
+                with tab5, profiler.stage("render_explorer"):  # Data Explorer and Insights
+                    latest_flights, insights = explorer_view(fingerprint, price_range, airport_code, df, cube)
+                    col1, col2 = st.columns([2, 1])
+                    
+                    with col1:
+                        st.subheader("📋 Flight Data Explorer")
+                        st.dataframe(latest_flights, use_container_width=True, height=600)
                     
-                    st.subheader("📌 Strategic Recommendations")
-                    st.markdown("""
-                    - **Increase capacity** during peak hours (6-10 AM, 4-8 PM)
-                    - **Optimize pricing** for high-demand routes
-                    - **Promote off-peak** travel with discounted fares
-                    - **Expand service** to underserved destinations
-                    - **Bundle offers** for popular city pairs
-                    """)
+                    with col2:
+                        st.subheader("📈 Market Insights")
+                        st.info(insights)
+                        
+                        st.subheader("📌 Strategic Recommendations")
+                        st.markdown("""
+                        - **Increase capacity** during peak hours (6-10 AM, 4-8 PM)
+                        - **Optimize pricing** for high-demand routes
+                        - **Promote off-peak** travel with discounted fares
+                        - **Expand service** to underserved destinations
+                        - **Bundle offers** for popular city pairs
+                        """)
             
             # Data Export
             st.markdown("---")
             st.subheader("📥 Export Data")
-            csv = df.to_csv(index=False).encode('utf-8')
+            col1, col2 = st.columns(2)
+            export_format = col1.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+            export_rows = col2.radio("Rows", ["Flights", "Demand cube"], horizontal=True,
+                                     help="The demand cube holds one row per route, hour and weekday")
+            extension, mime = EXPORT_FORMATS[export_format]
+            if export_rows == "Flights":
+                export_data = lambda: export_buffer(df, export_format)
+                file_prefix = "flight_demand"
+            else:
+                export_data = lambda: export_buffer(cube_frame(cube), export_format, expand=False)
+                file_prefix = "flight_demand_cube"
+            
+            # Serialized in chunks only when the button is clicked, not on every rerun
             st.download_button(
-                label="💾 Download Full Dataset (CSV)",
-                data=csv,
-                file_name=f"flight_demand_{airport_code}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime='text/csv'
+                label=f"💾 Download {'Full Dataset' if export_rows == 'Flights' else 'Demand Cube'} ({export_format})",
+                data=export_data,
+                file_name=f"{file_prefix}_{airport_code}_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}",
+                mime=mime,
+                on_click="ignore"
             )
 
+# --- Performance ---
+# Set PROFILING=1 to time each stage; only stages that ran (not cached) appear
+if profiler.enabled:
+    with st.sidebar:
+        with st.expander("⏱️ Performance"):
+            st.dataframe(stage_table(profiler.end_run()), use_container_width=True, hide_index=True)
+            st.caption(f"Totals exported to {profiler.metrics_path}")
+
 # --- Footer ---
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,65 @@
+"""Upstream requests and wait time of concurrent identical analyses with and without coalescing
+
+Starts ``--sessions`` threads that fetch the same airport and window at once
+from the OpenSky stand-in, first straight to the API and then through one
+warehouse, whose single-flight registry lets them share one request. Run
+from the repository root:
+
+    python benchmarks/bench_coalescing.py --sessions 8 --hours 24 --latency 0.5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import opensky
+from mock_opensky import MockOpenSky
+from pipeline import fetch_flights
+from warehouse import FlightWarehouse
+
+
+def run(sessions, hours, latency, cache_dir=None):
+    """Fetch one window from ``sessions`` threads at once; returns (upstream requests, seconds, absorbed)"""
+    end = int(time.time()) // 60 * 60
+    start = end - int(hours * 3600)
+    with MockOpenSky(flights_per_hour=120, latency=latency) as api:
+        opensky.OPENSKY_API = api.url
+        cache = FlightWarehouse(os.path.join(cache_dir, "warehouse.sqlite")) if cache_dir else None
+        barrier = threading.Barrier(sessions)
+
+        def session():
+            barrier.wait()
+            fetch_flights("YSSY", start, end, cache=cache)
+
+        threads = [threading.Thread(target=session) for _ in range(sessions)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - began
+        absorbed = cache.single_flight.absorbed if cache else 0
+        return api.requests, seconds, absorbed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--latency', type=float, default=0.5, help="Mock API latency in seconds")
+    args = parser.parse_args()
+
+    print(f"{'mode':>12}  {'upstream requests':>18}  {'seconds':>8}  {'absorbed':>8}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for mode, directory in (("direct", None), ("coalesced", cache_dir)):
+            requests, seconds, absorbed = run(args.sessions, args.hours, args.latency, directory)
+            print(f"{mode:>12}  {requests:>18}  {seconds:>8.2f}  {absorbed:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare the eager CSV export with the streamed CSV, Parquet and Arrow IPC exports
+
+Run from the repository root:
+
+    python benchmarks/bench_export.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cube import build_cube
+from export import EXPORT_FORMATS, cube_frame, export_buffer
+from flight_frame import expand_flights
+from mock_opensky import generate_flights
+from pipeline import prepare_flights
+from pricing import RouteEngine
+
+WINDOW_END = 1_700_000_000
+
+
+def eager_csv(df):
+    """The original app.py export: whole frame expanded, rendered and encoded up front"""
+    return expand_flights(df).to_csv(index=False).encode('utf-8')
+
+
+def measure(func, *args):
+    """Seconds, output bytes and peak traced Python allocation in MB (traced in a second run)"""
+    start = time.perf_counter()
+    output = func(*args)
+    seconds = time.perf_counter() - start
+    size = len(output) if isinstance(output, bytes) else output.getbuffer().nbytes
+    del output
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    engine = RouteEngine()
+    print(f"{'flights':>9} {'export':<22} {'seconds':>8} {'size (MB)':>10} {'peak (MB)':>10}")
+    for size in args.sizes:
+        data = generate_flights('YSSY', WINDOW_END - 7 * 86400, WINDOW_END, int(size / 0.7), seed=0)
+        df = prepare_flights(pd.DataFrame(data), engine, price_range=None).iloc[:size]
+        cube = cube_frame(build_cube(df))
+        runs = [('eager CSV', eager_csv, df)]
+        runs += [(f'streamed {fmt}', export_buffer, df, fmt) for fmt in EXPORT_FORMATS]
+        runs += [(f'cube {fmt}', lambda table, fmt: export_buffer(table, fmt, expand=False), cube, fmt)
+                 for fmt in EXPORT_FORMATS]
+        for name, func, *func_args in runs:
+            seconds, output_bytes, peak = measure(func, *func_args)
+            print(f"{len(df):>9} {name:<22} {seconds:>8.3f} {output_bytes / 1e6:>10.2f} {peak:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Response parsing: json + DataFrame versus the typed-column ingest path
+
+Run from the repository root:
+
+    python benchmarks/bench_ingest.py --sizes 10000 100000 1000000
+
+Each measurement runs in a fresh process so peak memory is not inherited.
+Python allocations are traced with tracemalloc, Arrow buffers through the
+Arrow memory pool.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import pyarrow as pa
+
+from ingest import FLIGHT_COLUMNS, STREAM_CHUNK_BYTES, parse_flights, stream_flights
+from mock_opensky import generate_flights
+
+
+def parse_json(body):
+    """What fetch_departures and prepare_flights did before: dicts, then an object frame, then projection"""
+    return pd.DataFrame(json.loads(body))[FLIGHT_COLUMNS]
+
+
+def parse_streamed(body):
+    view = memoryview(body)
+    return stream_flights(bytes(view[i:i + STREAM_CHUNK_BYTES]) for i in range(0, len(body), STREAM_CHUNK_BYTES))
+
+
+METHODS = {"json + DataFrame": parse_json, "ingest": parse_flights, "ingest streamed": parse_streamed}
+
+
+def measure(method, size):
+    """(seconds, peak Python MB, peak Arrow MB, frame MB) of parsing one response of ``size`` flights"""
+    flights = generate_flights("YSSY", 1_700_000_000, 1_700_000_000 + 30 * 86400, size)
+    body = json.dumps(flights).encode()
+    del flights
+    pool_before = pa.default_memory_pool().max_memory()
+    tracemalloc.start()
+    began = time.perf_counter()
+    frame = METHODS[method](body)
+    seconds = time.perf_counter() - began
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    arrow_peak = pa.default_memory_pool().max_memory() - pool_before
+    return seconds, peak / 1e6, arrow_peak / 1e6, frame.memory_usage(deep=True).sum() / 1e6, len(body) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'flights':>9} {'payload (MB)':>12} {'method':<18} {'seconds':>8} {'python peak':>12} "
+          f"{'arrow peak':>11} {'frame (MB)':>10}")
+    for size in args.sizes:
+        for method in METHODS:
+            with context.Pool(1) as pool:
+                seconds, peak, arrow_peak, frame_mb, payload_mb = pool.apply(measure, (method, size))
+            print(f"{size:>9} {payload_mb:>12.1f} {method:<18} {seconds:>8.3f} {peak:>12.1f} "
+                  f"{arrow_peak:>11.1f} {frame_mb:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
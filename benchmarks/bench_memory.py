@@ -0,0 +1,54 @@
+"""Bytes per flight of the original object-heavy frame versus the compact schema
+
+Run from the repository root:
+
+    python benchmarks/bench_memory.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from airports import airport_table
+from flight_frame import memory_report
+from mock_opensky import generate_flights
+from pipeline import add_features, clean_flights
+from pricing import RouteEngine
+
+
+def original_frame(df, engine):
+    """Feature engineering as app.py did it before the compact schema"""
+    df = df.copy()
+    df['Departure Time'] = pd.to_datetime(df['firstSeen'], unit='s')
+    df['Arrival Time'] = pd.to_datetime(df['lastSeen'], unit='s')
+    df['Duration (min)'] = (df['Arrival Time'] - df['Departure Time']).dt.total_seconds() / 60
+    df['Hour'] = df['Departure Time'].dt.hour
+    df['Day of Week'] = df['Departure Time'].dt.day_name()
+    df['Date'] = df['Departure Time'].dt.date
+    return engine.enrich(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    engine = RouteEngine(airport_table)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+    for size in args.sizes:
+        cleaned = clean_flights(pd.DataFrame(generate_flights('YSSY', 1_700_000_000, 1_700_000_000 + 7 * 86400, size)))
+        report = memory_report({
+            'before': original_frame(cleaned, engine),
+            'after': add_features(cleaned, engine),
+        })
+        print(f"\n{size} generated flights ({len(cleaned)} after cleaning), bytes per flight:")
+        print(report.T.fillna('-').to_string())
+
+
+if __name__ == '__main__':
+    main()
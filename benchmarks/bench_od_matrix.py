@@ -0,0 +1,100 @@
+"""Origin-destination slicing: grouped scans over the flights versus the OD matrix
+
+Run from the repository root:
+
+    python benchmarks/bench_od_matrix.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import airport_db, airport_table
+from cube import build_cube
+from flight_frame import compact_flights
+from od_matrix import build_od_matrix
+from pricing import RouteEngine
+
+
+def make_flights(rows, engine, seed=0):
+    """Enriched network departures and arrivals between dashboard airports and the rest of the table"""
+    rng = np.random.default_rng(seed)
+    network = np.array(list(airport_db), dtype=object)
+    codes = np.array(engine.codes, dtype=object)
+    ends = network[rng.integers(0, len(network), rows)]
+    others = codes[rng.integers(0, len(codes), rows)]
+    inbound = rng.random(rows) < 0.5
+    first_seen = 1_700_000_000 + rng.integers(0, 7 * 86400, rows)
+    raw = pd.DataFrame({
+        'callsign': pd.Series(rng.integers(1, 9999, rows)).map('QFA{}'.format),
+        'estDepartureAirport': np.where(inbound, others, ends),
+        'estArrivalAirport': np.where(inbound, ends, others),
+        'firstSeen': first_seen,
+        'lastSeen': first_seen + rng.integers(1800, 6 * 3600, rows),
+    })
+    flights = engine.enrich(compact_flights(raw, engine.codes))
+    return flights.dropna(subset=['Price'])
+
+
+def grouped(flights, queries):
+    """The pattern the dashboard used before: a filtered groupby per view and a pivot for the matrix"""
+    flights = flights.assign(**{name: flights[name].astype(str) for name in ('estDepartureAirport', 'estArrivalAirport')})
+    flights.pivot_table(index='estDepartureAirport', columns='estArrivalAirport', values='Price', aggfunc='size',
+                        fill_value=0)
+    for kind, a, b in queries:
+        if kind == 'outbound':
+            part, by = flights[flights['estDepartureAirport'] == a], 'estArrivalAirport'
+        elif kind == 'inbound':
+            part, by = flights[flights['estArrivalAirport'] == a], 'estDepartureAirport'
+        else:
+            part = flights[((flights['estDepartureAirport'] == a) & (flights['estArrivalAirport'] == b))
+                           | ((flights['estDepartureAirport'] == b) & (flights['estArrivalAirport'] == a))]
+            by = ['estDepartureAirport', 'estArrivalAirport']
+        part.groupby(by).agg(Flights=('Price', 'size'), Price=('Price', 'mean'), Duration=('Duration (min)', 'mean'))
+
+
+def matrix(cube, queries):
+    od = build_od_matrix(cube)
+    od.frame()
+    for kind, a, b in queries:
+        if kind == 'outbound':
+            od.outbound(a)
+        elif kind == 'inbound':
+            od.inbound(a)
+        else:
+            od.corridor(a, b)
+
+
+def timed(run, *args):
+    start = time.perf_counter()
+    run(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    engine = RouteEngine(airport_table)
+    network = list(airport_db)
+    queries = ([('outbound', code, None) for code in network] + [('inbound', code, None) for code in network]
+               + [('corridor', a, b) for a in network for b in network if a < b])
+    print(f"{'flights':>9} {'slices':>7} {'grouped (s)':>12} {'cube (s)':>9} {'od matrix (s)':>14} {'speed-up':>9}")
+    for rows in args.sizes:
+        flights = make_flights(rows, engine)
+        slow = timed(grouped, flights, queries)
+        start = time.perf_counter()
+        cube = build_cube(flights)
+        cube_seconds = time.perf_counter() - start
+        fast = timed(matrix, cube, queries)
+        print(f"{len(flights):>9} {len(queries):>7} {slow:>12.3f} {cube_seconds:>9.3f} {fast:>14.3f} {slow / fast:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
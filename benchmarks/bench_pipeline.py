@@ -0,0 +1,160 @@
+"""Time every stage of the dashboard data path against the local OpenSky stand-in
+
+Run from the repository root:
+
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000 --latency 0.1
+
+Each run writes a JSON file (default ``benchmarks/results/pipeline-<commit>.json``)
+with one record per (size, stage) so runs can be diffed across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import plotly.express as px
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import opensky
+from airports import airport_table
+from charts import POINT_BUDGET, add_trendlines, price_box_figure, price_distance_figure, trendlines
+from mock_opensky import MockOpenSky
+from cube import build_cube
+from export import export_buffer
+from pipeline import add_features, clean_flights, filter_price, summarize
+from pricing import RouteEngine
+from route_map import build_route_map
+
+WINDOW_END = 1_700_000_000
+WINDOW_SECONDS = 24 * 3600
+AIRPORT = "YSSY"
+PRICE_RANGE = (100, 500)
+
+
+# --- Stages (the same calls app.py makes) ---
+def stage_fetch(mock_url):
+    opensky.OPENSKY_API = mock_url
+    return opensky.fetch_departures(AIRPORT, WINDOW_END - WINDOW_SECONDS, WINDOW_END)
+
+
+def stage_frame(data):
+    return pd.DataFrame(data)
+
+
+def stage_clean(df):
+    return clean_flights(df)
+
+
+def stage_features(df, engine):
+    return filter_price(add_features(df, engine), PRICE_RANGE)
+
+
+def stage_cube(df):
+    return build_cube(df)
+
+
+def stage_aggregate(cube):
+    return summarize(cube.slice(PRICE_RANGE))
+
+
+def stage_figures(df, cube, agg, point_budget=POINT_BUDGET):
+    demand = px.scatter(agg.demand_price, x='Flights', y='Avg Price', size='Flights', color='Hour')
+    return [
+        px.bar(agg.route_counts.head(10), x='Arrival Airport', y='Flights', color='Flights'),
+        price_distance_figure(df, point_budget),
+        price_box_figure(df, point_budget),
+        px.line(agg.hourly_prices, x='Hour', y='Price', markers=True),
+        px.bar(agg.hourly, x='Hour', y='Flights', color='Flights'),
+        px.line(agg.daily, x='Day of Week', y='Flights', markers=True),
+        add_trendlines(demand, trendlines(agg.demand_price, 'Flights', 'Avg Price'), 'Flights', 'Avg Price'),
+        build_route_map(cube.routes(), AIRPORT),
+    ]
+
+
+def stage_serialize(figures):
+    return sum(len(figure.to_json()) for figure in figures)
+
+
+def stage_export(df):
+    return export_buffer(df, "CSV").getbuffer()
+
+
+# --- Runner ---
+def timed(results, size, stage, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    seconds = time.perf_counter() - start
+    rows = len(value) if hasattr(value, '__len__') else None
+    results.append({'size': size, 'stage': stage, 'seconds': round(seconds, 6), 'rows': rows})
+    return value
+
+
+def run(size, latency, engine, point_budget=POINT_BUDGET):
+    """Run every stage once for ``size`` flights and return one record per stage"""
+    results = []
+    with MockOpenSky(flights=size, latency=latency) as mock:
+        data = timed(results, size, 'fetch', stage_fetch, mock.url)
+    df = timed(results, size, 'frame', stage_frame, data)
+    df = timed(results, size, 'clean', stage_clean, df)
+    df = timed(results, size, 'features', stage_features, df, engine)
+    cube = timed(results, size, 'cube', stage_cube, df)
+    agg = timed(results, size, 'aggregate', stage_aggregate, cube)
+    figures = timed(results, size, 'figures', stage_figures, df, cube, agg, point_budget)
+    payload = timed(results, size, 'serialize', stage_serialize, figures)
+    results[-1]['bytes'] = payload
+    timed(results, size, 'export', stage_export, df)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock API latency in seconds")
+    parser.add_argument('--point-budget', type=int, default=POINT_BUDGET, help="Max plotted points per chart")
+    parser.add_argument('--output', help="Result file (default benchmarks/results/pipeline-<commit>.json)")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    engine = RouteEngine(airport_table)
+    run(500, 0.0, engine)  # warm-up so lazy imports are not billed to the first size
+
+    results = []
+    print(f"{'size':>9} {'stage':<12} {'seconds':>9}  rows")
+    for size in args.sizes:
+        for record in run(size, args.latency, engine, args.point_budget):
+            print(f"{record['size']:>9} {record['stage']:<12} {record['seconds']:>9.4f}  {record['rows'] or ''}")
+            results.append(record)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'pipeline-{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'benchmark': 'pipeline',
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'latency': args.latency,
+            'point_budget': args.point_budget,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
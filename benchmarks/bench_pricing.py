@@ -0,0 +1,77 @@
+"""Compare the row-wise distance/price applies with the vectorized RouteEngine
+
+Run from the repository root:
+
+    python benchmarks/bench_pricing.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import airport_table
+from pricing import RouteEngine, calculate_demand_factor, calculate_distance, generate_price
+
+
+def make_frame(rows, seed=0):
+    """Synthetic cleaned flight frame with the columns the pricing step reads"""
+    rng = np.random.default_rng(seed)
+    codes = np.array(list(airport_table), dtype=object)
+    return pd.DataFrame({
+        'callsign': np.char.add('QFA', rng.integers(1, 2000, rows).astype(str)).astype(object),
+        'firstSeen': rng.integers(1_700_000_000, 1_700_000_000 + 7 * 86400, rows),
+        'estDepartureAirport': codes[rng.integers(0, len(codes), rows)],
+        'estArrivalAirport': codes[rng.integers(0, len(codes), rows)],
+        'Hour': rng.integers(0, 24, rows),
+    })
+
+
+def rowwise(df):
+    """The original app.py implementation"""
+    df['Distance (km)'] = df.apply(
+        lambda x: calculate_distance(x['estDepartureAirport'], x['estArrivalAirport']),
+        axis=1
+    )
+    df['Price'] = df.apply(
+        lambda x: generate_price(x['Distance (km)'], x['callsign'], x['firstSeen']) * calculate_demand_factor(x['Hour']),
+        axis=1
+    )
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = RouteEngine(airport_table)
+    print(f"engine setup: {(time.perf_counter() - start) * 1000:.2f} ms for {len(engine.codes)} airports")
+    print(f"{'rows':>10} {'row-wise (s)':>14} {'vectorized (s)':>15} {'speedup':>9}  match  repeatable")
+
+    for rows in args.sizes:
+        frame = make_frame(rows)
+
+        start = time.perf_counter()
+        expected = rowwise(frame.copy())
+        slow = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = engine.enrich(frame.copy())
+        fast = time.perf_counter() - start
+
+        match = (
+            np.array_equal(expected['Distance (km)'].to_numpy(), actual['Distance (km)'].to_numpy())
+            and np.allclose(expected['Price'].to_numpy(), actual['Price'].to_numpy(), atol=0.02)
+        )
+        repeatable = np.array_equal(actual['Price'].to_numpy(), engine.enrich(frame.copy())['Price'].to_numpy())
+        print(f"{rows:>10} {slow:>14.3f} {fast:>15.4f} {slow / fast:>8.0f}x  {match!s:<5}  {repeatable}")
+
+
+if __name__ == '__main__':
+    main()
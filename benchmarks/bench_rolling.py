@@ -0,0 +1,100 @@
+"""Flights applied per refresh of a rolling 24-hour window whose flights are listed late upstream
+
+Departures from one airport are listed only once they land, as OpenSky does,
+and the window is advanced every ``--step`` minutes with a 24-hour settle
+lag, so every advance reloads the whole window. The check is that only the
+flights new to the window and the ones that expired reach the aggregates,
+and that the cube still matches ``build_cube``. Run from the repository
+root:
+
+    python benchmarks/bench_rolling.py --flights 20000 --steps 48 --step 15
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import airport_table
+from cube import build_cube
+from pipeline import prepare_flights
+from pricing import RouteEngine
+from rolling import RollingDemand
+
+WINDOW_END = 1_700_000_000
+SPAN = 24 * 3600
+SETTLE = 24 * 3600
+AIRPORT = "YSSY"
+
+
+def synthetic_flights(count, begin, end, seed=0):
+    """Departures from AIRPORT spread over [begin, end] with flight times of half an hour to 14 hours"""
+    rng = np.random.default_rng(seed)
+    codes = np.array(list(airport_table), dtype=object)
+    first_seen = np.sort(rng.integers(begin, end, count))
+    return pd.DataFrame({
+        'icao24': rng.integers(0, 1 << 24, count).astype(str),
+        'callsign': np.char.add('QF', rng.integers(0, 3000, count).astype(str)).astype(object),
+        'estDepartureAirport': AIRPORT,
+        'estArrivalAirport': codes[rng.integers(0, len(codes), count)],
+        'firstSeen': first_seen,
+        'lastSeen': first_seen + rng.integers(1800, 14 * 3600, count),
+    })
+
+
+def run(count, steps, step):
+    """Advance the window ``steps`` times; returns per-advance (seconds, applied, expected, matches build_cube)"""
+    engine = RouteEngine(airport_table)
+    raw = synthetic_flights(count, WINDOW_END - 2 * SPAN, WINDOW_END + steps * step)
+    now = [0]
+
+    def listed(begin, end):
+        return raw[(raw.firstSeen >= begin) & (raw.firstSeen <= end) & (raw.lastSeen <= now[0])]
+
+    def load(begin, end):
+        part = listed(begin, end)
+        return prepare_flights(part, engine, None) if len(part) else pd.DataFrame()
+
+    rolling = RollingDemand(SPAN, engine.codes, SETTLE)
+    now[0] = WINDOW_END
+    rolling.advance(WINDOW_END, load)
+    results = []
+    for end in range(WINDOW_END + step, WINDOW_END + (steps + 1) * step, step):
+        before = listed(end - step - SPAN, end - step)
+        now[0] = end
+        after = listed(end - SPAN, end)
+        # Flights that entered the window (new interval or listed late) plus those that left it
+        expected = len(after.index.difference(before.index)) + len(before.index.difference(after.index))
+        began = time.perf_counter()
+        snapshot = rolling.advance(end, load)
+        seconds = time.perf_counter() - began
+        reference = build_cube(load(end - SPAN, end)).table
+        matches = snapshot.cube.table.reset_index(drop=True).equals(reference[snapshot.cube.table.columns].reset_index(drop=True))
+        results.append((seconds, rolling.added + rolling.removed, expected, len(after), matches))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flights', type=int, default=20000, help="Flights over the two days before the first window end")
+    parser.add_argument('--steps', type=int, default=48)
+    parser.add_argument('--step', type=float, default=15, help="Minutes between advances")
+    args = parser.parse_args()
+
+    results = run(args.flights, args.steps, int(args.step * 60))
+    print(f"{'advance':>8}  {'ms':>8}  {'applied':>8}  {'expected':>8}  {'window':>8}  {'cube':>6}")
+    for i, (seconds, applied, expected, window, matches) in enumerate(results, 1):
+        print(f"{i:>8}  {seconds * 1000:>8.1f}  {applied:>8}  {expected:>8}  {window:>8}  {'ok' if matches else 'DIFF':>6}")
+    failed = [i for i, (_, applied, expected, _, matches) in enumerate(results, 1) if applied != expected or not matches]
+    if failed:
+        print(f"advances {failed} applied more flights than changed or differ from build_cube")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
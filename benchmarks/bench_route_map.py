@@ -0,0 +1,74 @@
+"""Compare the per-flight route map with the aggregated route map builder
+
+Run from the repository root:
+
+    python benchmarks/bench_route_map.py --sizes 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import airport_db
+from route_map import build_route_map
+
+
+def make_frame(rows, airport_code='YSSY', seed=0):
+    """Synthetic departures from one airport"""
+    rng = np.random.default_rng(seed)
+    codes = np.array([code for code in airport_db if code != airport_code], dtype=object)
+    return pd.DataFrame({
+        'estDepartureAirport': airport_code,
+        'estArrivalAirport': codes[rng.integers(0, len(codes), rows)],
+    })
+
+
+def per_flight_map(df):
+    """The original app.py implementation: one trace per flight"""
+    fig = go.Figure()
+    for _, row in df.iterrows():
+        dep_coords = airport_db[row['estDepartureAirport']]["coords"]
+        arr_coords = airport_db[row['estArrivalAirport']]["coords"]
+        fig.add_trace(go.Scattergeo(
+            lon=[dep_coords[1], arr_coords[1]],
+            lat=[dep_coords[0], arr_coords[0]],
+            mode='lines',
+            line=dict(width=1, color='#1e3d73'),
+            opacity=0.5,
+            showlegend=False
+        ))
+    return fig
+
+
+def measure(build, df):
+    """Build time in seconds, serialised size in bytes and trace count"""
+    start = time.perf_counter()
+    fig = build(df)
+    payload = fig.to_json()
+    return time.perf_counter() - start, len(payload), len(fig.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--arcs', action='store_true', help="Sample great-circle arcs in the aggregated map")
+    args = parser.parse_args()
+
+    print(f"{'flights':>8} {'per-flight (s)':>15} {'size (KB)':>10} {'traces':>7} "
+          f"{'aggregated (s)':>15} {'size (KB)':>10} {'traces':>7}")
+    for rows in args.sizes:
+        df = make_frame(rows)
+        slow, slow_size, slow_traces = measure(per_flight_map, df)
+        fast, fast_size, fast_traces = measure(lambda d: build_route_map(d, 'YSSY', arcs=args.arcs), df)
+        print(f"{rows:>8} {slow:>15.3f} {slow_size / 1024:>10.1f} {slow_traces:>7} "
+              f"{fast:>15.3f} {fast_size / 1024:>10.1f} {fast_traces:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Upstream requests and fetch time of several dashboard replicas with and without a shared cache
+
+Each replica is its own process with its own local warehouse, fetching the
+same airports and window from the OpenSky stand-in one after another. Run
+from the repository root:
+
+    python benchmarks/bench_shared_cache.py --replicas 4 --hours 24 --latency 0.2
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_opensky import MockOpenSky
+from mock_redis import MockRedis
+
+
+def replica(api_url, shared_url, warehouse_path, airports, start, end):
+    """Fetch every airport once as a fresh replica; returns (seconds, flights)"""
+    import opensky
+    opensky.OPENSKY_API = api_url
+    from pipeline import fetch_flights
+    from shared_cache import open_shared_cache
+    from warehouse import FlightWarehouse
+
+    warehouse = FlightWarehouse(warehouse_path, shared_cache=open_shared_cache(shared_url) if shared_url else None)
+    began = time.perf_counter()
+    flights = sum(len(fetch_flights(code, start, end, cache=warehouse)[0]) for code in airports)
+    return time.perf_counter() - began, flights
+
+
+def run(backend, args, workdir):
+    """Run the replicas against one backend and return a result row"""
+    end = int(time.time())
+    start = end - int(args.hours * 3600)
+    context = multiprocessing.get_context("spawn")
+    with MockOpenSky(flights_per_hour=args.flights_per_hour, latency=args.latency) as api, MockRedis() as redis:
+        shared_url = {"none": None, "sqlite": f"sqlite:///{workdir}/{backend}-shared.sqlite",
+                      "redis": redis.url}[backend]
+        times = []
+        with context.Pool(1) as pool:
+            for i in range(args.replicas):
+                warehouse_path = os.path.join(workdir, f"{backend}-replica{i}.sqlite")
+                seconds, flights = pool.apply(replica, (api.url, shared_url, warehouse_path, args.airports, start, end))
+                times.append(seconds)
+        return {
+            "backend": backend,
+            "upstream requests": api.requests,
+            "first replica (s)": round(times[0], 3),
+            "later replicas (s)": round(sum(times[1:]) / max(len(times) - 1, 1), 3),
+            "flights per replica": flights,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--replicas', type=int, default=4)
+    parser.add_argument('--airports', nargs='+', default=['YSSY', 'YMML', 'YBBN'])
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--flights-per-hour', type=float, default=120)
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock API latency in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rows = [run(backend, args, workdir) for backend in ("none", "sqlite", "redis")]
+    columns = list(rows[0])
+    print("  ".join(f"{col:>20}" for col in columns))
+    for row in rows:
+        print("  ".join(f"{row[col]!s:>20}" for col in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Dashboard cold start: import time, first paint and warm rerun in fresh processes
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --runs 5
+
+Each run starts a new interpreter, as a new replica or a restarted server
+would, renders the dashboard once without an analysis (first paint) and
+then reruns it (a widget interaction). The background prefetcher is off.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["plotly", "plotly.express", "plotly.graph_objects", "geopy", "pytz"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_loaded = time.perf_counter()
+app = AppTest.from_file({app!r}, default_timeout=120)
+app.run()
+first_paint = time.perf_counter()
+assert not app.exception, app.exception
+app.run()
+rerun = time.perf_counter()
+print(json.dumps({{
+    "streamlit": streamlit_loaded - started,
+    "first_paint": first_paint - streamlit_loaded,
+    "rerun": rerun - first_paint,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure():
+    """Timings of one fresh interpreter"""
+    env = dict(os.environ, PREFETCH_INTERVAL_SECONDS="0")
+    probe = PROBE.format(app=os.path.join(ROOT, "app.py"), heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    print(f"{'stage':<28} {'median (s)':>10} {'min (s)':>8}")
+    for key, label in (("streamlit", "import streamlit"), ("first_paint", "first paint (app imports)"),
+                       ("rerun", "warm rerun")):
+        values = [run[key] for run in runs]
+        print(f"{label:<28} {statistics.median(values):>10.3f} {min(values):>8.3f}")
+    print("heavy modules loaded before any analysis:", ", ".join(runs[0]["loaded"]) or "none")
+
+
+if __name__ == '__main__':
+    main()
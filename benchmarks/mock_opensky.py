@@ -0,0 +1,208 @@
+"""Local stand-in for the OpenSky flights API
+
+Generates realistic ``flights/departure`` and ``flights/arrival`` payloads of
+a chosen size and serves them with configurable latency, so the dashboard and
+the benchmarks can run without touching the live service:
+
+    python benchmarks/mock_opensky.py --port 8765 --flights-per-hour 120 --latency 0.2
+    OPENSKY_API_URL=http://127.0.0.1:8765/api streamlit run app.py
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import airport_db, airport_table
+from pricing import RouteEngine
+
+AIRLINES = np.array(["QFA", "VOZ", "JST", "RXA", "QLK", "NWK", "ANZ", "SIA"])
+OTHER_AIRPORTS = np.array(["NZAA", "NZCH", "WSSS", "WADD", "YBAS", "YBTL", "YBRM", "YPKA", "NFFN", "RJAA"])
+CRUISE_KMH = 780
+
+# Relative departure volume per local hour: quiet nights, morning and evening banks
+HOURLY_PROFILE = np.array([
+    1, 0.5, 0.3, 0.3, 0.5, 2, 6, 9, 9, 7, 6, 6,
+    6, 6, 6, 7, 8, 9, 9, 7, 5, 4, 3, 2,
+], dtype=float)
+
+
+def generate_flights(airport_code, begin, end, count, seed=0, direction="departure"):
+    """``count`` OpenSky-shaped flight dicts for one airport in [begin, end]"""
+    if count <= 0 or end < begin:
+        return []
+    rng = np.random.default_rng([seed, zlib.crc32(airport_code.encode()), int(begin), int(end)])
+    engine = RouteEngine(airport_table)
+    local_codes = np.array([code for code in airport_db if code != airport_code])
+
+    # Departure times follow the daily profile
+    hours = np.arange(int(begin) // 3600, int(end) // 3600 + 1)
+    weights = HOURLY_PROFILE[(hours + 10) % 24]  # AEST offset
+    hour = rng.choice(hours, size=count, p=weights / weights.sum())
+    times = np.clip(hour * 3600 + rng.integers(0, 3600, count), begin, end)
+
+    # Mostly domestic, some international/regional and some unknown destinations
+    other = rng.choice(local_codes, count).astype(object)
+    kind = rng.random(count)
+    other[kind > 0.85] = rng.choice(OTHER_AIRPORTS, int((kind > 0.85).sum()))
+    other[kind > 0.95] = None
+
+    known = np.array([code is not None for code in other])
+    distances = np.full(count, 3000.0)
+    distances[known] = np.nan_to_num(engine.distances(np.full(known.sum(), airport_code), other[known]), nan=3000.0)
+    durations = (distances / CRUISE_KMH * 3600 + rng.integers(900, 2400, count)).astype(int)
+
+    if direction == "departure":
+        first_seen, last_seen = times, times + durations
+        departures, arrivals = np.full(count, airport_code, dtype=object), other
+    else:
+        first_seen, last_seen = times - durations, times
+        departures, arrivals = other, np.full(count, airport_code, dtype=object)
+
+    callsigns = np.char.ljust(
+        np.char.add(rng.choice(AIRLINES, count), rng.integers(1, 9999, count).astype(str)), 8
+    )
+    icao24 = [f"{value:06x}" for value in rng.integers(0x7C0000, 0x7FFFFF, count)]
+    horizontal = rng.integers(200, 3000, (count, 2)).tolist()
+    vertical = rng.integers(20, 200, (count, 2)).tolist()
+    first_seen, last_seen, candidates = first_seen.tolist(), last_seen.tolist(), known.astype(int).tolist()
+    callsigns = callsigns.tolist()
+
+    return [
+        {
+            "icao24": icao24[i],
+            "firstSeen": first_seen[i],
+            "estDepartureAirport": departures[i],
+            "lastSeen": last_seen[i],
+            "estArrivalAirport": arrivals[i],
+            "callsign": callsigns[i],
+            "estDepartureAirportHorizDistance": horizontal[i][0],
+            "estDepartureAirportVertDistance": vertical[i][0],
+            "estArrivalAirportHorizDistance": horizontal[i][1],
+            "estArrivalAirportVertDistance": vertical[i][1],
+            "departureAirportCandidatesCount": 1,
+            "arrivalAirportCandidatesCount": candidates[i],
+        }
+        for i in range(count)
+    ]
+
+
+class MockOpenSky:
+    """Threaded HTTP server answering ``/api/flights/departure`` and ``/api/flights/arrival``
+
+    Each response holds ``flights`` flights when set, otherwise
+    ``flights_per_hour`` for every hour of the requested interval.
+    ``failure_rate`` answers that share of requests with HTTP 503.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, flights=None, flights_per_hour=120, latency=0.0,
+                 failure_rate=0.0, seed=0):
+        self.flights = flights
+        self.flights_per_hour = flights_per_hour
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.requests = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def payload(self, direction, airport_code, begin, end):
+        """Serialized response body for one request"""
+        count = self.flights if self.flights is not None else int(self.flights_per_hour * (end - begin + 1) / 3600)
+        return json.dumps(generate_flights(airport_code, begin, end, count, self.seed, direction)).encode()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with mock._lock:
+                    mock.requests += 1
+                    fail = mock._rng.random() < mock.failure_rate
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                url = urlparse(self.path)
+                direction = url.path.rstrip("/").rsplit("/", 1)[-1]
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if fail:
+                    return self._send(503, b'{"error": "mock outage"}')
+                if direction not in ("departure", "arrival") or not {"airport", "begin", "end"} <= query.keys():
+                    return self._send(400, b'{"error": "bad request"}')
+
+                body = mock.payload(direction, query["airport"], int(query["begin"]), int(query["end"]))
+                if body == b"[]":
+                    return self._send(404, b"[]")
+                self._send(200, body)
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--flights', type=int, default=None, help="Fixed number of flights per response")
+    parser.add_argument('--flights-per-hour', type=float, default=120)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockOpenSky(args.host, args.port, args.flights, args.flights_per_hour, args.latency,
+                         args.failure_rate, args.seed)
+    print(f"Mock OpenSky API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
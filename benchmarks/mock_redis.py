@@ -0,0 +1,231 @@
+"""Local stand-in for a Redis server, enough for the shared flight cache
+
+Speaks RESP2 and implements the commands ``shared_cache.RedisBackend`` sends
+(GET/MGET/SET EX/DEL/INCRBY/SCAN plus the hash and sorted-set commands of its
+LRU index), with an optional ``maxmemory`` enforced by least-recently-used
+eviction, so several dashboard replicas can share a cache without installing
+Redis:
+
+    python benchmarks/mock_redis.py --port 6390 --max-bytes 268435456
+    SHARED_CACHE_URL=redis://127.0.0.1:6390 streamlit run app.py
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+
+class Store:
+    """Thread-safe byte-string store with LRU eviction beyond ``max_bytes``"""
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.policy = "allkeys-lru"
+        self.data = OrderedDict()
+        self.hashes = {}     # key -> {field: value}
+        self.zsets = {}      # key -> {member: score}
+        self.expires = {}    # key -> expiry time
+        self.used = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.delete(key)
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.delete(key)
+        self.data[key] = value
+        if ttl is not None:
+            self.expires[key] = time.time() + ttl
+        self.used += len(key) + len(value)
+        while self.max_bytes and self.used > self.max_bytes and len(self.data) > 1:
+            oldest, old_value = self.data.popitem(last=False)
+            self.used -= len(oldest) + len(old_value)
+            self.evicted += 1
+
+    def keys(self):
+        return [*self.data, *self.hashes, *self.zsets]
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        if self.hashes.pop(key, None) is not None or self.zsets.pop(key, None) is not None:
+            return 1
+        value = self.data.pop(key, None)
+        if value is None:
+            return 0
+        self.used -= len(key) + len(value)
+        return 1
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()   # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            if not command:
+                continue
+            with self.server.store.lock:
+                try:
+                    reply = self.run(command[0].upper().decode(), command[1:])
+                except (ValueError, IndexError) as e:
+                    reply = RuntimeError(f"ERR {e}")
+            self.wfile.write(encode(reply))
+
+    def run(self, name, args):
+        store = self.server.store
+        if name in ("PING", "AUTH", "SELECT", "CLIENT"):
+            return "PONG" if name == "PING" else "OK"
+        if name == "GET":
+            return store.get(args[0])
+        if name == "MGET":
+            return [store.get(key) for key in args]
+        if name == "SET":
+            options = [arg.upper() for arg in args[2:]]
+            store.set(args[0], args[1], int(args[3 + options.index(b"EX")]) if b"EX" in options else None)
+            return "OK"
+        if name == "HSET":
+            fields = store.hashes.setdefault(args[0], {})
+            added = sum(field not in fields for field in args[1::2])
+            fields.update(zip(args[1::2], args[2::2]))
+            return added
+        if name == "HMGET":
+            return [store.hashes.get(args[0], {}).get(field) for field in args[1:]]
+        if name == "HDEL":
+            fields = store.hashes.get(args[0], {})
+            return sum(fields.pop(field, None) is not None for field in args[1:])
+        if name == "HLEN":
+            return len(store.hashes.get(args[0], {}))
+        if name == "ZADD":
+            only_existing = args[1].upper() == b"XX"
+            scores = store.zsets.setdefault(args[0], {})
+            pairs = args[2:] if only_existing else args[1:]
+            added = 0
+            for score, member in zip(pairs[::2], pairs[1::2]):
+                if only_existing and member not in scores:
+                    continue
+                added += member not in scores
+                scores[member] = float(score)
+            return added
+        if name == "ZREM":
+            scores = store.zsets.get(args[0], {})
+            return sum(scores.pop(member, None) is not None for member in args[1:])
+        if name == "ZCARD":
+            return len(store.zsets.get(args[0], {}))
+        if name == "ZRANGE":
+            ranked = sorted(store.zsets.get(args[0], {}).items(), key=lambda item: (item[1], item[0]))
+            stop = int(args[2])
+            return [member for member, _ in ranked[int(args[1]):None if stop == -1 else stop + 1]]
+        if name == "DEL":
+            return sum(store.delete(key) for key in args)
+        if name == "INCRBY" or name == "INCR":
+            value = int(store.get(args[0]) or 0) + (int(args[1]) if name == "INCRBY" else 1)
+            store.set(args[0], str(value).encode())
+            return value
+        if name == "DBSIZE":
+            return len(store.keys())
+        if name == "FLUSHDB" or name == "FLUSHALL":
+            for container in (store.data, store.hashes, store.zsets, store.expires):
+                container.clear()
+            store.used = 0
+            return "OK"
+        if name == "SCAN":
+            options = {args[i].upper(): args[i + 1] for i in range(1, len(args) - 1, 2)}
+            pattern = options.get(b"MATCH", b"*").decode()
+            return [b"0", [key for key in store.keys() if fnmatch.fnmatchcase(key.decode(), pattern)]]
+        if name == "INFO":
+            return (f"# Memory\r\nused_memory:{store.used}\r\nmaxmemory:{store.max_bytes}\r\n"
+                    f"maxmemory_policy:{store.policy}\r\n# Stats\r\nevicted_keys:{store.evicted}\r\n").encode()
+        if name == "CONFIG" and args[0].upper() == b"SET":
+            if args[1].lower() == b"maxmemory":
+                store.max_bytes = int(args[2])
+            elif args[1].lower() == b"maxmemory-policy":
+                store.policy = args[2].decode()
+            return "OK"
+        if name == "CONFIG" and args[0].upper() == b"GET":
+            key = args[1].decode().lower()
+            return [key.encode(), str({"maxmemory": store.max_bytes}.get(key, store.policy)).encode()]
+        return RuntimeError(f"ERR unknown command '{name}'")
+
+
+def encode(reply):
+    """RESP2 encoding of a reply"""
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RuntimeError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+class MockRedis(socketserver.ThreadingTCPServer):
+    """Threaded RESP server over one shared Store"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, max_bytes=0):
+        super().__init__((host, port), RedisHandler)
+        self.store = Store(max_bytes)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        """Serve in a background thread"""
+        threading.Thread(target=self.serve_forever, name="mock-redis", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--max-bytes', type=int, default=0, help="Evict least recently used keys beyond this size")
+    args = parser.parse_args()
+
+    server = MockRedis(args.host, args.port, args.max_bytes)
+    print(f"Mock Redis listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
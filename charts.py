@@ -0,0 +1,163 @@
+"""Chart data layer for the flight-level Pricing and Demand charts
+
+Summary statistics (quartiles, fences, least-squares trendlines) are computed
+exactly over every flight with NumPy, while only a capped, stratified sample
+of the flights is sent to the browser as plotted points. Plotly is imported
+by the figure builders, so importing this module stays cheap.
+"""
+import numpy as np
+import pandas as pd
+
+from profiling import timed
+
+POINT_BUDGET = 2000   # default maximum number of plotted points per chart
+SAMPLE_SEED = 0       # fixed so reruns plot the same sample
+
+
+# --- Sampling ---
+def largest_remainder(weights, total, rng):
+    """Integer shares of ``total`` (at most the weights' sum) in proportion to ``weights``, summing to ``total``
+
+    Each share is the floor of its exact share, and the units left over go to
+    the largest fractional parts, ties broken at random.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    exact = total * weights / max(weights.sum(), 1)
+    shares = np.floor(exact).astype(np.int64)
+    fractions = exact - shares
+    short = total - shares.sum()
+    shares[np.lexsort((rng.random(len(weights)), -fractions))[:short]] += 1
+    return shares
+
+
+def sample_points(df, budget=POINT_BUDGET, by=None, seed=SAMPLE_SEED):
+    """Exactly ``min(budget, len(df))`` rows, allocated to the ``by`` groups in proportion to their size
+
+    Every group gets at least one row when there are no more groups than
+    ``budget``; otherwise a random subset of ``budget`` groups gets one each.
+    """
+    if len(df) <= budget:
+        return df
+    rng = np.random.default_rng(seed)
+    priority = rng.random(len(df))
+    if by is None:
+        return df.iloc[np.sort(np.argsort(priority)[:budget])]
+
+    column = df[by]
+    groups = column.array if isinstance(column.dtype, pd.CategoricalDtype) else pd.Categorical(column.to_numpy())
+    codes = np.asarray(groups.codes, dtype=np.int64)
+    sizes = np.bincount(codes, minlength=len(groups.categories))
+    present = sizes > 0
+    if present.sum() > budget:
+        quotas = np.zeros_like(sizes)
+        quotas[rng.choice(np.flatnonzero(present), budget, replace=False)] = 1
+    else:
+        quotas = present + largest_remainder(sizes - present, budget - present.sum(), rng)
+
+    # Rank rows within their group by random priority and keep each group's quota
+    order = np.lexsort((priority, codes))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ranks = np.arange(len(df)) - starts[codes[order]]
+    keep = order[ranks < quotas[codes[order]]]
+    return df.iloc[np.sort(keep)]
+
+
+# --- Exact Statistics ---
+def linear_fit(x, y):
+    """Least-squares (slope, intercept) of y on x, or None with fewer than two points"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) < 2:
+        return None
+    design = np.column_stack([x, np.ones_like(x)])
+    (slope, intercept), *_ = np.linalg.lstsq(design, y, rcond=None)
+    return slope, intercept
+
+
+def trendlines(df, x, y, by=None):
+    """Fitted line endpoints per group: by, x, y (two rows per group)"""
+    groups = [(None, df)] if by is None else df.groupby(by, observed=True, sort=False)
+    rows = []
+    for name, group in groups:
+        fit = linear_fit(group[x], group[y])
+        if fit is None:
+            continue
+        ends = np.array([group[x].min(), group[x].max()], dtype=np.float64)
+        rows.extend({by: name, x: end, y: fit[0] * end + fit[1]} for end in ends)
+    return pd.DataFrame(rows, columns=[by, x, y] if by is not None else [x, y])
+
+
+def box_stats(values):
+    """Quartiles, mean and Tukey fences (clipped to the data) as Plotly precomputed box fields"""
+    values = np.asarray(values, dtype=np.float64)
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {
+        'q1': q1, 'median': median, 'q3': q3, 'mean': values.mean(),
+        'lowerfence': inside.min(), 'upperfence': inside.max(),
+    }
+
+
+# --- Figures ---
+def add_trendlines(fig, lines, x, y, by=None):
+    """Draw fitted lines, reusing the colour of the scatter trace with the same name"""
+    import plotly.graph_objects as go
+    colors = {trace.name: trace.marker.color for trace in fig.data}
+    groups = [(None, lines)] if by is None else lines.groupby(by, observed=True, sort=False)
+    for name, line in groups:
+        fig.add_trace(go.Scatter(
+            x=line[x], y=line[y], mode='lines',
+            line=dict(color=colors.get(str(name)) if name is not None else None),
+            name=f"{name} trend" if name is not None else "Trend",
+            legendgroup=str(name), showlegend=False, hoverinfo='skip',
+        ))
+    return fig
+
+
+@timed("price_distance_figure", rows=None)
+def price_distance_figure(df, budget=POINT_BUDGET):
+    """Sampled price vs distance scatter with exact per-airport trendlines"""
+    import plotly.express as px
+    points = sample_points(df, budget, by='estArrivalAirport')
+    points = points.assign(estArrivalAirport=points['estArrivalAirport'].astype(str))
+    fig = px.scatter(
+        points,
+        x='Distance (km)',
+        y='Price',
+        color='estArrivalAirport',
+        title="Price vs Distance" + (f" ({len(points):,} of {len(df):,} flights shown)" if len(points) < len(df) else ""),
+        labels={'Distance (km)': 'Distance (km)', 'Price': 'Price (AUD)'},
+        hover_data=['estArrivalAirport', 'Hour']
+    )
+    fig.update_traces(marker=dict(size=8, opacity=0.7))
+    lines = trendlines(df, 'Distance (km)', 'Price', by='estArrivalAirport')
+    lines['estArrivalAirport'] = lines['estArrivalAirport'].astype(str)
+    return add_trendlines(fig, lines, 'Distance (km)', 'Price', by='estArrivalAirport')
+
+
+@timed("price_box_figure", rows=None)
+def price_box_figure(df, budget=POINT_BUDGET, color='#1e3d73'):
+    """Box plot from exact quartiles over every price, with a sample of the prices drawn beside it"""
+    import plotly.graph_objects as go
+    prices = df['Price'].to_numpy()
+    stats = box_stats(prices)
+    sample = sample_points(df, budget)['Price'].to_numpy()
+    jitter = np.random.default_rng(SAMPLE_SEED).uniform(-0.08, 0.08, len(sample))
+
+    fig = go.Figure()
+    fig.add_trace(go.Box(
+        x=[0], name='Price', marker_color=color,
+        **{key: [value] for key, value in stats.items()}
+    ))
+    fig.add_trace(go.Scatter(
+        x=-0.4 + jitter, y=sample, mode='markers', name='Flights',
+        marker=dict(color=color, size=4, opacity=0.5), hoverinfo='y'
+    ))
+    fig.update_layout(
+        title="Ticket Price Distribution",
+        yaxis_title="Price",
+        xaxis=dict(showticklabels=False, title=None),
+        showlegend=False
+    )
+    return fig
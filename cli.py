@@ -0,0 +1,147 @@
+"""Batch runner for the flight demand pipeline
+
+Processes many airports and time windows without Streamlit and writes the
+enriched flights and aggregates as Parquet, e.g. from a cron job:
+
+    python cli.py --airports all --hours 24 --output-dir exports
+    python cli.py --airports YSSY YMML --start 2024-05-01 --end 2024-05-08 --window-hours 24
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import fields
+from datetime import datetime
+
+import pandas as pd
+
+from airports import airport_db, airport_table
+from opensky import make_session
+from pipeline import DEFAULT_PRICE_RANGE, PipelineResult, run_pipeline
+from pricing import RouteEngine
+from profiling import configure
+from shared_cache import open_shared_cache
+from warehouse import FlightWarehouse
+
+
+def parse_time(value: str) -> int:
+    """Epoch seconds from an ISO date/datetime or a plain epoch value"""
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def split_windows(start_time: int, end_time: int, window_hours: float | None) -> list[tuple[int, int]]:
+    """Consecutive (start, end) windows covering the range"""
+    if not window_hours:
+        return [(start_time, end_time)]
+    step = int(window_hours * 3600)
+    starts = range(start_time, max(end_time, start_time + 1), step)
+    return [(begin, min(begin + step - 1, end_time)) for begin in starts]
+
+
+def write_result(result: PipelineResult, output_dir: str) -> str:
+    """Write flights, the demand cube and every aggregate table of one run as Parquet files"""
+    window = (
+        f"{datetime.fromtimestamp(result.start_time):%Y%m%dT%H%M}_"
+        f"{datetime.fromtimestamp(result.end_time):%Y%m%dT%H%M}"
+    )
+    path = os.path.join(output_dir, result.airport_code, window)
+    os.makedirs(path, exist_ok=True)
+
+    result.flights.to_parquet(os.path.join(path, "flights.parquet"), index=False)
+    if result.cube is not None:
+        result.cube.table.to_parquet(os.path.join(path, "cube.parquet"), index=False)
+    if result.od is not None:
+        result.od.pairs().to_parquet(os.path.join(path, "od_pairs.parquet"), index=False)
+    summary = {}
+    if result.aggregates is not None:
+        for item in fields(result.aggregates):
+            value = getattr(result.aggregates, item.name)
+            if isinstance(value, pd.DataFrame):
+                value.to_parquet(os.path.join(path, f"{item.name}.parquet"), index=False)
+            else:
+                summary[item.name] = value
+
+    with open(os.path.join(path, "summary.json"), "w") as f:
+        json.dump({
+            "airport": result.airport_code,
+            "start_time": result.start_time,
+            "end_time": result.end_time,
+            "flights": len(result.flights),
+            **summary,
+            "chunks": result.report,
+            "arrival_chunks": result.arrival_report,
+        }, f, indent=2, default=str)
+    return path
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--airports", nargs="+", default=["all"], help="ICAO codes, or 'all' for every airport")
+    parser.add_argument("--hours", type=float, default=24, help="Window ending now (ignored with --start)")
+    parser.add_argument("--start", help="Range start (ISO date/datetime or epoch seconds)")
+    parser.add_argument("--end", help="Range end (default now)")
+    parser.add_argument("--window-hours", type=float, help="Split the range into windows of this many hours")
+    parser.add_argument("--price-min", type=float, default=DEFAULT_PRICE_RANGE[0])
+    parser.add_argument("--price-max", type=float, default=DEFAULT_PRICE_RANGE[1])
+    parser.add_argument("--workers", type=int, default=4, help="Airports/windows processed concurrently")
+    parser.add_argument("--arrivals", action="store_true",
+                        help="Also fetch arrivals and write the origin-destination pairs (od_pairs.parquet)")
+    parser.add_argument("--output-dir", default="exports")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the local flight warehouse and shared cache")
+    parser.add_argument("--shared-cache", help="Cache shared with other replicas, e.g. redis://host:6379/0 "
+                                               "(default SHARED_CACHE_URL)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Log per-stage timings and write metrics.prom to the output directory")
+    args = parser.parse_args(argv)
+
+    airports = list(airport_db) if args.airports == ["all"] else args.airports
+    unknown = [code for code in airports if code not in airport_db]
+    if unknown:
+        parser.error(f"unknown airport(s): {', '.join(unknown)}")
+
+    end_time = parse_time(args.end) if args.end else int(time.time())
+    start_time = parse_time(args.start) if args.start else end_time - int(args.hours * 3600)
+    end_time = min(end_time, int(time.time()))
+
+    profiler = configure(True, os.path.join(args.output_dir, "metrics.prom")) if args.profile else None
+    engine = RouteEngine(airport_table)
+    cache = None if args.no_cache else FlightWarehouse(shared_cache=open_shared_cache(args.shared_cache))
+    session = make_session(args.workers * 4)
+    windows = split_windows(start_time, end_time, args.window_hours)
+    jobs = [(code, begin, end) for code in airports for begin, end in windows]
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        price_range = (args.price_min, args.price_max)
+        futures = {
+            pool.submit(run_pipeline, code, begin, end, price_range, engine, cache, session,
+                        arrivals=args.arrivals): (code, begin)
+            for code, begin, end in jobs
+        }
+        for future in as_completed(futures):
+            code, begin = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"{code} {datetime.fromtimestamp(begin):%Y-%m-%d %H:%M}: failed ({e})", file=sys.stderr)
+                continue
+            path = write_result(result, args.output_dir)
+            failed_chunks = sum(row["status"] == "failed" for row in result.report + result.arrival_report)
+            failures += bool(failed_chunks)
+            note = f", {failed_chunks} chunk(s) failed" if failed_chunks else ""
+            print(f"{code} {datetime.fromtimestamp(begin):%Y-%m-%d %H:%M}: {len(result.flights)} flights -> {path}{note}")
+
+    if profiler is not None:
+        profiler.write_metrics()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""Pre-aggregated demand cube shared by every dashboard tab, metric and insight
+
+One grouped pass over the enriched flights produces counts, sums and
+minimum/maximum of price, distance and duration per
+(departure, arrival, hour, weekday) cell. Every statistic the dashboard
+shows is a cheap roll-up of that table.
+
+The price slider is answered from a PriceIndex: each flight's price, sorted
+within its cell, so the flights of a cell inside a price range are one
+contiguous run found with ``searchsorted``. Cells entirely inside the range
+keep their row; only the cells a bound cuts through are re-aggregated, from
+their runs. Distance depends only on the route, so it is the same for every
+flight of a cell.
+"""
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from flight_frame import DAY_ORDER
+from profiling import timed
+
+KEYS = ['estDepartureAirport', 'estArrivalAirport', 'Hour', 'Weekday']
+MEASURES = {'price': 'Price', 'distance': 'Distance (km)', 'duration': 'Duration (min)'}
+CUBE_COLUMNS = KEYS + ['count'] + [
+    f'{prefix}_{stat}' for prefix in MEASURES for stat in ('sum', 'min', 'max')
+] + ['price_per_km_min']
+PRICE_BITS = 32   # a price's sort key occupies the low bits of its PriceIndex key
+
+
+# --- Price Index ---
+def price_order(prices):
+    """Integers in [0, 2**32) that sort like the float32 prices"""
+    bits = np.asarray(prices, dtype=np.float32).view(np.uint32).astype(np.int64)
+    return np.where(bits >= 1 << 31, 0xFFFFFFFF - bits, bits | 1 << 31)
+
+
+def order_prices(order):
+    """float32 prices of ``price_order`` values"""
+    order = np.asarray(order, dtype=np.int64)
+    bits = np.where(order >= 1 << 31, order ^ 1 << 31, 0xFFFFFFFF - order)
+    return bits.astype(np.uint32).view(np.float32)
+
+
+@dataclass(frozen=True)
+class PriceIndex:
+    """Flights sorted by (cell, price), with the price range already applied
+
+    ``cells`` holds the cell id of each cube row, ``keys`` the sorted
+    ``cell << PRICE_BITS | price_order(price)`` of every flight and
+    ``durations`` their durations in the same order.
+    """
+    cells: np.ndarray
+    keys: np.ndarray
+    durations: np.ndarray
+    low: int = 0
+    high: int = (1 << PRICE_BITS) - 1
+
+    def runs(self, rows, low, high):
+        """(begin, end) positions in ``keys`` of the flights of some rows priced in [low, high] (price_order)"""
+        cells = self.cells[rows] << PRICE_BITS
+        low, high = max(low, self.low), min(high, self.high)
+        return np.searchsorted(self.keys, cells | low), np.searchsorted(self.keys, cells | high, side='right')
+
+
+def _gather(begins, ends):
+    """Positions of every run, concatenated, and the offset of each run in them"""
+    lengths = ends - begins
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) - np.repeat(offsets - begins, lengths)
+    return positions, offsets
+
+
+@timed("cube", rows=lambda cube: len(cube.table))
+def build_cube(flights):
+    """Aggregate a compact flight frame into a DemandCube in one grouped pass"""
+    if flights.empty:
+        return DemandCube(_empty_table(flights), _empty_index())
+
+    price = flights['Price'].to_numpy()
+    columns = {
+        'estDepartureAirport': flights['estDepartureAirport'].cat.codes.to_numpy().astype(np.int64),
+        'estArrivalAirport': flights['estArrivalAirport'].cat.codes.to_numpy().astype(np.int64),
+        'Hour': flights['Hour'].to_numpy().astype(np.int64),
+        'Weekday': flights['Weekday'].to_numpy().astype(np.int64),
+    }
+
+    # Mixed-radix group key so one sort groups every dimension at once, by price within each cell
+    key = np.zeros(len(flights), dtype=np.int64)
+    for name in KEYS:
+        values = columns[name] - columns[name].min()
+        key = key * (int(values.max()) + 1) + values
+    prices = price_order(price)
+    order = np.lexsort((prices, key))
+    sorted_key = key[order]
+    new_cell = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+    starts = np.flatnonzero(new_cell)
+    first = order[starts]
+    index = PriceIndex(
+        cells=np.arange(len(starts), dtype=np.int64),
+        keys=(np.cumsum(new_cell) - 1) << PRICE_BITS | prices[order],
+        durations=flights['Duration (min)'].to_numpy()[order],
+    )
+
+    table = {name: columns[name][first] for name in KEYS}
+    table['count'] = np.diff(np.r_[starts, len(order)])
+    for prefix, col in MEASURES.items():
+        values = flights[col].to_numpy(dtype=np.float64)[order]
+        table[f'{prefix}_sum'] = np.add.reduceat(values, starts)
+        table[f'{prefix}_min'] = np.minimum.reduceat(values, starts)
+        table[f'{prefix}_max'] = np.maximum.reduceat(values, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_km = price[order] / flights['Distance (km)'].to_numpy(dtype=np.float64)[order]
+    table['price_per_km_min'] = np.minimum.reduceat(per_km, starts)
+
+    table = pd.DataFrame(table)
+    for name in ('estDepartureAirport', 'estArrivalAirport'):
+        categories = flights[name].cat.categories
+        table[name] = pd.Categorical.from_codes(table[name].to_numpy(), categories=categories)
+    return DemandCube(table, index)
+
+
+def _empty_table(flights):
+    table = pd.DataFrame({name: pd.Series(dtype=np.float64) for name in CUBE_COLUMNS})
+    for name in ('estDepartureAirport', 'estArrivalAirport'):
+        categories = flights[name].cat.categories if name in flights else []
+        table[name] = pd.Categorical([], categories=categories)
+    return table
+
+
+def _empty_index():
+    return PriceIndex(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+
+class DemandCube:
+    """Aggregate table with roll-ups for each dashboard view"""
+
+    def __init__(self, table, prices):
+        self.table = table
+        self.prices = prices
+        self._rollups = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def empty(self):
+        return self.table.empty
+
+    def slice(self, price_range=None, departure=None, arrival=None):
+        """Sub-cube for a price range (inclusive, compared like ``pipeline.filter_price``) and/or airports"""
+        table = self.table
+        mask = np.ones(len(table), dtype=bool)
+        if departure is not None:
+            mask &= (table['estDepartureAirport'] == departure).to_numpy()
+        if arrival is not None:
+            mask &= (table['estArrivalAirport'] == arrival).to_numpy()
+        if price_range is None:
+            return DemandCube(table[mask], replace(self.prices, cells=self.prices.cells[mask]))
+        return self._price_slice(np.flatnonzero(mask), *price_range)
+
+    def _price_slice(self, rows, low, high):
+        low, high = np.float32(low), np.float32(high)
+        low_order, high_order = (int(order[0]) for order in (price_order([low]), price_order([high])))
+        table = self.table
+        price_min, price_max = table['price_min'].to_numpy()[rows], table['price_max'].to_numpy()[rows]
+        inside = (price_min >= low) & (price_max <= high)
+        cut = ~inside & (price_max >= low) & (price_min <= high)
+
+        # Re-aggregate the cells a bound cuts through from their runs of in-range prices
+        begins, ends = self.prices.runs(rows[cut], low_order, high_order)
+        cut_rows = rows[cut][ends > begins]
+        begins, ends = begins[ends > begins], ends[ends > begins]
+        positions, offsets = _gather(begins, ends)
+        prices = order_prices(self.prices.keys[positions] & (1 << PRICE_BITS) - 1).astype(np.float64)
+        durations = self.prices.durations[positions].astype(np.float64)
+        count = ends - begins
+
+        keep = np.sort(np.concatenate([rows[inside], cut_rows]))
+        columns = {name: table[name].array.take(keep) if name in KEYS[:2] else table[name].to_numpy()[keep]
+                   for name in table.columns}
+        at = np.searchsorted(keep, cut_rows)
+        distance = columns['distance_min'][at]
+        columns['count'][at] = count
+        columns['distance_sum'][at] = count * distance
+        if len(offsets):
+            columns['price_sum'][at] = np.add.reduceat(prices, offsets)
+            columns['price_min'][at] = prices[offsets]
+            columns['price_max'][at] = prices[offsets + count - 1]
+            for stat, reduce in (('sum', np.add), ('min', np.minimum), ('max', np.maximum)):
+                columns[f'duration_{stat}'][at] = reduce.reduceat(durations, offsets)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                columns['price_per_km_min'][at] = prices[offsets] / distance
+        sliced = pd.DataFrame(columns, index=table.index[keep])
+        prices = replace(self.prices, cells=self.prices.cells[keep],
+                         low=max(self.prices.low, low_order), high=min(self.prices.high, high_order))
+        return DemandCube(sliced, prices)
+
+    def rollup(self, by):
+        """Counts, sums, minima and maxima grouped by some of the key columns (memoized per cube)"""
+        key = (by,) if isinstance(by, str) else tuple(by)
+        if key not in self._rollups:
+            groups = self.table.groupby(list(key), observed=True, sort=True)
+            sums = groups[['count'] + [f'{prefix}_sum' for prefix in MEASURES]].sum()
+            minima = groups[[f'{prefix}_min' for prefix in MEASURES] + ['price_per_km_min']].min()
+            maxima = groups[[f'{prefix}_max' for prefix in MEASURES]].max()
+            self._rollups[key] = pd.concat([sums, minima, maxima], axis=1).reset_index()
+        return self._rollups[key]
+
+    # --- Totals ---
+    @property
+    def total_flights(self):
+        return int(self.table['count'].sum())
+
+    @property
+    def avg_price(self):
+        total = self.total_flights
+        return float(self.table['price_sum'].sum() / total) if total else 0.0
+
+    # --- Views ---
+    def route_counts(self):
+        """Arrival Airport, Flights (busiest first)"""
+        routes = self.rollup('estArrivalAirport')
+        routes = routes.sort_values(['count', 'estArrivalAirport'], ascending=[False, True], kind='stable')
+        return pd.DataFrame({
+            'Arrival Airport': routes['estArrivalAirport'].astype(str).to_numpy(),
+            'Flights': routes['count'].to_numpy(),
+        })
+
+    def routes(self):
+        """estDepartureAirport, estArrivalAirport, Flights for the route map (busiest first)"""
+        routes = self.rollup(['estDepartureAirport', 'estArrivalAirport'])
+        routes = routes.rename(columns={'count': 'Flights'})[['estDepartureAirport', 'estArrivalAirport', 'Flights']]
+        return routes.sort_values('Flights', ascending=False, ignore_index=True)
+
+    def route_efficiency(self):
+        """Mean distance, duration and price per arrival airport"""
+        routes = self.rollup('estArrivalAirport')
+        return pd.DataFrame({
+            'estArrivalAirport': routes['estArrivalAirport'].astype(str).to_numpy(),
+            'Distance (km)': routes['distance_sum'] / routes['count'],
+            'Duration (min)': routes['duration_sum'] / routes['count'],
+            'Price': routes['price_sum'] / routes['count'],
+        }).assign(**{'Price per km': lambda d: d['Price'] / d['Distance (km)']})
+
+    def hourly(self):
+        """Hour, Flights"""
+        hours = self.rollup('Hour')
+        return pd.DataFrame({'Hour': hours['Hour'], 'Flights': hours['count']})
+
+    def hourly_prices(self):
+        """Hour, Price (mean)"""
+        hours = self.rollup('Hour')
+        return pd.DataFrame({'Hour': hours['Hour'], 'Price': hours['price_sum'] / hours['count']})
+
+    def demand_price(self):
+        """Hour, Avg Price, Flights"""
+        hours = self.rollup('Hour')
+        return pd.DataFrame({
+            'Hour': hours['Hour'],
+            'Avg Price': hours['price_sum'] / hours['count'],
+            'Flights': hours['count'],
+        })
+
+    def daily(self):
+        """Day of Week (ordered), Flights"""
+        days = self.rollup('Weekday')
+        return pd.DataFrame({
+            'Day of Week': pd.Categorical.from_codes(days['Weekday'].to_numpy(), categories=DAY_ORDER, ordered=True),
+            'Flights': days['count'].to_numpy(),
+        })
@@ -0,0 +1,81 @@
+"""Streamed CSV, Parquet and Arrow IPC export of flight frames and demand cubes
+
+Frames are expanded and serialized one chunk of rows at a time, so nothing
+is built until a download is requested and the only full-size object is
+the encoded output, not an expanded frame plus its text rendering.
+"""
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from flight_frame import expand_flights
+from profiling import timed
+
+CHUNK_ROWS = 50_000
+
+# Format name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def _plain_schema(table):
+    """Schema with dictionary (categorical) columns decoded to their value type"""
+    return pa.schema([
+        field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ])
+
+
+def iter_tables(df, expand=True, chunk_rows=CHUNK_ROWS):
+    """Arrow tables of ``chunk_rows`` rows sharing one schema, expanded for display when ``expand``"""
+    schema = None
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        table = pa.Table.from_pandas(expand_flights(chunk) if expand else chunk, preserve_index=False)
+        if schema is None:
+            schema = _plain_schema(table).remove_metadata()
+        yield table.cast(schema)
+
+
+@timed("export", rows=None)
+def write_export(df, sink, fmt="CSV", expand=True, chunk_rows=CHUNK_ROWS):
+    """Serialize ``df`` chunk by chunk into the file-like ``sink``"""
+    writer = None
+    try:
+        for table in iter_tables(df, expand, chunk_rows):
+            if writer is None:
+                if fmt == "CSV":
+                    writer = pa_csv.CSVWriter(sink, table.schema)
+                elif fmt == "Parquet":
+                    writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+                elif fmt == "Arrow IPC":
+                    writer = ipc.new_file(sink, table.schema)
+                else:
+                    raise ValueError(f"Unknown export format: {fmt}")
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return sink
+
+
+def export_buffer(df, fmt="CSV", expand=True, chunk_rows=CHUNK_ROWS):
+    """In-memory file holding the export, rewound and ready to read"""
+    sink = io.BytesIO()
+    write_export(df, sink, fmt, expand, chunk_rows)
+    sink.seek(0)
+    return sink
+
+
+def cube_frame(cube):
+    """Demand cube table with plain string airport codes, for export"""
+    table = cube.table.copy()
+    for col in ('estDepartureAirport', 'estArrivalAirport'):
+        table[col] = table[col].astype(str)
+    return table
@@ -0,0 +1,35 @@
+"""Hour buckets of flight frames, as used by the shared flight cache"""
+import os
+
+BUCKET_SECONDS = 3600
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def bucket_starts(start, end, bucket_seconds=BUCKET_SECONDS):
+    """Aligned bucket start timestamps covering [start, end]"""
+    first = int(start) // bucket_seconds * bucket_seconds
+    return list(range(first, int(end) + 1, bucket_seconds))
+
+
+def airport_key(airport_code, direction="departure"):
+    """Cache and coverage key of an airport's departures (the bare code) or arrivals"""
+    return airport_code if direction == "departure" else f"{airport_code}:{direction}"
+
+
+def bucket_runs(buckets, max_span, bucket_seconds=BUCKET_SECONDS):
+    """Sorted bucket starts grouped into runs of consecutive buckets spanning at most ``max_span`` seconds"""
+    per_run = max(1, max_span // bucket_seconds)
+    runs = []
+    for bucket in buckets:
+        if runs and bucket == runs[-1][-1] + bucket_seconds and len(runs[-1]) < per_run:
+            runs[-1].append(bucket)
+        else:
+            runs.append([bucket])
+    return runs
+
+
+def split_buckets(flights, buckets, bucket_seconds=BUCKET_SECONDS, column="firstSeen"):
+    """Flight frame of each bucket start, by ``column`` (empty for buckets without flights)"""
+    bucket_of = flights[column] // bucket_seconds * bucket_seconds
+    return {bucket: flights[(bucket_of == bucket).to_numpy()] for bucket in buckets}
+
@@ -0,0 +1,99 @@
+"""Compact columnar layout for flight frames
+
+Flights are held with integer-coded airports, int32 epoch seconds, float32
+measures and int8 hour/weekday. Timestamps, weekday names and dates are
+derived on demand for display and export instead of being stored per row.
+"""
+import numpy as np
+import pandas as pd
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Monday == 0)
+
+# Column order of the expanded frame shown in the explorer and exported
+DISPLAY_COLUMNS = [
+    'callsign', 'estDepartureAirport', 'estArrivalAirport', 'firstSeen', 'lastSeen',
+    'Departure Time', 'Arrival Time', 'Duration (min)', 'Hour', 'Day of Week', 'Date',
+    'Distance (km)', 'Price',
+]
+
+
+def as_categorical(column, categories=None):
+    """Categorical of a column, recoding an already dictionary-encoded one instead of re-hashing its strings"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.cat.remove_unused_categories()
+        return column.cat.set_categories(column.cat.categories.sort_values() if categories is None else categories).array
+    return pd.Categorical(column.to_numpy(), categories=categories)
+
+
+def compact_flights(df, airport_codes):
+    """Cleaned API records to the compact schema with hour, weekday and duration"""
+    first_seen = df['firstSeen'].to_numpy(dtype=np.int64)
+    last_seen = df['lastSeen'].to_numpy(dtype=np.int64)
+    return pd.DataFrame({
+        'callsign': as_categorical(df['callsign']),
+        'estDepartureAirport': as_categorical(df['estDepartureAirport'], airport_codes),
+        'estArrivalAirport': as_categorical(df['estArrivalAirport'], airport_codes),
+        'firstSeen': first_seen.astype(np.int32),
+        'lastSeen': last_seen.astype(np.int32),
+        'Duration (min)': ((last_seen - first_seen) / 60).astype(np.float32),
+        'Hour': (first_seen % 86400 // 3600).astype(np.int8),
+        'Weekday': ((first_seen // 86400 + EPOCH_WEEKDAY) % 7).astype(np.int8),
+    })
+
+
+# --- Derived Columns ---
+def departure_time(df):
+    """Departure timestamps (UTC) from firstSeen"""
+    return pd.to_datetime(df['firstSeen'].astype(np.int64), unit='s')
+
+
+def arrival_time(df):
+    """Arrival timestamps (UTC) from lastSeen"""
+    return pd.to_datetime(df['lastSeen'].astype(np.int64), unit='s')
+
+
+def day_of_week(df):
+    """Weekday names as an ordered categorical"""
+    return pd.Series(
+        pd.Categorical.from_codes(df['Weekday'].to_numpy(), categories=DAY_ORDER, ordered=True),
+        index=df.index
+    )
+
+
+def flight_date(df):
+    """Departure dates (UTC)"""
+    return departure_time(df).dt.date
+
+
+def expand_flights(df):
+    """Human-readable frame with the derived time columns, for display and export"""
+    expanded = df.drop(columns=['Weekday'], errors='ignore').copy()
+    expanded['Departure Time'] = departure_time(df)
+    expanded['Arrival Time'] = arrival_time(df)
+    expanded['Day of Week'] = day_of_week(df)
+    expanded['Date'] = flight_date(df)
+    for col in ('callsign', 'estDepartureAirport', 'estArrivalAirport'):
+        expanded[col] = expanded[col].astype(object)
+    return expanded[[col for col in DISPLAY_COLUMNS if col in expanded.columns]
+                    + [col for col in expanded.columns if col not in DISPLAY_COLUMNS]]
+
+
+# --- Memory Report ---
+def bytes_per_flight(df):
+    """Deep memory footprint of a frame divided by its row count"""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+
+def memory_report(frames):
+    """Bytes per flight and per column for named frames, e.g. {'before': df1, 'after': df2}"""
+    rows = []
+    for name, df in frames.items():
+        usage = df.memory_usage(deep=True, index=False)
+        rows.append({
+            'frame': name,
+            'rows': len(df),
+            'bytes per flight': round(bytes_per_flight(df), 1),
+            **{col: round(usage[col] / max(len(df), 1), 1) for col in usage.index},
+        })
+    return pd.DataFrame(rows).set_index('frame')
@@ -0,0 +1,199 @@
+"""Parse OpenSky flight payloads straight into typed columns
+
+A departures response is a JSON array of flat objects. Rewriting the
+separators between objects into newlines turns it into newline-delimited
+JSON that Arrow's reader parses in C++, keeping only ``FLIGHT_COLUMNS`` as
+typed columns. No Python dict per flight is built. A string containing
+``},{`` can only yield invalid lines, so such payloads fall back to the
+standard parser. Large responses are parsed block by block as they arrive,
+with the same fallback per block.
+
+Flight frames have categorical (dictionary-encoded) airports and callsigns
+and int64 timestamps, and are what every fetch, cache and warehouse in the
+data path passes around. Departures are placed in time by ``firstSeen`` and
+arrivals by ``lastSeen``, as OpenSky's ``begin``/``end`` parameters are.
+"""
+import io
+import json
+import re
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.json as pa_json
+
+FLIGHT_COLUMNS = ["icao24", "callsign", "estDepartureAirport", "estArrivalAirport", "firstSeen", "lastSeen"]
+DICTIONARY_COLUMNS = ["callsign", "estDepartureAirport", "estArrivalAirport"]
+FLIGHT_SCHEMA = pa.schema([
+    ("icao24", pa.string()),
+    ("callsign", pa.string()),
+    ("estDepartureAirport", pa.string()),
+    ("estArrivalAirport", pa.string()),
+    ("firstSeen", pa.int64()),
+    ("lastSeen", pa.int64()),
+])
+# What OpenSky's airport and begin/end parameters filter on, per endpoint
+AIRPORT_COLUMN = {"departure": "estDepartureAirport", "arrival": "estArrivalAirport"}
+TIME_COLUMN = {"departure": "firstSeen", "arrival": "lastSeen"}
+STREAM_THRESHOLD = 16 * 1024 ** 2   # responses larger than this (or of unknown size) are parsed while downloading
+STREAM_CHUNK_BYTES = 4 * 1024 ** 2
+COMPRESSION = "zstd"
+
+OBJECT_SEPARATOR = re.compile(rb"\}\s*,\s*\{")
+PARSE_OPTIONS = pa_json.ParseOptions(explicit_schema=FLIGHT_SCHEMA, unexpected_field_behavior="ignore")
+
+
+# --- Flight Frames ---
+def flights_from_arrow(table):
+    """Flight frame of an Arrow table, dictionary-encoding airports and callsigns"""
+    columns = []
+    for field in FLIGHT_SCHEMA:
+        column = table[field.name] if field.name in table.column_names else pa.nulls(len(table), field.type)
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(pa.dictionary(pa.int32(), field.type))
+        else:
+            column = column.cast(field.type)
+            if field.name in DICTIONARY_COLUMNS:
+                column = column.dictionary_encode()
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=FLIGHT_COLUMNS).to_pandas()
+
+
+def empty_flights():
+    """Flight frame without rows"""
+    return flights_from_arrow(FLIGHT_SCHEMA.empty_table())
+
+
+def _records_table(records):
+    return pa.table({
+        field.name: pa.array([record.get(field.name) for record in records], field.type)
+        for field in FLIGHT_SCHEMA
+    })
+
+
+def flights_from_records(records):
+    """Flight frame of API-style dicts (the fallback path; fields other than FLIGHT_COLUMNS are dropped)"""
+    return flights_from_arrow(_records_table(records))
+
+
+def concat_flights(frames):
+    """One flight frame of several, merging their categories instead of falling back to strings"""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return empty_flights()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return pa.concat_tables(
+        [pa.Table.from_pandas(frame[FLIGHT_COLUMNS], preserve_index=False) for frame in frames]
+    ).to_pandas()
+
+
+def between(flights, begin, end, column="firstSeen"):
+    """Flights with ``column`` (firstSeen for departures, lastSeen for arrivals) in [begin, end]"""
+    seen = flights[column]
+    return flights[(seen >= begin) & (seen <= end)].reset_index(drop=True)
+
+
+# --- JSON Ingest ---
+def _parse_lines(block):
+    """Arrow table of newline-delimited flight objects"""
+    if not block.strip():
+        return FLIGHT_SCHEMA.empty_table()
+    return pa_json.read_json(io.BytesIO(block), parse_options=PARSE_OPTIONS)
+
+
+def _parse_block(block):
+    """Arrow table of comma-separated flight objects, or None when the block ends inside a string"""
+    try:
+        return _parse_lines(OBJECT_SEPARATOR.sub(b"}\n{", block))
+    except pa.ArrowInvalid:
+        try:
+            return _records_table(json.loads(b"[" + block + b"]"))
+        except json.JSONDecodeError:
+            return None
+
+
+def _last_separator(data):
+    """Match of the last ``},{`` separator in ``data``, or None"""
+    brace = data.rfind(b"}")
+    while brace >= 0:
+        match = OBJECT_SEPARATOR.match(data, brace)
+        if match:
+            return match
+        brace = data.rfind(b"}", 0, brace)
+    return None
+
+
+def _array_bounds(body):
+    """Offsets just inside the top-level ``[`` ... ``]``, or None for an empty or null payload"""
+    stripped = body.strip()
+    if stripped in (b"", b"null", b"[]"):
+        return None
+    start, stop = body.index(b"["), body.rindex(b"]")
+    if body[:start].strip() or body[stop + 1:].strip():
+        raise ValueError("Flight payload is not a JSON array")
+    return start + 1, stop
+
+
+def parse_flights(body):
+    """Flight frame of a complete JSON response body"""
+    bounds = _array_bounds(body)
+    if bounds is None:
+        return empty_flights()
+    try:
+        return flights_from_arrow(_parse_lines(OBJECT_SEPARATOR.sub(b"}\n{", body[bounds[0]:bounds[1]])))
+    except pa.ArrowInvalid:
+        return flights_from_records(json.loads(body))
+
+
+def stream_flights(chunks):
+    """Flight frame of a JSON array arriving in byte chunks, parsed one block of whole objects at a time"""
+    tables, pending, opened = [], b"", False
+    for chunk in chunks:
+        pending += chunk
+        if not opened:
+            stripped = pending.lstrip()
+            if not stripped:
+                continue
+            if stripped[:1] != b"[":
+                return parse_flights(pending + b"".join(chunks))   # null or not an array
+            pending, opened = stripped[1:], True
+        last = _last_separator(pending)
+        if last is not None:
+            # A cut inside a string leaves the block unparsed until a later separator
+            table = _parse_block(pending[:last.start() + 1])
+            if table is not None:
+                tables.append(table)
+                pending = pending[last.end() - 1:]
+    if opened:
+        tail = pending.rstrip()
+        table = _parse_block(tail[:-1]) if tail[-1:] == b"]" else None
+        if table is None:
+            raise ValueError("Truncated flight payload")
+        tables.append(table)
+    return flights_from_arrow(pa.concat_tables(tables)) if tables else empty_flights()
+
+
+def read_flights(response, stream_threshold=STREAM_THRESHOLD):
+    """Flight frame of a ``requests`` response opened with ``stream=True``"""
+    size = response.headers.get("Content-Length")
+    if size is not None and size.isdigit() and int(size) <= stream_threshold:
+        return parse_flights(response.content)
+    return stream_flights(response.iter_content(STREAM_CHUNK_BYTES))
+
+
+# --- Columnar Blobs ---
+def encode_flights(flights, metadata=None):
+    """Flight frame as one compressed Arrow IPC stream, with optional string metadata"""
+    table = pa.Table.from_pandas(flights[FLIGHT_COLUMNS], preserve_index=False)
+    table = table.replace_schema_metadata(metadata)
+    sink = io.BytesIO()
+    with ipc.new_stream(sink, table.schema, options=ipc.IpcWriteOptions(compression=COMPRESSION)) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def decode_flights(blob):
+    """(flight frame, metadata) of a blob written by ``encode_flights``"""
+    table = ipc.open_stream(blob).read_all()
+    metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()}
+    return flights_from_arrow(table), metadata
@@ -0,0 +1,203 @@
+"""Origin–destination matrix of flight counts, mean duration and mean price
+
+Departures and inbound arrivals are folded into one airport × airport
+matrix over integer-coded airports: dense NumPy arrays of counts and
+duration/price sums, with a row per origin and a column per destination,
+restricted to the airports that occur. The flights from an airport, into
+it or along a corridor in either direction are then row, column and cell
+lookups instead of grouped scans over the flights.
+"""
+import numpy as np
+import pandas as pd
+
+from profiling import timed
+
+AIRPORT_KEYS = ['estDepartureAirport', 'estArrivalAirport']
+
+
+class ODMatrix:
+    """Flight counts and duration/price sums per (origin, destination) over ``airports``"""
+
+    def __init__(self, airports, counts, duration_sum, price_sum):
+        self.airports = np.asarray(airports, dtype=object)
+        self.counts = counts
+        self.duration_sum = duration_sum
+        self.price_sum = price_sum
+        self._index = {code: i for i, code in enumerate(self.airports.tolist())}
+
+    @classmethod
+    def empty_matrix(cls):
+        return cls([], np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)), np.zeros((0, 0)))
+
+    def __len__(self):
+        return len(self.airports)
+
+    def __contains__(self, code):
+        return code in self._index
+
+    @property
+    def empty(self):
+        return self.total_flights == 0
+
+    @property
+    def total_flights(self):
+        return int(self.counts.sum())
+
+    def _means(self, sums):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / self.counts
+
+    def mean_duration(self):
+        """Mean flight duration in minutes per pair (NaN where no flights)"""
+        return self._means(self.duration_sum)
+
+    def mean_price(self):
+        """Mean simulated price per pair (NaN where no flights)"""
+        return self._means(self.price_sum)
+
+    # --- Slices ---
+    def _pairs(self, rows, cols, min_flights=1):
+        """Origin, Destination, Flights, Duration (min), Price of the given cells with enough flights, busiest first"""
+        counts = self.counts[rows, cols]
+        keep = counts >= max(min_flights, 1)
+        rows, cols, counts = rows[keep], cols[keep], counts[keep]
+        order = np.lexsort((rows * len(self) + cols, -counts))
+        rows, cols, counts = rows[order], cols[order], counts[order]
+        return pd.DataFrame({
+            'Origin': self.airports[rows],
+            'Destination': self.airports[cols],
+            'Flights': counts,
+            'Duration (min)': self.duration_sum[rows, cols] / counts,
+            'Price': self.price_sum[rows, cols] / counts,
+        })
+
+    def pairs(self, min_flights=1):
+        """Every (origin, destination) pair with flights"""
+        rows, cols = np.nonzero(self.counts >= max(min_flights, 1))
+        return self._pairs(rows, cols)
+
+    def outbound(self, origin, min_flights=1):
+        """Flights from ``origin`` per destination (its matrix row)"""
+        row = self._index.get(origin)
+        if row is None:
+            return self._pairs(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+        cols = np.arange(len(self))
+        return self._pairs(np.full(len(self), row), cols, min_flights)
+
+    def inbound(self, destination, min_flights=1):
+        """Flights into ``destination`` per origin (its matrix column)"""
+        col = self._index.get(destination)
+        if col is None:
+            return self._pairs(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+        rows = np.arange(len(self))
+        return self._pairs(rows, np.full(len(self), col), min_flights)
+
+    def corridor(self, a, b):
+        """Flights each way between two airports: Origin, Destination, Flights, Duration (min), Price"""
+        i, j = self._index.get(a), self._index.get(b)
+        if i is None or j is None:
+            return self._pairs(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+        return self._pairs(np.array([i, j]), np.array([j, i]))
+
+    def routes(self, origin=None, destination=None, airport=None, min_flights=1):
+        """estDepartureAirport, estArrivalAirport, Flights for the route map (busiest first)
+
+        Every pair, or those from ``origin``, into ``destination`` or with
+        ``airport`` at either end.
+        """
+        mask = self.counts >= max(min_flights, 1)
+        if origin is not None:
+            mask &= (np.arange(len(self)) == self._index.get(origin, -1))[:, None]
+        if destination is not None:
+            mask &= (np.arange(len(self)) == self._index.get(destination, -1))[None, :]
+        if airport is not None:
+            at = np.arange(len(self)) == self._index.get(airport, -1)
+            mask &= at[:, None] | at[None, :]
+        rows, cols = np.nonzero(mask)
+        pairs = self._pairs(rows, cols)
+        return pd.DataFrame({
+            'estDepartureAirport': pairs['Origin'].to_numpy(),
+            'estArrivalAirport': pairs['Destination'].to_numpy(),
+            'Flights': pairs['Flights'].to_numpy(),
+        })
+
+    def balance(self, airport):
+        """Outbound, Inbound and Net (outbound − inbound) flights between ``airport`` and each partner"""
+        i = self._index.get(airport)
+        if i is None:
+            return pd.DataFrame(columns=['Airport', 'Outbound', 'Inbound', 'Net'])
+        outbound, inbound = self.counts[i], self.counts[:, i]
+        partners = np.flatnonzero(outbound + inbound)
+        partners = partners[np.lexsort((partners, -(outbound + inbound)[partners]))]
+        return pd.DataFrame({
+            'Airport': self.airports[partners],
+            'Outbound': outbound[partners],
+            'Inbound': inbound[partners],
+            'Net': outbound[partners] - inbound[partners],
+        })
+
+    def corridors(self, min_flights=1):
+        """Origin, Destination, Flights, Return Flights, Imbalance per airport pair, busiest first
+
+        Each unordered pair appears once, oriented along its busier direction.
+        """
+        forward, backward = self.counts, self.counts.T
+        # Upper triangle holds the busier direction's orientation for each pair
+        busier = np.triu(forward >= backward, k=1) | np.tril(forward > backward, k=-1)
+        busier |= np.diag(np.diag(forward) > 0)
+        rows, cols = np.nonzero(busier & (forward + backward >= max(min_flights, 1)))
+        flights, returns = forward[rows, cols], backward[rows, cols]
+        returns = np.where(rows == cols, 0, returns)
+        order = np.lexsort((rows * len(self) + cols, -(flights + returns)))
+        rows, cols, flights, returns = rows[order], cols[order], flights[order], returns[order]
+        return pd.DataFrame({
+            'Origin': self.airports[rows],
+            'Destination': self.airports[cols],
+            'Flights': flights,
+            'Return Flights': returns,
+            'Imbalance': flights - returns,
+        })
+
+    def frame(self, limit=None):
+        """Labelled origin × destination counts, optionally for the ``limit`` busiest airports only"""
+        keep = np.flatnonzero(self.counts.sum(axis=1) + self.counts.sum(axis=0))
+        if limit is not None and len(keep) > limit:
+            traffic = (self.counts.sum(axis=1) + self.counts.sum(axis=0))[keep]
+            keep = np.sort(keep[np.argsort(-traffic, kind='stable')[:limit]])
+        counts = self.counts[np.ix_(keep, keep)]
+        rows, cols = counts.sum(axis=1) > 0, counts.sum(axis=0) > 0
+        return pd.DataFrame(
+            counts[np.ix_(rows, cols)],
+            index=pd.Index(self.airports[keep][rows], name='estDepartureAirport'),
+            columns=pd.Index(self.airports[keep][cols], name='estArrivalAirport'),
+        )
+
+
+@timed("od_matrix", rows=lambda od: od.total_flights)
+def build_od_matrix(*cubes):
+    """ODMatrix of the flights in one or more DemandCubes, e.g. departures and inbound arrivals
+
+    Each cube row adds its count and sums to one matrix cell; the cubes must
+    not share flights (see ``pipeline.inbound_flights``).
+    """
+    tables = [cube.table for cube in cubes if cube is not None and not cube.empty]
+    if not tables:
+        return ODMatrix.empty_matrix()
+    categories = tables[0][AIRPORT_KEYS[0]].cat.categories.append(
+        [table[name].cat.categories for table in tables for name in AIRPORT_KEYS]
+    ).unique()
+    codes = {name: np.concatenate([
+        categories.get_indexer(table[name].cat.categories)[table[name].cat.codes.to_numpy()] for table in tables
+    ]) for name in AIRPORT_KEYS}
+
+    # Only the airports that occur get a row and a column
+    occurring = np.unique(np.concatenate(list(codes.values())))
+    n = len(occurring)
+    cells = np.searchsorted(occurring, codes[AIRPORT_KEYS[0]]) * n + np.searchsorted(occurring, codes[AIRPORT_KEYS[1]])
+
+    def matrix(column, dtype=np.float64):
+        weights = np.concatenate([table[column].to_numpy(dtype=np.float64) for table in tables])
+        return np.bincount(cells, weights=weights, minlength=n * n).reshape(n, n).astype(dtype)
+
+    return ODMatrix(np.asarray(categories[occurring], dtype=object),
+                    matrix('count', np.int64), matrix('duration_sum'), matrix('price_sum'))
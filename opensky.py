@@ -0,0 +1,198 @@
+"""OpenSky Network API access"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ingest import concat_flights, empty_flights, read_flights
+
+OPENSKY_API = os.environ.get("OPENSKY_API_URL", "https://opensky-network.org/api")
+REQUEST_TIMEOUT = 15
+MAX_QUERY_SECONDS = 2 * 24 * 3600   # longest interval sent in one departure/arrival request
+# OpenSky lists a flight only once its track has ended, so a departure may be
+# missing from answers fetched until the flight has landed (and been processed)
+SETTLE_SECONDS = int(os.environ.get("OPENSKY_SETTLE_SECONDS", 24 * 3600))
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def fetch_airport_flights(direction, airport_code, begin, end, session=None, timeout=REQUEST_TIMEOUT):
+    """Fetch the departures or arrivals (``direction``) of an airport between two epoch timestamps as a flight frame"""
+    http = session or requests
+    with http.get(
+        f"{OPENSKY_API}/flights/{direction}",
+        params={"airport": airport_code, "begin": int(begin), "end": int(end)},
+        timeout=timeout,
+        stream=True
+    ) as response:
+        # OpenSky answers 404 when no flights were found in the interval
+        if response.status_code == 404:
+            return empty_flights()
+        response.raise_for_status()
+        return read_flights(response)
+
+
+def fetch_departures(airport_code, begin, end, session=None, timeout=REQUEST_TIMEOUT):
+    """Fetch departures from an airport between two epoch timestamps (by firstSeen) as a flight frame"""
+    return fetch_airport_flights("departure", airport_code, begin, end, session, timeout)
+
+
+def fetch_arrivals(airport_code, begin, end, session=None, timeout=REQUEST_TIMEOUT):
+    """Fetch arrivals at an airport between two epoch timestamps (by lastSeen) as a flight frame"""
+    return fetch_airport_flights("arrival", airport_code, begin, end, session, timeout)
+
+
+# --- Retries and Chunking ---
+def is_transient(error):
+    """Whether a failed request is worth retrying (network errors, 429 and 5xx)"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def retry_delay(error, attempt, backoff=BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS):
+    """Seconds to wait before the next attempt: server hint if given, else full-jitter exponential"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        hint = response.headers.get("X-Rate-Limit-Retry-After-Seconds") or response.headers.get("Retry-After")
+        if hint and hint.isdigit():
+            return min(float(hint), max_backoff)
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def retrying(fetch, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS, sleep=time.sleep):
+    """Wrap a fetch function so transient failures are retried with jittered backoff"""
+    def fetch_with_retry(*args, **kwargs):
+        for attempt in range(retries + 1):
+            try:
+                return fetch(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_transient(e):
+                    raise
+                sleep(retry_delay(e, attempt, backoff, max_backoff))
+    return fetch_with_retry
+
+
+def split_window(begin, end, max_seconds=MAX_QUERY_SECONDS):
+    """Split [begin, end] into consecutive inclusive chunks no longer than max_seconds"""
+    begin, end = int(begin), int(end)
+    return [(start, min(start + max_seconds - 1, end)) for start in range(begin, end + 1, max_seconds)]
+
+
+def fetch_chunks(airport_code, chunks, fetch, max_workers=4):
+    """Fetch (begin, end) chunks in parallel
+
+    Returns one ``(begin, end, flights, error)`` tuple per chunk in input order;
+    ``flights`` is None and ``error`` holds the message when a chunk failed.
+    """
+    def run(chunk):
+        try:
+            return chunk[0], chunk[1], fetch(airport_code, chunk[0], chunk[1]), None
+        except Exception as e:
+            return chunk[0], chunk[1], None, str(e) or type(e).__name__
+
+    if len(chunks) <= 1 or max_workers <= 1:
+        return [run(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="opensky-chunk") as pool:
+        return list(pool.map(run, chunks))
+
+
+def chunk_status(begin, end, flights, error, status=None):
+    """One row of the per-chunk status report"""
+    return {
+        "begin": begin,
+        "end": end,
+        "status": status or ("fetched" if error is None else "failed"),
+        "flights": 0 if flights is None else len(flights),
+        "error": error,
+    }
+
+
+def fetch_range(airport_code, begin, end, fetch=fetch_departures, max_workers=4, max_seconds=MAX_QUERY_SECONDS):
+    """Fetch a long window as API-legal chunks, keeping whatever chunks succeed
+
+    Returns ``(flights, report)`` with one ``chunk_status`` row per chunk.
+    """
+    frames, report = [], []
+    for chunk_begin, chunk_end, chunk, error in fetch_chunks(
+            airport_code, split_window(begin, end, max_seconds), fetch, max_workers):
+        if chunk is not None:
+            frames.append(chunk)
+        report.append(chunk_status(chunk_begin, chunk_end, chunk, error))
+    return concat_flights(frames), report
+
+
+# --- Network-wide Fetching ---
+def make_session(pool_size=10):
+    """HTTP session whose connection pool is sized for concurrent fetches"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls at most ``rate`` per second"""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fetch_network(airport_codes, begin, end, max_workers=4, rate_limit=None, cache=None, session=None,
+                  chunk_workers=2, direction="departure"):
+    """Fetch departures (or arrivals) for several airports concurrently
+
+    Returns ``(flights, errors)`` where ``flights`` is one flight frame with the
+    flights that were fetched and ``errors`` maps the codes whose fetch
+    failed, fully or for some chunks, to their error message.
+    """
+    limiter = RateLimiter(rate_limit)
+    session = session or make_session(max_workers * chunk_workers)
+
+    def fetch(airport_code, chunk_begin, chunk_end):
+        limiter.wait()
+        return fetch_airport_flights(direction, airport_code, chunk_begin, chunk_end, session=session)
+
+    fetch = retrying(fetch)
+
+    def fetch_airport(airport_code):
+        if cache is not None:
+            return cache.fetch_window(airport_code, begin, end, fetch, max_workers=chunk_workers, direction=direction)
+        return fetch_range(airport_code, begin, end, fetch, max_workers=chunk_workers)
+
+    frames, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="opensky") as pool:
+        futures = {pool.submit(fetch_airport, code): code for code in airport_codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                flights, report = future.result()
+            except Exception as e:
+                errors[code] = str(e)
+                continue
+            failed = [row for row in report if row["status"] == "failed"]
+            if failed:
+                errors[code] = f"{len(failed)} of {len(report)} chunks failed: {failed[0]['error']}"
+            frames.append(flights)
+
+    return concat_flights(frames), errors
@@ -0,0 +1,230 @@
+"""Headless flight demand pipeline: fetch → clean → enrich → aggregate
+
+Everything here is plain pandas/NumPy so the dashboard, batch jobs and
+benchmarks share one implementation without a Streamlit server.
+"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from airports import airport_table
+from cube import DemandCube, build_cube
+from flight_frame import compact_flights
+from od_matrix import ODMatrix, build_od_matrix
+from opensky import fetch_airport_flights, fetch_range, retrying
+from pricing import RouteEngine
+from profiling import profiler, timed
+from warehouse import FlightWarehouse
+
+REQUIRED_COLS = ['callsign', 'estDepartureAirport', 'estArrivalAirport', 'firstSeen', 'lastSeen']
+DEFAULT_PRICE_RANGE = (100, 500)
+
+
+class MissingColumnsError(ValueError):
+    """Raised when an API response lacks the columns the pipeline needs"""
+
+
+@dataclass
+class FlightAggregates:
+    """Every statistic the dashboard tabs and metrics read, rolled up from a DemandCube"""
+    route_counts: pd.DataFrame       # Arrival Airport, Flights (busiest first)
+    route_efficiency: pd.DataFrame   # estArrivalAirport, mean distance/duration/price, Price per km
+    hourly_prices: pd.DataFrame      # Hour, Price (mean)
+    hourly: pd.DataFrame             # Hour, Flights
+    daily: pd.DataFrame              # Day of Week (ordered), Flights
+    demand_price: pd.DataFrame       # Hour, Avg Price, Flights
+    total_flights: int = 0
+    avg_price: float = 0.0
+    peak_hour: int | None = None
+    peak_flights: int = 0
+    top_destination: str | None = None
+
+
+@dataclass
+class PipelineResult:
+    """Output of one pipeline run for an airport and time window"""
+    airport_code: str
+    start_time: int
+    end_time: int
+    flights: pd.DataFrame
+    cube: DemandCube | None
+    aggregates: FlightAggregates | None
+    report: list[dict] = field(default_factory=list)
+    od: ODMatrix | None = None                       # departures plus inbound arrivals when requested
+    arrival_report: list[dict] = field(default_factory=list)
+
+
+# --- Fetch ---
+@timed("fetch", rows=lambda result: len(result[0]))
+def fetch_flights(airport_code: str, start_time: int, end_time: int,
+                  cache: FlightWarehouse | None = None, session=None,
+                  max_workers: int = 4, direction: str = "departure") -> tuple[pd.DataFrame, list[dict]]:
+    """Departures (or arrivals) in the window as a flight frame plus the per-chunk fetch report"""
+    fetch = retrying(lambda code, begin, end: fetch_airport_flights(direction, code, begin, end, session=session))
+    if cache is not None:
+        return cache.fetch_window(airport_code, start_time, end_time, fetch, max_workers=max_workers,
+                                  direction=direction)
+    return fetch_range(airport_code, start_time, end_time, fetch, max_workers=max_workers)
+
+
+def inbound_flights(arrivals: pd.DataFrame, departure_airports, start_time: int, end_time: int) -> pd.DataFrame:
+    """Arrivals that are not also among the departures fetched for the same window
+
+    A departures query returns the flights leaving an airport with firstSeen
+    in the window, so an arrival from one of ``departure_airports`` that took
+    off inside the window was already counted at its origin.
+    """
+    first_seen = arrivals['firstSeen'].to_numpy()
+    counted = (arrivals['estDepartureAirport'].isin(list(departure_airports)).to_numpy()
+               & (first_seen >= start_time) & (first_seen <= end_time))
+    return arrivals[~counted].reset_index(drop=True)
+
+
+# --- Clean and Enrich ---
+@timed("clean")
+def clean_flights(df: pd.DataFrame, airports: Mapping = airport_table) -> pd.DataFrame:
+    """Keep the required columns and flights between known airports"""
+    missing = [col for col in REQUIRED_COLS if col not in df.columns]
+    if missing:
+        raise MissingColumnsError(f"Required columns missing from API response: {', '.join(missing)}")
+
+    df = df[REQUIRED_COLS].dropna()
+    codes = list(airports)
+    return df[df['estDepartureAirport'].isin(codes) & df['estArrivalAirport'].isin(codes)]
+
+
+@timed("features")
+def add_features(df: pd.DataFrame, engine: RouteEngine) -> pd.DataFrame:
+    """Compact flight frame with hour, weekday, duration, distance and price columns"""
+    df = engine.enrich(compact_flights(df, engine.codes))
+    df['Distance (km)'] = df['Distance (km)'].astype(np.float32)
+    df['Price'] = df['Price'].astype(np.float32)
+    return df
+
+
+@timed("filter")
+def filter_price(df: pd.DataFrame, price_range: tuple[float, float]) -> pd.DataFrame:
+    """Flights whose simulated price lies inside the range"""
+    return df[(df['Price'] >= price_range[0]) & (df['Price'] <= price_range[1])]
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of the raw columns the pipeline reads, for memoizing derived frames"""
+    cols = [col for col in REQUIRED_COLS if col in df.columns]
+    return f"{len(df)}-{int(pd.util.hash_pandas_object(df[cols], index=False).sum()):016x}"
+
+
+def prepare_flights(data: list[dict] | pd.DataFrame, engine: RouteEngine,
+                    price_range: tuple[float, float] | None = DEFAULT_PRICE_RANGE) -> pd.DataFrame:
+    """Raw API records to the cleaned, enriched and (unless price_range is None) price-filtered flight frame"""
+    with profiler.stage("frame") as record:
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        record.rows = len(df)
+    df = add_features(clean_flights(df, engine.table), engine)
+    return df if price_range is None else filter_price(df, price_range)
+
+
+# --- Aggregate ---
+@timed("summarize", rows=lambda aggregates: aggregates.total_flights)
+def summarize(cube: DemandCube) -> FlightAggregates:
+    """Materialize the dashboard statistics from a demand cube"""
+    route_counts = cube.route_counts()
+    hourly = cube.hourly()
+    aggregates = FlightAggregates(
+        route_counts=route_counts,
+        route_efficiency=cube.route_efficiency(),
+        hourly_prices=cube.hourly_prices(),
+        hourly=hourly,
+        daily=cube.daily(),
+        demand_price=cube.demand_price(),
+    )
+    if not cube.empty:
+        peak = hourly.loc[hourly['Flights'].idxmax()]
+        aggregates.total_flights = cube.total_flights
+        aggregates.avg_price = cube.avg_price
+        aggregates.peak_hour = int(peak['Hour'])
+        aggregates.peak_flights = int(peak['Flights'])
+        aggregates.top_destination = route_counts['Arrival Airport'].iloc[0]
+    return aggregates
+
+
+def aggregate_flights(df: pd.DataFrame) -> FlightAggregates:
+    """Compute the dashboard statistics for a prepared flight frame"""
+    return summarize(build_cube(df))
+
+
+@timed("insights", rows=None)
+def generate_insights(cube: DemandCube, airport_code: str, airports: Mapping = airport_table) -> str:
+    """Generate data-driven insights without AI"""
+    if cube.empty:
+        return "No data available to generate insights"
+
+    insights = []
+
+    # Top routes insight
+    route_descs = []
+    for code in cube.route_counts()['Arrival Airport'].head(3):
+        if code in airports:
+            route_descs.append(f"{airports[code]['city']} ({code})")
+        else:
+            route_descs.append(f"Unknown ({code})")
+    insights.append(f"**Top Routes:** {', '.join(route_descs)}")
+
+    # Pricing insights
+    avg_price = cube.avg_price
+    price_comparison = "above" if avg_price > 350 else "below"
+    insights.append(f"**Pricing:** Average ticket price ${avg_price:.2f} AUD ({price_comparison} industry average)")
+
+    # Demand patterns
+    hourly = cube.hourly()
+    peak = hourly.loc[hourly['Flights'].idxmax()]
+    insights.append(f"**Peak Demand:** Highest at {int(peak['Hour'])}:00 ({int(peak['Flights'])} flights)")
+
+    # Route efficiency
+    routes = cube.rollup('estArrivalAirport')
+    longest_route = routes.loc[routes['distance_max'].idxmax()]
+    shortest_route = routes.loc[routes['distance_min'].idxmin()]
+    longest_city = airports.get(longest_route['estArrivalAirport'], {}).get('city', 'Unknown')
+    shortest_city = airports.get(shortest_route['estArrivalAirport'], {}).get('city', 'Unknown')
+    insights.append(f"**Longest Route:** {longest_city} ({longest_route['distance_max']:.2f} km)")
+    insights.append(f"**Shortest Route:** {shortest_city} ({shortest_route['distance_min']:.2f} km)")
+
+    # Price-performance analysis
+    if routes['price_per_km_min'].notna().any():
+        best_value = routes.loc[routes['price_per_km_min'].idxmin()]
+        best_value_city = airports.get(best_value['estArrivalAirport'], {}).get('city', 'Unknown')
+        best_distance = best_value['distance_min']
+        insights.append(f"**Best Value:** {best_value_city} at ${best_value['price_per_km_min'] * best_distance:.2f} ({best_distance:.2f} km)")
+
+    return "\n\n".join(insights)
+
+
+# --- End to End ---
+def run_pipeline(airport_code: str, start_time: int, end_time: int,
+                 price_range: tuple[float, float] = DEFAULT_PRICE_RANGE, engine: RouteEngine | None = None,
+                 cache: FlightWarehouse | None = None, session=None, max_workers: int = 4,
+                 arrivals: bool = False) -> PipelineResult:
+    """Fetch, clean, enrich and aggregate the departures of one airport
+
+    With ``arrivals``, its inbound flights are fetched as well and folded
+    with the departures into an origin-destination matrix.
+    """
+    engine = engine or RouteEngine(airport_table)
+    data, report = fetch_flights(airport_code, start_time, end_time, cache, session, max_workers)
+    flights = prepare_flights(data, engine, price_range) if len(data) else pd.DataFrame()
+    cube = build_cube(flights) if not flights.empty else None
+    aggregates = summarize(cube) if cube is not None else None
+    result = PipelineResult(airport_code, start_time, end_time, flights, cube, aggregates, report)
+    if arrivals:
+        arriving, result.arrival_report = fetch_flights(airport_code, start_time, end_time, cache, session,
+                                                        max_workers, direction="arrival")
+        inbound = inbound_flights(arriving, [airport_code], start_time, end_time)
+        inbound = prepare_flights(inbound, engine, price_range) if len(inbound) else pd.DataFrame()
+        result.od = build_od_matrix(cube, build_cube(inbound) if not inbound.empty else None)
+    elif cube is not None:
+        result.od = build_od_matrix(cube)
+    return result
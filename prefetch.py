@@ -0,0 +1,149 @@
+"""Background prefetcher that keeps the flight warehouse warm for every airport
+
+Each airport's recent departures and arrivals are refreshed on a fixed
+interval, with start times staggered across the interval and every upstream
+request drawn from one shared hourly budget. Because the warehouse only
+fetches uncovered intervals, a refresh after the first costs one request per
+airport and direction, for the tail that has not settled upstream yet. Each refresh reaches back past the
+warehouse's settle lag, so every part of that tail is fetched once more after
+it settles.
+
+Runs as a thread inside the dashboard (see ``PREFETCH_INTERVAL_SECONDS`` in
+app.py) or as its own process:
+
+    python prefetch.py --interval-minutes 15 --lookback-hours 24 --budget 400
+"""
+import argparse
+import sys
+import threading
+import time
+
+from airports import airport_db
+from opensky import RateLimiter, fetch_airport_flights, make_session, retrying
+from shared_cache import open_shared_cache
+from warehouse import FlightWarehouse
+
+PREFETCH_INTERVAL = 15 * 60      # seconds between refreshes of one airport
+PREFETCH_LOOKBACK = 24 * 3600    # window kept warm, matching the longest preset in the dashboard
+REQUEST_BUDGET = 400             # upstream requests per hour across all airports
+DIRECTIONS = ("departure", "arrival")
+
+
+class Prefetcher:
+    """Thread that refreshes the lookback window of each airport on a staggered schedule"""
+
+    def __init__(self, store, airport_codes, interval=PREFETCH_INTERVAL, lookback=PREFETCH_LOOKBACK,
+                 requests_per_hour=REQUEST_BUDGET, session=None, clock=time.time):
+        self.store = store
+        self.airport_codes = list(airport_codes)
+        self.interval = interval
+        self.lookback = lookback
+        self.limiter = RateLimiter(requests_per_hour / 3600 if requests_per_hour else None)
+        self.session = session or make_session(2)
+        self.clock = clock
+        self._status = {
+            code: {"last_success": None, "last_attempt": None, "last_error": None, "flights": 0, "arrivals": 0}
+            for code in self.airport_codes
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fetcher(self, direction):
+        def fetch(airport_code, begin, end):
+            self.limiter.wait()
+            return fetch_airport_flights(direction, airport_code, begin, end, session=self.session)
+        return retrying(fetch)
+
+    def refresh(self, airport_code):
+        """Pull one airport's departures and arrivals over the lookback window; True when every chunk succeeded"""
+        now = int(self.clock())
+        begin = now - max(self.lookback, self.store.settle + int(self.interval))
+        counts, errors = {}, []
+        for direction in DIRECTIONS:
+            try:
+                flights, report = self.store.fetch_window(
+                    airport_code, begin, now, self._fetcher(direction), max_workers=1, direction=direction
+                )
+                counts[direction] = len(flights)
+                errors.extend(f"{direction}s: {row['error']}" for row in report if row["status"] == "failed")
+            except Exception as e:
+                counts[direction] = 0
+                errors.append(f"{direction}s: {str(e) or type(e).__name__}")
+        error = errors[0] if errors else None
+        with self._lock:
+            status = self._status.setdefault(airport_code, {"last_success": None})
+            status.update(last_attempt=now, last_error=error, flights=counts["departure"], arrivals=counts["arrival"])
+            if error is None:
+                status["last_success"] = now
+        return error is None
+
+    def run(self):
+        """Refresh airports until stopped, airport i first due i/n of the way through the interval"""
+        start = self.clock()
+        step = self.interval / max(len(self.airport_codes), 1)
+        due = {code: start + i * step for i, code in enumerate(self.airport_codes)}
+        while due and not self._stop.is_set():
+            airport_code = min(due, key=due.get)
+            delay = due[airport_code] - self.clock()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            self.refresh(airport_code)
+            # Skip missed slots instead of bursting to catch up
+            due[airport_code] = max(due[airport_code] + self.interval, self.clock())
+
+    def start(self):
+        """Run in a daemon thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="opensky-prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        """Per-airport last_success, last_attempt, last_error, flights and arrivals of the latest refresh"""
+        with self._lock:
+            return {code: dict(status) for code, status in self._status.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--airports", nargs="+", default=list(airport_db))
+    parser.add_argument("--interval-minutes", type=float, default=PREFETCH_INTERVAL / 60)
+    parser.add_argument("--lookback-hours", type=float, default=PREFETCH_LOOKBACK / 3600)
+    parser.add_argument("--budget", type=float, default=REQUEST_BUDGET, help="Upstream requests per hour")
+    parser.add_argument("--path", help="Warehouse file (default .cache/flight_warehouse.sqlite)")
+    parser.add_argument("--shared-cache", help="Shared cache URL (default SHARED_CACHE_URL)")
+    args = parser.parse_args(argv)
+
+    prefetcher = Prefetcher(
+        FlightWarehouse(args.path, shared_cache=open_shared_cache(args.shared_cache)), args.airports,
+        interval=args.interval_minutes * 60,
+        lookback=int(args.lookback_hours * 3600),
+        requests_per_hour=args.budget,
+    ).start()
+    seen = {}
+    try:
+        while prefetcher.running:
+            time.sleep(1)
+            for code, status in prefetcher.status().items():
+                if status["last_attempt"] and status["last_attempt"] != seen.get(code):
+                    seen[code] = status["last_attempt"]
+                    outcome = f"failed ({status['last_error']})" if status["last_error"] else f"{status['flights']} departures, {status['arrivals']} arrivals"
+                    print(f"{time.strftime('%H:%M:%S')} {code}: {outcome}", flush=True)
+    except KeyboardInterrupt:
+        prefetcher.stop(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Distance and ticket price modelling for departures"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from airports import EARTH_RADIUS_KM, airport_table, as_table
+
+PRICE_SEED = 0              # change to draw a different (but still repeatable) set of fares
+FULL_MATRIX_AIRPORTS = 2048 # airport tables up to this size keep every pairwise distance
+
+
+# --- Flight Hashing ---
+def _mix64(x):
+    """SplitMix64 finalizer over a uint64 array"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _string_hashes(values):
+    """Stable uint64 hash of each string (pandas' fixed-key SipHash)"""
+    return pd.util.hash_array(np.array([str(value) for value in values], dtype=object), categorize=False)
+
+
+def _combine(callsign_hashes, first_seen, seed):
+    seen = np.asarray(first_seen, dtype=np.int64).astype(np.uint64)
+    return _mix64(callsign_hashes ^ _mix64(seen + np.uint64(seed)))
+
+
+def flight_hash(callsigns, first_seen, seed=PRICE_SEED):
+    """Stable 64-bit key per flight from its callsign and firstSeen
+
+    Callsigns are hashed once per distinct value, so the cost is one gather
+    and a few integer operations per row.
+    """
+    callsigns = callsigns if isinstance(getattr(callsigns, 'dtype', None), pd.CategoricalDtype) \
+        else pd.Series(pd.Categorical(np.asarray(callsigns, dtype=object)))
+    callsign_hashes = np.append(_string_hashes(callsigns.cat.categories), np.uint64(0))
+    codes = callsigns.cat.codes.to_numpy()  # -1 (missing) picks the trailing zero
+    return _combine(callsign_hashes[codes], first_seen, seed)
+
+
+def hash_draw(keys, low, high, stream=0):
+    """Integers in [low, high) drawn deterministically from flight keys"""
+    keys = np.asarray(keys, dtype=np.uint64)
+    if stream:
+        keys = _mix64(keys + np.uint64(stream))
+    return (keys % np.uint64(high - low)).astype(np.int64) + low
+
+
+# --- Per-row Helpers ---
+def calculate_distance(dep_code, arr_code):
+    """Calculate distance between two airports in km"""
+    from geopy.distance import great_circle
+    try:
+        dep_coords = airport_table[dep_code]["coords"]
+        arr_coords = airport_table[arr_code]["coords"]
+        return round(great_circle(dep_coords, arr_coords).km, 2)
+    except:
+        return None
+
+def generate_price(distance, callsign, first_seen, base_fare=50, km_rate=0.15):
+    """Generate realistic ticket price based on distance (the same price every time for a flight)"""
+    key = _combine(_string_hashes([callsign]), [first_seen], PRICE_SEED)
+    if distance is None or np.isnan(distance):
+        return int(hash_draw(key, 100, 500, stream=1)[0])
+    return round(base_fare + (distance * km_rate) + int(hash_draw(key, -30, 100)[0]), 2)
+
+def calculate_demand_factor(hour):
+    """Calculate demand factor based on time of day"""
+    if 6 <= hour < 10:   # Morning peak
+        return 1.4
+    elif 16 <= hour < 20: # Evening peak
+        return 1.6
+    elif 10 <= hour < 16: # Midday
+        return 1.2
+    else:                 # Night
+        return 0.8
+
+# Hour-of-day lookup table so demand factors can be gathered for a whole column at once
+DEMAND_FACTORS = np.array([calculate_demand_factor(hour) for hour in range(24)])
+
+
+# --- Vectorized Engine ---
+def great_circle_matrix(lat, lon, lat2=None, lon2=None):
+    """Great-circle distances in km from each (lat, lon) to each (lat2, lon2), pairwise when omitted"""
+    lat2, lon2 = (lat, lon) if lat2 is None else (lat2, lon2)
+    lat1, lon1 = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    lat2, lon2 = np.radians(np.asarray(lat2, dtype=float)), np.radians(np.asarray(lon2, dtype=float))
+    sin1, cos1 = np.sin(lat1)[:, None], np.cos(lat1)[:, None]
+    sin2, cos2 = np.sin(lat2)[None, :], np.cos(lat2)[None, :]
+    delta_lon = lon2[None, :] - lon1[:, None]
+    cos_delta, sin_delta = np.cos(delta_lon), np.sin(delta_lon)
+
+    # Same atan2 formulation as geopy so results match calculate_distance exactly
+    y = np.hypot(cos2 * sin_delta, cos1 * sin2 - sin1 * cos2 * cos_delta)
+    x = sin1 * sin2 + cos1 * cos2 * cos_delta
+    return EARTH_RADIUS_KM * np.arctan2(y, x)
+
+
+class RouteEngine:
+    """Whole-column distance and price calculation over an airport table"""
+
+    def __init__(self, airports=None):
+        self.table = as_table(airport_table if airports is None else airports)
+        self.codes = list(self.table)
+
+    def encode(self, codes):
+        """Map airport codes to matrix indices (-1 for airports not in the table)"""
+        if isinstance(getattr(codes, 'dtype', None), pd.CategoricalDtype) and list(codes.cat.categories) == self.codes:
+            return codes.cat.codes.to_numpy().astype(np.intp)
+        return self.table.locate(codes)
+
+    @functools.cached_property
+    def distance_matrix(self):
+        """Rounded distance in km between every pair of airports, built on first use"""
+        return np.round(great_circle_matrix(self.table.lat, self.table.lon), 2)
+
+    def distances(self, dep_codes, arr_codes):
+        """Distance in km for each departure/arrival pair (NaN when either airport is unknown)"""
+        dep_idx = self.encode(dep_codes)
+        arr_idx = self.encode(arr_codes)
+        known = (dep_idx >= 0) & (arr_idx >= 0)
+        dep_idx, arr_idx = dep_idx[known], arr_idx[known]
+
+        result = np.full(len(known), np.nan)
+        size = len(self.table)
+        if size <= FULL_MATRIX_AIRPORTS:
+            result[known] = self.distance_matrix[dep_idx, arr_idx]
+            return result
+
+        # Distances only between the airports present, then one gather per flight
+        deps = np.flatnonzero(np.bincount(dep_idx, minlength=size))
+        arrs = np.flatnonzero(np.bincount(arr_idx, minlength=size))
+        lookup = np.zeros(size, dtype=np.intp)
+        lookup[deps] = np.arange(len(deps))
+        dep_pos = lookup[dep_idx]
+        lookup[arrs] = np.arange(len(arrs))
+        arr_pos = lookup[arr_idx]
+        lat, lon = self.table.lat, self.table.lon
+        matrix = np.round(great_circle_matrix(lat[deps], lon[deps], lat[arrs], lon[arrs]), 2)
+        result[known] = matrix[dep_pos, arr_pos]
+        return result
+
+    @staticmethod
+    def demand_factors(hours):
+        """Demand factor for each departure hour"""
+        return DEMAND_FACTORS[np.asarray(hours, dtype=np.intp)]
+
+    def prices(self, distances, hours, keys, base_fare=50, km_rate=0.15):
+        """Simulated ticket price for each flight, drawn from its flight_hash key the same way as generate_price"""
+        distances = np.asarray(distances, dtype=float)
+        fares = np.round(base_fare + distances * km_rate + hash_draw(keys, -30, 100), 2)
+        unknown = np.isnan(distances)
+        if unknown.any():
+            fares[unknown] = hash_draw(np.asarray(keys)[unknown], 100, 500, stream=1)
+        return fares * self.demand_factors(hours)
+
+    def enrich(self, df, seed=PRICE_SEED):
+        """Add the Distance (km) and Price columns to a cleaned flight frame"""
+        df['Distance (km)'] = self.distances(df['estDepartureAirport'], df['estArrivalAirport'])
+        keys = flight_hash(df['callsign'], df['firstSeen'], seed)
+        df['Price'] = self.prices(df['Distance (km)'].to_numpy(), df['Hour'].to_numpy(), keys)
+        return df
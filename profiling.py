@@ -0,0 +1,182 @@
+"""Opt-in per-stage timing for the pipeline and dashboard
+
+Set ``PROFILING=1`` to record wall time, row count and resident-memory delta
+for every instrumented stage. Each record is logged as one JSON line and
+rolled into Prometheus text-format counters written to ``PROFILING_METRICS_PATH``.
+With profiling off, an instrumented call costs a single attribute check.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flight_cache import DEFAULT_CACHE_DIR
+
+METRICS_PREFIX = "flight_demand"
+METRICS_INTERVAL = 5.0   # minimum seconds between metrics file rewrites
+
+logger = logging.getLogger("flight_demand.profiling")
+
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageRecord:
+    """Timing of one stage call; ``rows`` may be set inside the ``with`` block"""
+    __slots__ = ("stage", "seconds", "rows", "memory_delta", "started")
+
+    def __init__(self, stage, rows=None):
+        self.stage = stage
+        self.rows = rows
+        self.seconds = 0.0
+        self.memory_delta = None
+        self.started = time.time()
+
+    def as_dict(self):
+        return {
+            "stage": self.stage,
+            "seconds": round(self.seconds, 6),
+            "rows": self.rows,
+            "memory_delta_bytes": self.memory_delta,
+            "started": round(self.started, 3),
+        }
+
+
+class Profiler:
+    """Collects StageRecords, logs them and keeps per-stage Prometheus totals"""
+
+    def __init__(self, enabled=False, metrics_path=None):
+        self.enabled = enabled
+        self.metrics_path = metrics_path
+        self._totals = defaultdict(lambda: {"count": 0, "seconds": 0.0, "rows": 0, "last_seconds": 0.0})
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_write = 0.0
+
+    # --- Recording ---
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the block as stage ``name`` (a no-op when profiling is off)"""
+        record = StageRecord(name, rows)
+        if not self.enabled:
+            yield record
+            return
+        memory_before = rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            memory_after = rss_bytes()
+            if memory_before is not None and memory_after is not None:
+                record.memory_delta = memory_after - memory_before
+            self._record(record)
+
+    def _record(self, record):
+        with self._lock:
+            totals = self._totals[record.stage]
+            totals["count"] += 1
+            totals["seconds"] += record.seconds
+            totals["rows"] += record.rows or 0
+            totals["last_seconds"] = record.seconds
+        run = getattr(self._local, "run", None)
+        if run is not None:
+            run.append(record)
+        logger.info(json.dumps({"event": "stage", "thread": threading.current_thread().name, **record.as_dict()}))
+        if self.metrics_path and time.monotonic() - self._last_write > METRICS_INTERVAL:
+            self.write_metrics()
+
+    def start_run(self):
+        """Start collecting this thread's records (e.g. one Streamlit script run) and return the list"""
+        self._local.run = []
+        return self._local.run
+
+    def end_run(self):
+        """Stop collecting, flush the metrics file and return this thread's records"""
+        run, self._local.run = getattr(self._local, "run", None) or [], None
+        if self.enabled and self.metrics_path:
+            self.write_metrics()
+        return run
+
+    # --- Export ---
+    def metrics_text(self):
+        """Per-stage totals in the Prometheus text exposition format"""
+        with self._lock:
+            totals = {stage: dict(values) for stage, values in sorted(self._totals.items())}
+        lines = []
+        for name, kind, help_text, key in (
+            ("stage_seconds_total", "counter", "Wall time spent in each stage", "seconds"),
+            ("stage_calls_total", "counter", "Number of times each stage ran", "count"),
+            ("stage_rows_total", "counter", "Rows produced by each stage", "rows"),
+            ("stage_last_seconds", "gauge", "Wall time of the latest call of each stage", "last_seconds"),
+        ):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+            lines.extend(
+                f'{METRICS_PREFIX}_{name}{{stage="{stage}"}} {values[key]}'
+                for stage, values in totals.items()
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """Atomically rewrite the metrics file so scrapers never read a partial file"""
+        path = path or self.metrics_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.metrics_text())
+        os.replace(tmp, path)
+        self._last_write = time.monotonic()
+
+
+def timed(name, rows=len):
+    """Decorator timing every call of a function as stage ``name``
+
+    ``rows`` maps the return value to a row count (``None`` to skip it).
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.stage(name) as record:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    try:
+                        record.rows = int(rows(result))
+                    except (TypeError, ValueError):
+                        pass
+            return result
+        return wrapper
+    return decorate
+
+
+def configure(enabled=None, metrics_path=None):
+    """Enable or disable the shared profiler (defaults from PROFILING / PROFILING_METRICS_PATH)"""
+    if enabled is None:
+        enabled = os.environ.get("PROFILING", "").lower() in ("1", "true", "yes")
+    profiler.enabled = enabled
+    profiler.metrics_path = metrics_path or os.environ.get(
+        "PROFILING_METRICS_PATH", os.path.join(DEFAULT_CACHE_DIR, "metrics.prom")
+    )
+    if enabled and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return profiler
+
+
+profiler = Profiler()
+configure()
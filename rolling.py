@@ -0,0 +1,329 @@
+"""Sliding-window demand totals advanced with only the flights that arrived or expired
+
+A RollingDemand keeps, for every demand-cube cell (route, hour, weekday),
+the running count, price/distance/duration sums, minima and maxima of the
+flights that departed (or, for an arrivals window, landed) in the last
+``span`` seconds. Advancing the window
+applies the newly fetched flights and subtracts those that fell out of it,
+so a refresh aggregates only the flights that changed, not the window. The
+last ``settle`` seconds, whose flights may still be listed late upstream,
+are loaded again on every advance and compared with the window: only the
+flights that appeared, disappeared or changed there are added or
+subtracted. The cube's PriceIndex is kept sorted the same way: new flights
+are merged into it and dropped ones removed, without re-sorting the window.
+
+Within one key every partial sum of float32 measures is exact in float64,
+so adding and subtracting in any order gives the same totals. A minimum or
+maximum is recomputed only for keys whose extreme flight just expired. The
+resulting cube matches ``build_cube`` over the window row for row.
+"""
+import itertools
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cube import CUBE_COLUMNS, MEASURES, PRICE_BITS, DemandCube, PriceIndex, price_order
+from ingest import TIME_COLUMN
+from profiling import timed
+
+TOTAL_COLUMNS = ['count'] + [f'{prefix}_sum' for prefix in MEASURES]
+MIN_COLUMNS = [f'{prefix}_min' for prefix in MEASURES] + ['price_per_km_min']
+MAX_COLUMNS = [f'{prefix}_max' for prefix in MEASURES]
+# Upstream fields of a flight; every other column of an enriched frame is derived from them
+IDENTITY_COLUMNS = ['callsign', 'estDepartureAirport', 'estArrivalAirport', 'firstSeen', 'lastSeen']
+
+_instances = itertools.count(1)
+
+
+def _measures(flights):
+    """Per-flight (totals, minima, maxima) inputs in the column order of the running arrays"""
+    values = np.column_stack([flights[col].to_numpy(dtype=np.float64) for col in MEASURES.values()])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_km = flights['Price'].to_numpy() / flights['Distance (km)'].to_numpy(dtype=np.float64)
+    return np.column_stack([np.ones(len(flights)), values]), np.column_stack([values, per_km]), values
+
+
+def _identity(flights):
+    """One hash per flight of its upstream fields, with repeated flights told apart by occurrence"""
+    if not len(flights):
+        return np.empty(0, dtype=np.uint64)
+    hashes = pd.util.hash_pandas_object(flights[IDENTITY_COLUMNS], index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    if occurrence.any():
+        hashes = pd.util.hash_pandas_object(pd.DataFrame({'hash': hashes, 'occurrence': occurrence}), index=False).to_numpy()
+    return hashes
+
+
+@dataclass
+class WindowSnapshot:
+    """Flights and demand cube of one state of a rolling window"""
+    start: int
+    end: int
+    version: int
+    flights: pd.DataFrame
+    cube: DemandCube
+
+
+class RollingDemand:
+    """Running demand aggregates and enriched flights for a window of ``span`` seconds ending at ``end``
+
+    A ``direction="arrival"`` window holds flights by lastSeen instead of
+    firstSeen.
+    """
+
+    def __init__(self, span, airport_codes, settle=0, direction="departure"):
+        self.span = int(span)
+        self.codes = list(airport_codes)
+        self.settle = int(settle)
+        self.time_column = TIME_COLUMN[direction]   # firstSeen for departures, lastSeen for arrivals
+        self.instance = next(_instances)   # distinguishes windows recreated with the same span
+        self.start = None
+        self.end = None
+        self.version = 0
+        self.added = 0     # flights added to the aggregates by the last advance
+        self.removed = 0   # flights subtracted by the last advance (expired or changed upstream)
+        self._lock = threading.Lock()
+        self._reset()
+
+    # --- Key Encoding ---
+    def _encode(self, flights):
+        """One int64 per flight whose ordering is the lexicographic ordering of the cube keys"""
+        key = flights['estDepartureAirport'].cat.codes.to_numpy().astype(np.int64)
+        key = key * len(self.codes) + flights['estArrivalAirport'].cat.codes.to_numpy()
+        key = key * 24 + flights['Hour'].to_numpy()
+        return key * 7 + flights['Weekday'].to_numpy()
+
+    def _decode(self, keys):
+        keys, weekday = np.divmod(keys, 7)
+        keys, hour = np.divmod(keys, 24)
+        departure, arrival = np.divmod(keys, len(self.codes))
+        return {
+            'estDepartureAirport': pd.Categorical.from_codes(departure, categories=self.codes),
+            'estArrivalAirport': pd.Categorical.from_codes(arrival, categories=self.codes),
+            'Hour': hour, 'Weekday': weekday,
+        }
+
+    # --- Running Aggregates ---
+    def _slots_for(self, keys):
+        """Slot of each distinct key, allocating slots for keys not seen before"""
+        slots = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys.tolist()):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = len(self._slots)
+                if slot == len(self._keys):
+                    self._grow(max(64, 2 * len(self._keys)))
+                self._keys[slot] = key
+            slots[i] = slot
+        return slots
+
+    def _grow(self, capacity):
+        extra = capacity - len(self._keys)
+        self._keys = np.concatenate([self._keys, np.zeros(extra, dtype=np.int64)])
+        self._totals = np.vstack([self._totals, np.zeros((extra, len(TOTAL_COLUMNS)))])
+        self._minima = np.vstack([self._minima, np.full((extra, len(MIN_COLUMNS)), np.inf)])
+        self._maxima = np.vstack([self._maxima, np.full((extra, len(MAX_COLUMNS)), -np.inf)])
+
+    def _add(self, flights, keys):
+        """Add flights to the running aggregates and return the slot of each"""
+        unique, inverse = np.unique(keys, return_inverse=True)
+        rows = self._slots_for(unique)[inverse]
+        totals, lows, highs = _measures(flights)
+        np.add.at(self._totals, rows, totals)
+        np.minimum.at(self._minima, rows, lows)
+        np.maximum.at(self._maxima, rows, highs)
+        self.added += len(flights)
+        return rows
+
+    def _remove(self, flights, keys):
+        self.removed += len(flights)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        slots = np.fromiter((self._slots[key] for key in unique.tolist()), dtype=np.intp, count=len(unique))
+        totals, lows, highs = _measures(flights)
+        np.subtract.at(self._totals, slots[inverse], totals)
+        removed_lows = np.full((len(unique), len(MIN_COLUMNS)), np.inf)
+        removed_highs = np.full((len(unique), len(MAX_COLUMNS)), -np.inf)
+        np.minimum.at(removed_lows, inverse, lows)
+        np.maximum.at(removed_highs, inverse, highs)
+
+        emptied = self._totals[slots, 0] == 0
+        self._totals[slots[emptied]] = 0
+        self._minima[slots[emptied]] = np.inf
+        self._maxima[slots[emptied]] = -np.inf
+        # Only keys that lost their minimum or maximum flight need a rescan
+        stale = ~emptied & (
+            (removed_lows <= self._minima[slots]).any(axis=1) | (removed_highs >= self._maxima[slots]).any(axis=1)
+        )
+        if stale.any():
+            self._rescan(unique[stale], slots[stale])
+
+    def _rescan(self, keys, slots):
+        """Recompute minima and maxima of some keys from the flights left in the window"""
+        mask = np.isin(self._flight_keys, keys)
+        position = np.searchsorted(keys, self._flight_keys[mask])
+        _, lows, highs = _measures(self._flights[mask])
+        minima = np.full((len(keys), len(MIN_COLUMNS)), np.inf)
+        maxima = np.full((len(keys), len(MAX_COLUMNS)), -np.inf)
+        np.minimum.at(minima, position, lows)
+        np.maximum.at(maxima, position, highs)
+        self._minima[slots] = minima
+        self._maxima[slots] = maxima
+
+    def _index(self, flights, slots, sequence):
+        """Merge flights into the price index, tagged with their sequence numbers"""
+        keys = slots.astype(np.int64) << PRICE_BITS | price_order(flights['Price'].to_numpy())
+        order = np.argsort(keys, kind='stable')
+        at = np.searchsorted(self._price_keys, keys[order], side='right')
+        self._price_keys = np.insert(self._price_keys, at, keys[order])
+        self._price_durations = np.insert(self._price_durations, at, flights['Duration (min)'].to_numpy()[order])
+        self._price_sequence = np.insert(self._price_sequence, at, sequence[order])
+
+    def _merge(self, begin, flights):
+        """Replace the window's flights seen at or after ``begin`` with ``flights``
+
+        Only the loaded flights that were not in the window yet are added, and
+        only the window's flights that were not loaded again are subtracted.
+        """
+        cut = self._cut(begin)
+        stored, stored_keys, stored_sequence = (
+            self._flights.iloc[cut:], self._flight_keys[cut:], self._flight_sequence[cut:])
+        if len(flights):
+            flights = flights.iloc[np.argsort(flights[self.time_column].to_numpy(), kind='stable')].reset_index(drop=True)
+        stored_ids, loaded_ids = _identity(stored), _identity(flights)
+        gone = ~np.isin(stored_ids, loaded_ids)
+        new = ~np.isin(loaded_ids, stored_ids)
+        keys = self._encode(flights) if len(flights) else np.empty(0, dtype=np.int64)
+        # Flights loaded again keep their sequence numbers, so their price index entries stay
+        sequence = np.empty(len(flights), dtype=np.int64)
+        order = np.argsort(stored_ids)
+        sequence[~new] = stored_sequence[order[np.searchsorted(stored_ids, loaded_ids[~new], sorter=order)]]
+        sequence[new] = self._next_sequence + np.arange(np.count_nonzero(new), dtype=np.int64)
+        self._next_sequence += np.count_nonzero(new)
+
+        head = self._flights.iloc[:cut]
+        if head.empty or not len(flights):
+            merged = flights if head.empty else head.reset_index(drop=True)
+        else:
+            # Each load has its own callsign categories; union them instead of falling back to object
+            callsigns = union_categoricals([head['callsign'], flights['callsign']])
+            merged = pd.concat([head.drop(columns='callsign'), flights.drop(columns='callsign')], ignore_index=True)
+            merged.insert(head.columns.get_loc('callsign'), 'callsign', callsigns)
+        self._flights = merged if len(merged) else pd.DataFrame()
+        self._flight_keys = np.concatenate([self._flight_keys[:cut], keys])
+        self._flight_sequence = np.concatenate([self._flight_sequence[:cut], sequence])
+        if gone.any():
+            self._remove(stored[gone], stored_keys[gone])
+            self._unindex(~np.isin(self._price_sequence, stored_sequence[gone]))
+        if new.any():
+            self._index(flights[new], self._add(flights[new], keys[new]), sequence[new])
+
+    def _cut(self, time):
+        """Position of the first window flight seen at or after ``time``"""
+        return int(np.searchsorted(self._flights[self.time_column].to_numpy(), time, side='left')) if len(self._flights) else 0
+
+    def _unindex(self, live):
+        self._price_keys = self._price_keys[live]
+        self._price_durations = self._price_durations[live]
+        self._price_sequence = self._price_sequence[live]
+
+    def _expire(self, start):
+        """Subtract and drop flights seen before ``start``"""
+        cut = self._cut(start)
+        if cut:
+            expired, expired_keys = self._flights.iloc[:cut], self._flight_keys[:cut]
+            expired_sequence = self._flight_sequence[:cut]
+            self._flights = self._flights.iloc[cut:].reset_index(drop=True)
+            self._flight_keys = self._flight_keys[cut:]
+            self._flight_sequence = self._flight_sequence[cut:]
+            self._remove(expired, expired_keys)
+            self._unindex(~np.isin(self._price_sequence, expired_sequence))
+
+    def _compact(self):
+        """Drop the slots of keys that no longer have flights in the window"""
+        live = np.flatnonzero(self._totals[:len(self._slots), 0] > 0)
+        # Renumbering keeps slot order, so the price index stays sorted
+        renumber = np.zeros(len(self._keys), dtype=np.int64)
+        renumber[live] = np.arange(len(live))
+        self._price_keys = renumber[self._price_keys >> PRICE_BITS] << PRICE_BITS | self._price_keys & (1 << PRICE_BITS) - 1
+        self._keys, self._totals = self._keys[live], self._totals[live]
+        self._minima, self._maxima = self._minima[live], self._maxima[live]
+        self._slots = {key: slot for slot, key in enumerate(self._keys.tolist())}
+
+    def _reset(self):
+        self._flights = pd.DataFrame()
+        self._flight_keys = np.empty(0, dtype=np.int64)
+        self._flight_sequence = np.empty(0, dtype=np.int64)   # sequence number of each window flight
+        self._slots = {}   # cube key -> row of the running arrays
+        self._keys = np.empty(0, dtype=np.int64)
+        self._totals = np.empty((0, len(TOTAL_COLUMNS)))
+        self._minima = np.empty((0, len(MIN_COLUMNS)))
+        self._maxima = np.empty((0, len(MAX_COLUMNS)))
+        self._price_keys = np.empty(0, dtype=np.int64)     # slot << PRICE_BITS | price order, sorted
+        self._price_durations = np.empty(0, dtype=np.float32)
+        self._price_sequence = np.empty(0, dtype=np.int64)  # sequence number of each indexed flight
+        self._next_sequence = 0
+        self._snapshot = None
+
+    # --- Window ---
+    @timed("rolling_advance", rows=None)
+    def advance(self, end, load):
+        """Move the window to end at ``end`` and return its WindowSnapshot, or None when loading failed
+
+        ``load(begin, end)`` returns the enriched flights that departed (or
+        landed, per the window's direction) in [begin, end] (an empty frame for none, None on failure). Only the
+        interval since the previous ``end``, plus the ``settle`` seconds
+        before it, is loaded unless the window jumped past it; of those
+        settle seconds only the flights that changed are applied.
+        """
+        end = int(end)
+        start = end - self.span
+        with self._lock:
+            if self.end is not None and end <= self.end:
+                return self.snapshot()
+            jumped = self.end is None or start > self.end
+            begin = start if jumped else max(start, self.end + 1 - self.settle)
+            flights = load(begin, end)
+            if flights is None:
+                return None
+            if jumped:
+                self._reset()
+            self.added = self.removed = 0
+            self._merge(begin, flights)
+            self._expire(start)
+            if len(self._slots) > 1024 and 2 * np.count_nonzero(self._totals[:len(self._slots), 0]) < len(self._slots):
+                self._compact()
+            self.start, self.end = start, end
+            self.version += 1
+            self._snapshot = None
+            return self.snapshot()
+
+    def invalidate(self):
+        """Reload the whole window on the next advance (e.g. after a failed fetch left a gap)"""
+        with self._lock:
+            self.end = None
+
+    def snapshot(self):
+        """WindowSnapshot of the current window, built once per advance"""
+        if self._snapshot is None:
+            self._snapshot = WindowSnapshot(self.start, self.end, self.version, self._flights, self.cube())
+        return self._snapshot
+
+    # --- Views ---
+    def cube(self):
+        """DemandCube of the running aggregates, in build_cube row order"""
+        live = np.flatnonzero(self._totals[:len(self._slots), 0] > 0)
+        order = live[np.argsort(self._keys[live], kind='stable')]
+        table = pd.DataFrame(self._decode(self._keys[order]))
+        table['count'] = self._totals[order, 0].astype(np.int64)
+        for columns, values in ((TOTAL_COLUMNS[1:], self._totals[order, 1:]),
+                                (MIN_COLUMNS, self._minima[order]), (MAX_COLUMNS, self._maxima[order])):
+            for i, col in enumerate(columns):
+                table[col] = values[:, i]
+        return DemandCube(table[CUBE_COLUMNS], PriceIndex(order.astype(np.int64), self._price_keys, self._price_durations))
+
+    @property
+    def total_flights(self):
+        return int(self._totals[:len(self._slots), 0].sum())
@@ -0,0 +1,156 @@
+"""Route map figure built from aggregated routes instead of one trace per flight"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from airports import airport_table, as_table
+from profiling import timed
+
+ROUTE_COLOR = '#1e3d73'
+AIRPORT_COLOR = '#e74c3c'
+
+
+def route_counts(df):
+    """Number of flights per (departure, arrival) pair, busiest first"""
+    routes = (
+        df.groupby(['estDepartureAirport', 'estArrivalAirport'], observed=True)
+        .size()
+        .reset_index(name='Flights')
+    )
+    return routes.sort_values('Flights', ascending=False, ignore_index=True)
+
+
+def great_circle_arcs(lat1, lon1, lat2, lon2, points=16):
+    """Sample points along the great circle of each route, returned as (routes, points) arrays in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float))[:, None] for a in (lat1, lon1, lat2, lon2))
+    start = np.stack([np.cos(lat1) * np.cos(lon1), np.cos(lat1) * np.sin(lon1), np.sin(lat1)], axis=-1)
+    end = np.stack([np.cos(lat2) * np.cos(lon2), np.cos(lat2) * np.sin(lon2), np.sin(lat2)], axis=-1)
+
+    # Spherical linear interpolation between the two unit vectors
+    omega = np.arccos(np.clip((start * end).sum(axis=-1, keepdims=True), -1.0, 1.0))
+    t = np.linspace(0.0, 1.0, points)[None, :, None]
+    sin_omega = np.sin(omega)
+    safe = np.where(sin_omega == 0, 1.0, sin_omega)
+    vectors = np.where(
+        sin_omega == 0,
+        start + (end - start) * t,
+        (np.sin((1 - t) * omega) * start + np.sin(t * omega) * end) / safe,
+    )
+    lats = np.degrees(np.arctan2(vectors[..., 2], np.hypot(vectors[..., 0], vectors[..., 1])))
+    lons = np.degrees(np.arctan2(vectors[..., 1], vectors[..., 0]))
+    return lats, lons
+
+
+@functools.lru_cache(maxsize=None)
+def base_geo():
+    """Map projection and styling shared by every route map, validated once per process"""
+    import plotly.graph_objects as go
+    return go.layout.Geo(
+        projection_type="natural earth",
+        projection_scale=3,
+        scope='world',
+        showland=True,
+        landcolor="rgb(243, 243, 243)",
+        countrycolor="rgb(204, 204, 204)",
+        showocean=True,
+        oceancolor="rgb(212, 236, 255)",
+        showcountries=True,
+        showcoastlines=True
+    )
+
+
+def _join_segments(lats, lons, labels):
+    """Flatten (routes, points) arrays into one polyline with None between routes"""
+    routes, points = lats.shape
+    gap = np.full((routes, 1), None, dtype=object)
+    lat = np.hstack([lats.astype(object), gap]).ravel().tolist()
+    lon = np.hstack([lons.astype(object), gap]).ravel().tolist()
+    text = np.hstack([np.repeat(np.asarray(labels, dtype=object)[:, None], points, axis=1), gap]).ravel().tolist()
+    return lat, lon, text
+
+
+@timed("route_map", rows=None)
+def build_route_map(df, airport_code, airports=None, width_tiers=4, arcs=False, arc_points=16, title=None):
+    """Route map with one line trace per traffic tier and one marker trace for airports
+
+    ``df`` is either a flight frame or an already aggregated routes table
+    with a 'Flights' column (e.g. ``DemandCube.routes()`` or
+    ``ODMatrix.routes()``).
+    """
+    airports = as_table(airport_table if airports is None else airports)
+    routes = df if 'Flights' in df.columns else route_counts(df)
+    dep_rows = airports.locate(routes['estDepartureAirport'])
+    arr_rows = airports.locate(routes['estArrivalAirport'])
+    known = (dep_rows >= 0) & (arr_rows >= 0)
+    routes, dep_rows, arr_rows = routes[known], dep_rows[known], arr_rows[known]
+
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    if not routes.empty:
+        dep = np.column_stack([airports.lat[dep_rows], airports.lon[dep_rows]])
+        arr = np.column_stack([airports.lat[arr_rows], airports.lon[arr_rows]])
+        counts = routes['Flights'].to_numpy()
+        labels = (
+            routes['estDepartureAirport'].astype(str) + ' → ' + routes['estArrivalAirport'].astype(str)
+            + ': ' + routes['Flights'].astype(str) + ' flights'
+        ).to_numpy()
+
+        if arcs:
+            lats, lons = great_circle_arcs(dep[:, 0], dep[:, 1], arr[:, 0], arr[:, 1], points=arc_points)
+        else:
+            lats = np.column_stack([dep[:, 0], arr[:, 0]])
+            lons = np.column_stack([dep[:, 1], arr[:, 1]])
+
+        # Log-scaled traffic tiers so a handful of traces carries every route
+        scale = np.log1p(counts) / np.log1p(counts.max())
+        tiers = np.clip(np.ceil(scale * width_tiers).astype(int), 1, width_tiers)
+
+        for tier in range(1, width_tiers + 1):
+            mask = tiers == tier
+            if not mask.any():
+                continue
+            lat, lon, text = _join_segments(lats[mask], lons[mask], labels[mask])
+            fig.add_trace(go.Scattergeo(
+                lat=lat,
+                lon=lon,
+                text=text,
+                mode='lines',
+                line=dict(width=0.5 + 1.5 * tier, color=ROUTE_COLOR),
+                opacity=0.25 + 0.65 * tier / width_tiers,
+                hoverinfo='text',
+                name=f"{counts[mask].min()}–{counts[mask].max()} flights",
+                showlegend=width_tiers > 1
+            ))
+
+    # Add airport markers
+    airports_in_data = pd.unique(np.concatenate([
+        routes['estDepartureAirport'].to_numpy(), routes['estArrivalAirport'].to_numpy()
+    ]))
+    if len(airports_in_data):
+        traffic = (
+            routes.groupby('estDepartureAirport')['Flights'].sum()
+            .add(routes.groupby('estArrivalAirport')['Flights'].sum(), fill_value=0)
+        )
+        rows = airports.locate(airports_in_data)
+        flights = traffic.reindex(airports_in_data, fill_value=0).astype(int).astype(str).to_numpy()
+        fig.add_trace(go.Scattergeo(
+            lat=airports.lat[rows],
+            lon=airports.lon[rows],
+            mode='markers',
+            marker=dict(size=10, color=AIRPORT_COLOR),
+            text=(airports.names[rows] + ': ' + flights + ' flights').tolist(),
+            hoverinfo='text',
+            name='Airports'
+        ))
+
+    # Shared base layout, then only what depends on the selected airport
+    fig.layout.geo = base_geo()
+    fig.update_layout(
+        title=title or f"Flight Routes from {airports[airport_code]['name']}",
+        height=600,
+        geo_center=dict(lat=airports[airport_code]["coords"][0],
+                        lon=airports[airport_code]["coords"][1])
+    )
+    return fig
@@ -0,0 +1,504 @@
+"""Flight cache shared by every dashboard replica, in SQLite or a Redis-protocol server
+
+Upstream responses are stored per (airport, hour bucket) as zstd-compressed
+Arrow IPC blobs, so a range one replica fetched from OpenSky is served to
+every other replica pointed at the same backend. Each blob records when it
+was fetched: buckets that had ended ``settle`` seconds before then are final,
+while more recent ones, whose late-listed flights may still be missing, are
+reused for ``open_ttl`` seconds and reported as complete only up to their
+fetch time. The backend bounds its size by evicting the least recently
+used entries and keeps hit/miss counters that every replica adds to.
+
+    SHARED_CACHE_URL=sqlite:////srv/shared/flights.sqlite streamlit run app.py
+    SHARED_CACHE_URL=redis://cache-host:6379/0?max_bytes=1073741824 streamlit run app.py
+    python shared_cache.py --url redis://127.0.0.1:6390 stats
+"""
+import argparse
+import itertools
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qs, unquote, urlparse
+
+from flight_cache import BUCKET_SECONDS, airport_key, bucket_runs, bucket_starts, split_buckets
+from ingest import TIME_COLUMN, between, concat_flights, decode_flights, encode_flights
+from opensky import MAX_QUERY_SECONDS, SETTLE_SECONDS
+
+KEY_PREFIX = "flight_demand:"
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+ENTRY_TTL = 7 * 24 * 3600   # seconds a Redis entry lives, even if it is never evicted
+EVICT_BATCH = 64            # least recently used Redis entries looked at per eviction round trip
+RETRY_AFTER_SECONDS = 30    # an unreachable Redis server is not dialled again for this long
+# Commands that may run twice with the same effect and reply, so a pipeline of only these can be resent
+# after its connection dropped mid-reply; counters (INCRBY) and ZREM, whose reply drives eviction, are not
+REPLAYABLE = {"GET", "MGET", "SET", "DEL", "HSET", "HMGET", "HDEL", "ZADD", "ZRANGE", "ZCARD", "SCAN"}
+STATS_TTL = 10              # seconds shared stats are reused, since the sidebar asks on every rerun
+COUNTERS = ("hits", "misses", "stores", "errors")
+
+logger = logging.getLogger("flight_demand.shared_cache")
+
+
+# --- SQLite Backend ---
+class SQLiteBackend:
+    """Shared cache in one SQLite file for replicas on the same host or a local shared volume
+
+    Writes take the database lock up front (``BEGIN IMMEDIATE``), so eviction
+    in one process never interleaves with an insert from another.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect(write=True) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self, write=False):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def get_many(self, keys):
+        """Stored value of each key (None when missing), refreshing their LRU position"""
+        with self._connect(write=True) as conn:
+            found = dict(conn.execute(
+                f"SELECT key, value FROM entries WHERE key IN ({', '.join('?' * len(keys))})", keys
+            ).fetchall()) if keys else {}
+            conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                             [(time.time(), key) for key in found])
+        return [found.get(key) for key in keys]
+
+    def set_many(self, items):
+        """Store ``{key: bytes}`` and evict the least recently used entries beyond ``max_bytes``"""
+        now = time.time()
+        with self._connect(write=True) as conn:
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                             [(key, value, len(value), now) for key, value in items.items()])
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+                self._incr(conn, "evictions", len(evicted))
+
+    @staticmethod
+    def _incr(conn, name, amount):
+        conn.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + ?",
+                     (name, amount, amount))
+
+    def incr(self, counts):
+        """Add to named counters shared by every process using the file"""
+        with self._connect(write=True) as conn:
+            for name, amount in counts.items():
+                self._incr(conn, name, amount)
+
+    def stats(self):
+        """Shared counters plus entry count and stored bytes"""
+        with self._connect() as conn:
+            stats = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            stats["entries"], stats["bytes"] = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return stats
+
+    def clear(self):
+        with self._connect(write=True) as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
+
+
+# --- Redis Backend ---
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class NotSent(ConnectionError):
+    """Connection failure before any byte of a pipeline reached the server, so it is safe to resend"""
+
+
+class RedisConnection:
+    """Blocking RESP2 connection to a Redis-compatible server"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    @staticmethod
+    def encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            return None if size < 0 else self.reader.read(size + 2)[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self.read_reply() for _ in range(size)]
+        raise RedisError(f"Unexpected reply: {line[:40]!r}")
+
+    def pipeline(self, commands):
+        """Send several commands in one round trip and return their replies in order"""
+        data = memoryview(b"".join(self.encode(command) for command in commands))
+        sent = 0
+        try:
+            while sent < len(data):
+                sent += self.sock.send(data[sent:])
+        except OSError as e:
+            if sent:
+                raise
+            raise NotSent(str(e) or type(e).__name__) from e
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(self.read_reply())
+            except RedisError as e:
+                replies.append(e)
+        return replies
+
+    def execute(self, *args):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class RedisBackend:
+    """Shared cache in a Redis-compatible server, for replicas on different hosts
+
+    The server may be shared with other applications, so its configuration
+    is left alone and the limits are enforced here: every entry expires after
+    ``ttl`` seconds, and an index under the key prefix (last access and size
+    per entry, plus their total) lets the least recently used entries beyond
+    ``max_bytes`` be evicted. The total is kept with INCRBY, so concurrent
+    writers may overshoot it briefly. One connection is kept per thread;
+    after a failed connect every call fails fast for ``RETRY_AFTER_SECONDS``
+    instead of waiting out the connect timeout again.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, max_bytes=DEFAULT_MAX_BYTES,
+                 prefix=KEY_PREFIX, ttl=ENTRY_TTL):
+        self.address = (host, port, db, password)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.ttl = int(ttl)
+        self._lru = f"{prefix}index:lru"       # sorted set: entry key -> last access time
+        self._sizes = f"{prefix}index:sizes"   # hash: entry key -> stored bytes
+        self._bytes = f"{prefix}index:bytes"   # sum of the stored sizes
+        self._local = threading.local()
+        self._retry_at = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if time.monotonic() < self._retry_at:
+                raise ConnectionError("Cache server unreachable, not retrying yet")
+            try:
+                conn = self._local.conn = RedisConnection(*self.address)
+            except OSError:
+                self._retry_at = time.monotonic() + RETRY_AFTER_SECONDS
+                raise
+        return conn
+
+    def _pipeline(self, commands):
+        """Run commands, resending them on a new connection if the server dropped the open one
+
+        Once any byte was sent the server may already have run some of the
+        commands, so only pipelines of ``REPLAYABLE`` commands are resent.
+        """
+        conn = self._connection()
+        try:
+            return conn.pipeline(commands)
+        except OSError as e:
+            self._local.conn = None
+            conn.close()
+            if not isinstance(e, NotSent) and not all(command[0] in REPLAYABLE for command in commands):
+                raise
+            return self._connection().pipeline(commands)
+
+    def _execute(self, commands):
+        """Pipelined replies, raising the first error reply"""
+        replies = self._pipeline(commands)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def get_many(self, keys):
+        """Stored value of each key (None when missing), refreshing their LRU position"""
+        if not keys:
+            return []
+        now = time.time()
+        return self._execute([
+            ("MGET", *(self.prefix + key for key in keys)),
+            ("ZADD", self._lru, "XX", *(arg for key in keys for arg in (now, key))),
+        ])[0]
+
+    def set_many(self, items):
+        """Store ``{key: bytes}`` with a TTL and evict the least recently used entries beyond ``max_bytes``"""
+        if not items:
+            return
+        now = time.time()
+        sizes = {key: len(value) for key, value in items.items()}
+        replaced = self._execute([("HMGET", self._sizes, *sizes)])[0]
+        total = self._execute(
+            [("SET", self.prefix + key, value, "EX", self.ttl) for key, value in items.items()] + [
+                ("HSET", self._sizes, *(arg for item in sizes.items() for arg in item)),
+                ("ZADD", self._lru, *(arg for key in sizes for arg in (now, key))),
+                ("INCRBY", self._bytes, sum(sizes.values()) - sum(int(size or 0) for size in replaced)),
+            ])[-1]
+        if total > self.max_bytes:
+            self._evict(total - self.max_bytes)
+
+    def _evict(self, excess):
+        """Delete least recently used entries until ``excess`` bytes are freed"""
+        while excess > 0:
+            oldest = self._execute([("ZRANGE", self._lru, 0, EVICT_BATCH - 1)])[0]
+            if not oldest:
+                # Nothing left to evict: the total drifted, start it over
+                self._execute([("SET", self._bytes, 0)])
+                return
+            sizes = [int(size or 0) for size in self._execute([("HMGET", self._sizes, *oldest)])[0]]
+            batch = len(oldest)
+            for i, size in enumerate(itertools.accumulate(sizes)):
+                if size >= excess:
+                    batch = i + 1
+                    break
+            keys, sizes = oldest[:batch], sizes[:batch]
+            replies = self._execute([("ZREM", self._lru, key) for key in keys] + [
+                ("DEL", *(self.prefix.encode() + key for key in keys)),
+                ("HDEL", self._sizes, *keys),
+            ])
+            # Only the writer whose ZREM removed an entry accounts for it, so concurrent evictions count once
+            removed = replies[:len(keys)]
+            freed = sum(size for size, gone in zip(sizes, removed) if gone)
+            self._execute([("INCRBY", self._bytes, -freed), ("INCRBY", f"{self.prefix}counter:evictions", sum(removed))])
+            excess -= sum(sizes)
+
+    def incr(self, counts):
+        self._pipeline([("INCRBY", f"{self.prefix}counter:{name}", amount) for name, amount in counts.items()])
+
+    def stats(self):
+        """Shared counters plus entry count and stored bytes, all under the key prefix"""
+        names = [name for name in COUNTERS if name != "errors"] + ["evictions"]
+        values, size, entries = self._execute([
+            ("MGET", *(f"{self.prefix}counter:{name}" for name in names)),
+            ("GET", self._bytes),
+            ("ZCARD", self._lru),
+        ])
+        stats = {name: int(value or 0) for name, value in zip(names, values)}
+        stats["bytes"], stats["entries"] = int(size or 0), entries
+        return stats
+
+    def clear(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._connection().execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 1000)
+            if keys:
+                self._connection().execute("DEL", *keys)
+            if cursor in (b"0", 0, "0"):
+                break
+
+
+def open_backend(url):
+    """Backend for a ``sqlite:///path`` or ``redis://[:password@]host:port/db`` URL (a bare path means SQLite)
+
+    ``?max_bytes=N`` bounds the stored size for either backend; ``?ttl=N``
+    sets how many seconds a Redis entry lives.
+    """
+    parsed = urlparse(url)
+    options = parse_qs(parsed.query)
+    max_bytes = int(options["max_bytes"][0]) if "max_bytes" in options else None
+    if parsed.scheme in ("redis", "tcp"):
+        db = int(parsed.path.strip("/") or 0)
+        password = unquote(parsed.password) if parsed.password else None
+        ttl = int(options["ttl"][0]) if "ttl" in options else ENTRY_TTL
+        return RedisBackend(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, password,
+                            max_bytes or DEFAULT_MAX_BYTES, ttl=ttl)
+    if parsed.scheme in ("sqlite", ""):
+        path = unquote(parsed.path[1:] if parsed.scheme else parsed.path)
+        return SQLiteBackend(path, max_bytes or DEFAULT_MAX_BYTES)
+    raise ValueError(f"Unsupported shared cache URL: {url}")
+
+
+# --- Flight Cache ---
+class SharedFlightCache:
+    """Hour buckets of upstream flights in a shared backend, in front of an upstream fetch
+
+    Backend failures count as misses, so an unreachable cache server never
+    fails a fetch.
+    """
+
+    def __init__(self, backend, bucket_seconds=BUCKET_SECONDS, open_ttl=60, max_span=MAX_QUERY_SECONDS,
+                 settle=SETTLE_SECONDS, clock=time.time):
+        self.backend = backend
+        self.bucket_seconds = bucket_seconds
+        self.open_ttl = open_ttl
+        self.settle = settle
+        self.max_span = max_span
+        self.clock = clock
+        self.counts = dict.fromkeys(COUNTERS, 0)   # this process only; backend.stats() has every replica's
+        self._stats = (None, None)                 # (time read, backend or fallback stats)
+        self._lock = threading.Lock()
+
+    def key(self, airport_code, bucket):
+        return f"flights:v1:{airport_code}:{self.bucket_seconds}:{bucket}"
+
+    def _count(self, **counts):
+        counts = {name: amount for name, amount in counts.items() if amount}
+        with self._lock:
+            for name, amount in counts.items():
+                self.counts[name] += amount
+        try:
+            self.backend.incr({name: amount for name, amount in counts.items() if name != "errors"})
+        except Exception as e:
+            logger.warning("Shared cache counters unavailable: %s", e)
+
+    def _complete(self, bucket, fetched_at):
+        """Whether a bucket had settled upstream when it was fetched"""
+        return bucket + self.bucket_seconds <= fetched_at - self.settle
+
+    def _get(self, airport_code, buckets, now):
+        """{bucket: (flights, fetched_at)} of the stored buckets, leaving out unsettled ones older than ``open_ttl``"""
+        try:
+            blobs = self.backend.get_many([self.key(airport_code, bucket) for bucket in buckets])
+            found = {bucket: decode_flights(blob) for bucket, blob in zip(buckets, blobs) if blob is not None}
+            found = {bucket: (flights, float(metadata["fetched_at"])) for bucket, (flights, metadata) in found.items()}
+        except Exception as e:
+            logger.warning("Shared cache read failed: %s", e)
+            self._count(errors=1)
+            return {}
+        return {
+            bucket: (flights, fetched_at) for bucket, (flights, fetched_at) in found.items()
+            if self._complete(bucket, fetched_at) or now - fetched_at <= self.open_ttl
+        }
+
+    def _put(self, airport_code, run, flights, fetched_at, column="firstSeen"):
+        """Store every bucket of a fetched run"""
+        by_bucket = split_buckets(flights, run, self.bucket_seconds, column)
+        try:
+            self.backend.set_many({
+                self.key(airport_code, bucket): encode_flights(bucket_flights, {"fetched_at": repr(float(fetched_at))})
+                for bucket, bucket_flights in by_bucket.items()
+            })
+        except Exception as e:
+            logger.warning("Shared cache write failed: %s", e)
+            self._count(errors=1)
+            return 0
+        return len(by_bucket)
+
+    def fetch(self, airport_code, begin, end, fetch, direction="departure"):
+        """Flights departing (or arriving, per ``direction``) in [begin, end] and the time they are complete up to
+
+        Stored buckets are served from the backend; consecutive missing ones
+        are fetched with ``fetch(airport_code, begin, end)`` and stored. The
+        returned time is the fetch time of the oldest unsettled bucket served
+        from the backend, or now.
+        """
+        now = self.clock()
+        key, column = airport_key(airport_code, direction), TIME_COLUMN[direction]
+        buckets = bucket_starts(begin, end, self.bucket_seconds)
+        cached = self._get(key, buckets, now)
+        missing = [bucket for bucket in buckets if bucket not in cached]
+        frames = [cached[bucket][0] for bucket in buckets if bucket in cached]
+        as_of = min([now] + [fetched_at for bucket, (_, fetched_at) in cached.items()
+                             if not self._complete(bucket, fetched_at)])
+        stores = 0
+        for run in bucket_runs(missing, self.max_span, self.bucket_seconds):
+            fetched_at = self.clock()
+            run_flights = fetch(airport_code, run[0], run[-1] + self.bucket_seconds - 1)
+            stores += self._put(key, run, run_flights, fetched_at, column)
+            frames.append(run_flights)
+        self._count(hits=len(cached), misses=len(missing), stores=stores)
+        return between(concat_flights(frames), begin, end, column), as_of
+
+    def stats(self):
+        """Counters of every replica from the backend, or this process's when it is unreachable
+
+        Either answer is reused for ``STATS_TTL`` seconds.
+        """
+        now = self.clock()
+        read_at, stats = self._stats
+        if stats is None or now - read_at >= STATS_TTL:
+            try:
+                stats = self.backend.stats()
+            except Exception as e:
+                logger.warning("Shared cache stats unavailable: %s", e)
+                stats = dict(self.counts)
+            self._stats = (now, stats)
+        return dict(stats)
+
+
+def open_shared_cache(url=None):
+    """SharedFlightCache for a URL (default ``SHARED_CACHE_URL``), or None when unset"""
+    url = url or os.environ.get("SHARED_CACHE_URL")
+    return SharedFlightCache(open_backend(url)) if url else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.environ.get("SHARED_CACHE_URL"), required="SHARED_CACHE_URL" not in os.environ,
+                        help="Backend URL (default SHARED_CACHE_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show shared hit/miss counters and stored size")
+    commands.add_parser("clear", help="Drop every shared entry and counter")
+    args = parser.parse_args(argv)
+
+    backend = open_backend(args.url)
+    if args.command == "clear":
+        backend.clear()
+    for key, value in sorted(backend.stats().items()):
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""Local SQLite warehouse of every fetched flight, with interval coverage tracking
+
+Flights are stored once per (icao24, firstSeen), so a flight fetched as a
+departure of one airport and an arrival at another is kept once, and are
+indexed by (estDepartureAirport, firstSeen) and (estArrivalAirport,
+lastSeen). A coverage table records which time intervals have been fetched
+per airport and direction, so a range query is answered from disk and only
+the uncovered gaps are requested upstream. OpenSky lists a flight only
+once its track has ended, so only the part of a fetch older than
+``opensky.SETTLE_SECONDS`` is covered for good; the recent tail is kept as
+provisional coverage, reused for ``PROVISIONAL_TTL`` seconds and then
+fetched again. Reads and writes stamp the (airport, hour) buckets they
+touch; once the file's used pages exceed ``max_bytes``, the least recently
+used buckets lose their coverage and flights. Gaps that another
+thread is already fetching are not requested twice: the caller waits for
+that call and shares its result. With a
+``shared_cache.SharedFlightCache``, gaps are first looked up in the cache
+shared by every replica.
+
+    python warehouse.py stats
+    python warehouse.py compact --retention-days 90
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pyarrow as pa
+
+from flight_cache import BUCKET_SECONDS, DEFAULT_CACHE_DIR, airport_key, bucket_starts
+from ingest import AIRPORT_COLUMN, FLIGHT_COLUMNS, FLIGHT_SCHEMA, TIME_COLUMN, flights_from_arrow
+from opensky import MAX_QUERY_SECONDS, SETTLE_SECONDS, chunk_status, fetch_chunks, split_window
+
+PROVISIONAL_TTL = 15 * 60   # seconds a fetched but unsettled interval is served before it is fetched again
+MAX_BYTES = int(os.environ.get("WAREHOUSE_MAX_BYTES", 1024 ** 3))   # used pages kept before LRU eviction
+EVICT_BATCH = 64            # least recently used buckets dropped per eviction round
+
+
+def subtract_intervals(start, end, covered):
+    """Gaps of the inclusive [start, end] not covered by sorted, non-overlapping inclusive intervals"""
+    gaps, cursor = [], start
+    for begin, stop in covered:
+        if stop < cursor:
+            continue
+        if begin > end:
+            break
+        if begin > cursor:
+            gaps.append((cursor, begin - 1))
+        cursor = max(cursor, stop + 1)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def merge_intervals(intervals):
+    """Sorted, non-overlapping union of inclusive intervals, joining adjacent ones"""
+    merged = []
+    for begin, end in sorted(intervals):
+        if merged and begin <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((begin, end))
+    return merged
+
+
+# --- Request Coalescing ---
+class InFlight:
+    """One upstream chunk fetch in progress; ``done`` is set once its flights are stored"""
+    __slots__ = ("begin", "end", "done", "error")
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end = end
+        self.done = threading.Event()
+        self.error = None
+
+
+class SingleFlight:
+    """Per-airport registry of in-progress chunk fetches, so concurrent overlapping requests fetch once"""
+
+    def __init__(self):
+        self._running = {}   # airport -> [InFlight]
+        self._lock = threading.Lock()
+        self.leaders = 0     # chunk fetches sent upstream
+        self.absorbed = 0    # duplicate chunk fetches avoided by waiting on one in progress
+
+    def claim(self, airport_code, gaps, max_span=MAX_QUERY_SECONDS):
+        """Split gaps into chunks this caller must fetch and parts already in flight
+
+        Returns ``(own, shared)``: ``own`` are newly registered InFlights to
+        fetch and ``finish``; ``shared`` are ``(begin, end, InFlight)`` parts
+        of the gaps covered by other callers' fetches.
+        """
+        own, shared = [], []
+        with self._lock:
+            running = sorted(self._running.setdefault(airport_code, []), key=lambda flight: flight.begin)
+            for begin, end in gaps:
+                overlapping = [flight for flight in running if flight.end >= begin and flight.begin <= end]
+                shared.extend((max(begin, flight.begin), min(end, flight.end), flight) for flight in overlapping)
+                for gap_begin, gap_end in subtract_intervals(begin, end, [(f.begin, f.end) for f in overlapping]):
+                    own.extend(InFlight(*chunk) for chunk in split_window(gap_begin, gap_end, max_span))
+            self._running[airport_code].extend(own)
+            self.leaders += len(own)
+            self.absorbed += len(shared)
+        return own, shared
+
+    def finish(self, airport_code, flight, error=None):
+        """Unregister a fetch and wake the callers waiting on it"""
+        with self._lock:
+            self._running[airport_code].remove(flight)
+        flight.error = error
+        flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(len(flights) for flights in self._running.values())
+        return {"leaders": self.leaders, "absorbed": self.absorbed, "in_flight": in_flight}
+
+
+class FlightWarehouse:
+    """Deduplicated flight store that serves covered ranges locally and fetches only the gaps"""
+
+    def __init__(self, path=None, clock=time.time, shared_cache=None, settle=SETTLE_SECONDS,
+                 provisional_ttl=PROVISIONAL_TTL, max_bytes=MAX_BYTES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "flight_warehouse.sqlite")
+        self.clock = clock
+        self.shared_cache = shared_cache
+        self.settle = settle
+        self.provisional_ttl = provisional_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0      # intervals served from disk
+        self.misses = 0    # intervals fetched upstream
+        self.evicted = 0   # (airport, hour) buckets dropped to stay under max_bytes
+        self.single_flight = SingleFlight()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flights (
+                    icao24 TEXT NOT NULL,
+                    callsign TEXT,
+                    estDepartureAirport TEXT,
+                    estArrivalAirport TEXT,
+                    firstSeen INTEGER NOT NULL,
+                    lastSeen INTEGER,
+                    PRIMARY KEY (icao24, firstSeen)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS flights_departure ON flights (estDepartureAirport, firstSeen)")
+            conn.execute("CREATE INDEX IF NOT EXISTS flights_arrival ON flights (estArrivalAirport, lastSeen)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coverage (
+                    airport TEXT NOT NULL,
+                    begin INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (airport, begin)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS provisional (
+                    airport TEXT NOT NULL,
+                    begin INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (airport, begin)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS access (
+                    airport TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (airport, bucket)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS access_lru ON access (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- Reads ---
+    def coverage(self, airport_code, start=None, end=None, direction="departure"):
+        """Sorted (begin, end) intervals served locally for an airport, optionally overlapping a range
+
+        These are the settled intervals plus the provisional ones fetched
+        within the last ``provisional_ttl`` seconds.
+        """
+        key = airport_key(airport_code, direction)
+        start = -1 if start is None else start
+        end = 2 ** 62 if end is None else end
+        with self._connect() as conn:
+            settled = conn.execute(
+                "SELECT begin, end FROM coverage WHERE airport = ? AND end >= ? AND begin <= ?", (key, start, end)
+            ).fetchall()
+            recent = conn.execute(
+                "SELECT begin, end FROM provisional WHERE airport = ? AND end >= ? AND begin <= ? AND fetched_at >= ?",
+                (key, start, end, self.clock() - self.provisional_ttl)
+            ).fetchall()
+        return merge_intervals(settled + recent)
+
+    def covered_until(self, direction="departure"):
+        """Latest fetched timestamp per airport of its departures (or arrivals), i.e. how fresh the stored data is"""
+        with self._connect() as conn:
+            latest = dict(conn.execute(
+                "SELECT airport, MAX(end) FROM (SELECT airport, end FROM coverage UNION ALL "
+                "SELECT airport, end FROM provisional) GROUP BY airport"
+            ).fetchall())
+        if direction == "departure":
+            return {key: end for key, end in latest.items() if ":" not in key}
+        suffix = airport_key("", direction)
+        return {key[:-len(suffix)]: end for key, end in latest.items() if key.endswith(suffix)}
+
+    def missing(self, airport_code, start, end, direction="departure"):
+        """Intervals of [start, end] that have not been fetched yet"""
+        return subtract_intervals(int(start), int(end), self.coverage(airport_code, start, end, direction))
+
+    def query(self, airport_code, start, end, direction="departure"):
+        """Stored departures of an airport with firstSeen in [start, end] (or arrivals by lastSeen), oldest first"""
+        airport_column, time_column = AIRPORT_COLUMN[direction], TIME_COLUMN[direction]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights "
+                f"WHERE {airport_column} = ? AND {time_column} BETWEEN ? AND ? ORDER BY {time_column}",
+                (airport_code, int(start), int(end))
+            ).fetchall()
+            self._touch(conn, airport_key(airport_code, direction), start, end)
+        columns = list(zip(*rows)) or [()] * len(FLIGHT_COLUMNS)
+        return flights_from_arrow(pa.table([pa.array(values, field.type) for values, field in zip(columns, FLIGHT_SCHEMA)],
+                                           schema=FLIGHT_SCHEMA))
+
+    # --- Writes ---
+    def store(self, airport_code, begin, end, flights, as_of=None, direction="departure"):
+        """Upsert fetched flights and mark [begin, end] covered up to the fetch time (``as_of``, default now)
+
+        Coverage is settled up to ``settle`` seconds before the fetch time and
+        provisional from there on.
+        """
+        now = as_of or self.clock()
+        table = pa.Table.from_pandas(flights[FLIGHT_COLUMNS], preserve_index=False)
+        icao24, callsign, departure, arrival, first_seen, last_seen = (table[col].to_pylist() for col in FLIGHT_COLUMNS)
+        rows = [
+            (row[0] or row[1] or "", *row[1:])
+            for row in zip(icao24, callsign, departure, arrival, first_seen, last_seen) if row[4] is not None
+        ]
+        # Flights still in the air when fetched are listed upstream only after they land
+        begin, key = int(begin), airport_key(airport_code, direction)
+        fetched_end = min(int(end), int(now))
+        settled_end = min(fetched_end, int(now) - self.settle)
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO flights VALUES ({', '.join('?' * len(FLIGHT_COLUMNS))})", rows)
+            if settled_end >= begin:
+                self._add_coverage(conn, key, begin, settled_end, now)
+            if fetched_end >= max(begin, settled_end + 1):
+                self._add_provisional(conn, key, max(begin, settled_end + 1), fetched_end, now)
+            self._touch(conn, key, begin, end)
+            self._evict(conn)
+
+    @staticmethod
+    def _add_coverage(conn, airport_code, begin, end, fetched_at):
+        """Insert an interval, merging it with overlapping or adjacent ones"""
+        overlapping = conn.execute(
+            "SELECT begin, end FROM coverage WHERE airport = ? AND end >= ? AND begin <= ?",
+            (airport_code, begin - 1, end + 1)
+        ).fetchall()
+        for other_begin, other_end in overlapping:
+            begin, end = min(begin, other_begin), max(end, other_end)
+        conn.execute(
+            "DELETE FROM coverage WHERE airport = ? AND end >= ? AND begin <= ?",
+            (airport_code, begin - 1, end + 1)
+        )
+        conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?)", (airport_code, begin, end, fetched_at))
+
+    @staticmethod
+    def _uncover(conn, table, airport_code, begin, end):
+        """Cut [begin, end] out of an airport's intervals in ``table`` (coverage or provisional)"""
+        overlapping = conn.execute(
+            f"SELECT begin, end, fetched_at FROM {table} WHERE airport = ? AND end >= ? AND begin <= ?",
+            (airport_code, begin, end)
+        ).fetchall()
+        conn.execute(f"DELETE FROM {table} WHERE airport = ? AND end >= ? AND begin <= ?", (airport_code, begin, end))
+        conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?)", [
+            (airport_code, gap_begin, gap_end, fetched_at)
+            for other_begin, other_end, fetched_at in overlapping
+            for gap_begin, gap_end in subtract_intervals(other_begin, other_end, [(begin, end)])
+        ])
+
+    def _add_provisional(self, conn, airport_code, begin, end, fetched_at):
+        """Insert a provisional interval, replacing the overlapped parts of older ones"""
+        self._uncover(conn, "provisional", airport_code, begin, end)
+        conn.execute("INSERT INTO provisional VALUES (?, ?, ?, ?)", (airport_code, begin, end, fetched_at))
+
+    # --- Eviction ---
+    def _touch(self, conn, airport_code, begin, end):
+        """Mark the hour buckets of [begin, end] as just used"""
+        now = self.clock()
+        conn.executemany(
+            "INSERT INTO access VALUES (?, ?, ?) ON CONFLICT (airport, bucket) DO UPDATE SET last_access = excluded.last_access",
+            [(airport_code, bucket, now) for bucket in bucket_starts(begin, end)]
+        )
+
+    @staticmethod
+    def _used_bytes(conn):
+        page_size, pages, free = (conn.execute(f"PRAGMA {name}").fetchone()[0]
+                                  for name in ("page_size", "page_count", "freelist_count"))
+        return (pages - free) * page_size
+
+    def _evict(self, conn):
+        """Drop the least recently used buckets until the used pages fit in ``max_bytes``
+
+        A bucket loses its coverage, so it is fetched again when next asked
+        for, and its flights, except those the other direction's coverage
+        (the same flight as an arrival or departure elsewhere) still serves.
+        """
+        while self._used_bytes(conn) > self.max_bytes:
+            oldest = conn.execute("SELECT airport, bucket FROM access ORDER BY last_access LIMIT ?",
+                                  (EVICT_BATCH,)).fetchall()
+            if not oldest:
+                return
+            for key, bucket in oldest:
+                if self._used_bytes(conn) <= self.max_bytes:
+                    return
+                code, _, direction = key.partition(":")
+                direction = direction or "departure"
+                other = "arrival" if direction == "departure" else "departure"
+                end = bucket + BUCKET_SECONDS - 1
+                for table in ("coverage", "provisional"):
+                    self._uncover(conn, table, key, bucket, end)
+                other_key = AIRPORT_COLUMN[other] + ("" if other == "departure" else f" || '{airport_key('', other)}'")
+                served = " OR ".join(
+                    f"EXISTS (SELECT 1 FROM {table} WHERE airport = {other_key} "
+                    f"AND {TIME_COLUMN[other]} BETWEEN begin AND end)"
+                    for table in ("coverage", "provisional")
+                )
+                conn.execute(
+                    f"DELETE FROM flights WHERE {AIRPORT_COLUMN[direction]} = ? "
+                    f"AND {TIME_COLUMN[direction]} BETWEEN ? AND ? AND NOT ({served})",
+                    (code, bucket, end)
+                )
+                conn.execute("DELETE FROM access WHERE airport = ? AND bucket = ?", (key, bucket))
+                self.evicted += 1
+
+    def fetch_window(self, airport_code, start, end, fetch, max_workers=4, max_span=MAX_QUERY_SECONDS,
+                     direction="departure"):
+        """Flights departing (or arriving, per ``direction``) in [start, end], calling ``fetch`` only for uncovered intervals
+
+        ``fetch(airport_code, begin, end)`` must return the flights of the
+        inclusive interval, as ``opensky.fetch_departures`` does. Returns
+        ``(flights, report)`` with one ``opensky.chunk_status`` row per locally
+        served, fetched or coalesced interval; failed chunks are reported and
+        left uncovered.
+        Parts of the gaps another thread is fetching are waited for, not
+        fetched again, and share that fetch's outcome.
+        """
+        start, end = int(start), int(end)
+        key = airport_key(airport_code, direction)
+        covered = [(max(begin, start), min(stop, end))
+                   for begin, stop in self.coverage(airport_code, start, end, direction)]
+        own, shared = self.single_flight.claim(key, subtract_intervals(start, end, covered), max_span)
+        chunks = [(flight.begin, flight.end) for flight in own]
+        with self._lock:
+            self.hits += len(covered)
+            self.misses += len(chunks)
+        as_of = {}   # chunk begin -> time the shared cache's answer is complete up to
+        if self.shared_cache is not None:
+            upstream = fetch
+
+            def fetch(code, begin, end):
+                flights, as_of[begin] = self.shared_cache.fetch(code, begin, end, upstream, direction)
+                return flights
+
+        report = []
+        errors = {}
+        try:
+            for chunk_begin, chunk_end, chunk, error in fetch_chunks(airport_code, chunks, fetch, max_workers):
+                if error is None:
+                    self.store(airport_code, chunk_begin, chunk_end, chunk, as_of.get(chunk_begin), direction)
+                report.append(chunk_status(chunk_begin, chunk_end, chunk, error))
+                errors[chunk_begin] = error
+        finally:
+            for flight in own:
+                self.single_flight.finish(key, flight, errors.get(flight.begin, "fetch aborted"))
+        for _, _, flight in shared:
+            flight.done.wait()
+
+        flights = self.query(airport_code, start, end, direction)
+        seen = flights[TIME_COLUMN[direction]].to_numpy()
+        for begin, stop in covered:
+            local = seen[np.searchsorted(seen, begin):np.searchsorted(seen, stop, side="right")]
+            report.append(chunk_status(begin, stop, local, None, "cached"))
+        for begin, stop, flight in shared:
+            local = seen[np.searchsorted(seen, begin):np.searchsorted(seen, stop, side="right")]
+            report.append(chunk_status(begin, stop, local, flight.error, None if flight.error else "coalesced"))
+        report.sort(key=lambda row: row["begin"])
+        return flights, report
+
+    # --- Maintenance ---
+    def stats(self):
+        """Row counts, covered airports and file size"""
+        with self._connect() as conn:
+            flights = conn.execute("SELECT COUNT(*), MIN(firstSeen), MAX(firstSeen) FROM flights").fetchone()
+            intervals = conn.execute("SELECT COUNT(*), COUNT(DISTINCT airport) FROM coverage").fetchone()
+            provisional = conn.execute("SELECT COUNT(*) FROM provisional").fetchone()
+        return {
+            "flights": flights[0],
+            "oldest": flights[1],
+            "newest": flights[2],
+            "intervals": intervals[0],
+            "provisional": provisional[0],
+            "airports": intervals[1],
+            "bytes": os.path.getsize(self.path),
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+    def compact(self, retention_days=None):
+        """Drop flights and coverage older than the retention window, merge intervals and reclaim space
+
+        Provisional intervals past ``provisional_ttl`` are dropped as well, and
+        least recently used buckets are evicted down to ``max_bytes``.
+        """
+        removed = 0
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM provisional WHERE fetched_at < ?", (self.clock() - self.provisional_ttl,))
+            if retention_days is not None:
+                cutoff = int(self.clock() - retention_days * 86400)
+                removed = conn.execute("DELETE FROM flights WHERE firstSeen < ?", (cutoff,)).rowcount
+                conn.execute("DELETE FROM coverage WHERE end < ?", (cutoff,))
+                conn.execute("UPDATE coverage SET begin = ? WHERE begin < ?", (cutoff, cutoff))
+                conn.execute("DELETE FROM access WHERE bucket + ? <= ?", (BUCKET_SECONDS, cutoff))
+            intervals = conn.execute("SELECT airport, begin, end, fetched_at FROM coverage").fetchall()
+            conn.execute("DELETE FROM coverage")
+            for airport, begin, end, fetched_at in sorted(intervals):
+                self._add_coverage(conn, airport, begin, end, fetched_at)
+            self._evict(conn)
+        with self._connect() as conn:
+            conn.execute("PRAGMA optimize")
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        return removed
+
+    def clear(self):
+        """Drop every stored flight and coverage interval"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM flights")
+            conn.execute("DELETE FROM coverage")
+            conn.execute("DELETE FROM provisional")
+            conn.execute("DELETE FROM access")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", help="Warehouse file (default .cache/flight_warehouse.sqlite)")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES, help="Size bound enforced by compact")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show row counts and file size")
+    compact = commands.add_parser("compact", help="Apply retention, merge coverage and vacuum")
+    compact.add_argument("--retention-days", type=float, help="Drop flights older than this many days")
+    args = parser.parse_args(argv)
+
+    warehouse = FlightWarehouse(args.path, max_bytes=args.max_bytes)
+    if args.command == "compact":
+        before = os.path.getsize(warehouse.path)
+        removed = warehouse.compact(args.retention_days)
+        print(f"Removed {removed} flights, {before / 1e6:.1f} MB -> {os.path.getsize(warehouse.path) / 1e6:.1f} MB")
+    for key, value in warehouse.stats().items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())